@@ -0,0 +1,386 @@
+"""
+Benchmarks the DB-layer functions and checks them against a saved baseline.
+
+For each size in --sizes a throwaway database is generated with
+generate_data.py (that many IDEA items, passive parts and active parts) in a
+layout like the repo's (`<tmp>/src` as the working directory,
+`<tmp>/data/data.db`). Every case runs against that file ("disk") and
+against an in-memory copy made with `Connection.backup` ("memory").
+`import_csv` opens "../data/data.db" itself, so it only runs on disk.
+
+Each case reports the best time per call over --repeat rounds. Cases that
+write commit their changes, so they are written to leave the table sizes
+roughly unchanged. The searches wrapped by `cached_query` are timed without
+the cache (`__wrapped__`), so they measure the matching itself; the
+`*_cached` cases time a repeated query, a cache hit.
+
+`--save-baseline` writes the results to the --baseline file. Without it the
+results are compared to that file and the script exits with status 1 if any
+case is slower than its baseline by more than --tolerance, or if there is no
+baseline file. Cases missing from the baseline are listed, and fail the run
+too with --require-baseline. Baselines are only comparable on the machine
+that recorded them; benchmarks/baselines.json is the one recorded at the
+default sizes and is refreshed with --save-baseline.
+
+Usage:
+    python benchmarks/bench_db.py [--sizes 1000,10000,100000] [--repeat 5]
+        [--only fzf,get_all] [--baseline benchmarks/baselines.json]
+        [--save-baseline] [--require-baseline] [--tolerance 0.25]
+"""
+
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import timeit
+from typing import Callable, NamedTuple, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, BENCH_DIR)
+
+import generate_data  # noqa: E402  (also puts src on sys.path)
+
+import electrical_db  # noqa: E402
+import idea_db  # noqa: E402
+import utility_functions  # noqa: E402
+from shared_cache import detach_corpora  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, "baselines.json")
+# differences below this are timer noise, whatever the ratio
+MIN_REGRESSION_SECONDS = 50e-6
+
+
+class Case(NamedTuple):
+    """
+    One benchmarked function
+
+    setup is called once per database with (cursor, connection) and returns
+    the zero argument callable that is timed.
+    """
+
+    name: str
+    setup: Callable[[sqlite3.Cursor, sqlite3.Connection], Callable[[], object]]
+    disk_only: bool = False
+    max_rows: Optional[int] = None
+
+
+def bench_fzf(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    return lambda: idea_db.fzf.__wrapped__("Hex Bolt", 1, "M6x20", cursor)
+
+
+def bench_fzf_cached(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    # the cache is per process, entries of the previous database must not be hit
+    idea_db.fzf.cache_clear()
+    return lambda: idea_db.fzf("Hex Bolt", 1, "M6x20", cursor)
+
+
+def bench_find_by_name(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    cursor.execute("SELECT name, is_metric, size FROM items ORDER BY id DESC LIMIT 1")
+    name, is_metric, size = cursor.fetchone()
+    return lambda: idea_db.find_by_name(name, is_metric, size, cursor)
+
+
+def bench_get_all(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    return lambda: idea_db.get_all(cursor)
+
+
+def bench_add_item(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    # a new item every call, the insert path is the one that checks for duplicates
+    counter = itertools.count()
+    return lambda: idea_db.add_item(
+        f"Bench Bolt {next(counter)}", "M4x10", 1, "1", "1", "1", "1", "1", "1",
+        10, 5, cursor, connection,
+    )
+
+
+def bench_decrement_item(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    cursor.execute("SELECT MIN(id) FROM items")
+    item_id = cursor.fetchone()[0]
+    cursor.execute(
+        "UPDATE items SET count = 1000000000, isContacted = 1 WHERE id = ?", (item_id,)
+    )
+    connection.commit()
+    return lambda: idea_db.decrement_item(item_id, 1, cursor, connection)
+
+
+def bench_search_passive(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    return lambda: electrical_db.search_similar_passive_items_el.__wrapped__(
+        cursor, 4700.0, 0.2, "Resistor"
+    )
+
+
+def bench_search_passive_cached(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    electrical_db.search_similar_passive_items_el.cache_clear()
+    return lambda: electrical_db.search_similar_passive_items_el(
+        cursor, 4700.0, 0.2, "Resistor"
+    )
+
+
+def bench_search_active(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    return lambda: electrical_db.search_similar_active_items_el.__wrapped__(
+        cursor, name="op amp", part_id="LM358"
+    )
+
+
+def bench_search_active_cached(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    electrical_db.search_similar_active_items_el.cache_clear()
+    return lambda: electrical_db.search_similar_active_items_el(
+        cursor, name="op amp", part_id="LM358"
+    )
+
+
+def bench_below_threshold(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    return lambda: electrical_db.search_below_threshold_el(
+        cursor, ["passive", "active"], [], 50
+    )
+
+
+def bench_calculate_multiplier(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    return lambda: electrical_db.calculate_multiplier(cursor, connection)
+
+
+def bench_import_csv(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    # the columns of an IDEA backup: id first, 13 in all
+    cursor.execute(
+        """
+        SELECT id, name, size, is_metric, loc_shelf, loc_rack, loc_box, loc_row,
+        loc_col, loc_depth, count, threshold, isContacted FROM items
+        """
+    )
+    path = os.path.abspath("../data/bench_import.csv")
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow([column[0] for column in cursor.description])
+        writer.writerows(tuple(row) for row in cursor.fetchall())
+    return lambda: utility_functions.import_csv(path)
+
+
+def bench_backup_data_el(cursor: sqlite3.Cursor, connection: sqlite3.Connection):
+    return lambda: electrical_db.backup_data_el(cursor)
+
+
+CASES = [
+    Case("fzf", bench_fzf),
+    Case("fzf_cached", bench_fzf_cached),
+    Case("find_by_name", bench_find_by_name),
+    Case("get_all", bench_get_all),
+    Case("add_item", bench_add_item),
+    Case("decrement_item", bench_decrement_item),
+    Case("search_similar_passive_items_el", bench_search_passive),
+    Case("search_similar_passive_items_el_cached", bench_search_passive_cached),
+    Case("search_similar_active_items_el", bench_search_active),
+    Case("search_similar_active_items_el_cached", bench_search_active_cached),
+    Case("search_below_threshold_el", bench_below_threshold),
+    Case("calculate_multiplier", bench_calculate_multiplier),
+    Case("backup_data_el", bench_backup_data_el),
+    # add_item commits every row and looks it up without an index, larger imports take minutes
+    Case("import_csv", bench_import_csv, disk_only=True, max_rows=10000),
+]
+
+
+def build_database(root: str, rows: int, seed: int) -> str:
+    """
+    Generates a database with `rows` IDEA items, passive parts and active parts
+
+    Args:
+        root (str): the directory to create src, data and logs in
+        rows (int): the number of rows in each item table
+        seed (int): seed for the generator
+
+    Returns:
+        str: the path of the database
+    """
+    for name in ("src", "data", "data/electrical_lab", "logs"):
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+    generate_data.build_schema(root)
+    rng = random.Random(seed)
+    db_path = os.path.join(root, "data", "data.db")
+    with sqlite3.connect(db_path) as connection:
+        connection.executemany(
+            """
+            INSERT INTO items (name, size, is_metric, loc_shelf, loc_rack, loc_box,
+            loc_row, loc_col, loc_depth, count, threshold, isContacted)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            generate_data.generate_items(rng, rows),
+        )
+        connection.executemany(
+            """
+            INSERT INTO electrical_passive_items (subtype, value, mounting_method,
+            tolerance, part_number, location, rack, slot, count, link, max_p, max_v,
+            max_i, i_hold, polarity, seller, dielectric_material)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            generate_data.generate_passive(rng, rows),
+        )
+        connection.executemany(
+            """
+            INSERT INTO electrical_active_items (part_id, name, description, link,
+            location, rack, count, slot, is_assembly, type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            generate_data.generate_active(rng, rows),
+        )
+    connection.close()
+    return db_path
+
+
+def open_database(db_path: str, mode: str) -> sqlite3.Connection:
+    """
+    Opens the generated database, or an in-memory copy of it
+
+    Args:
+        db_path (str): the path of the generated database
+        mode (str): "disk" or "memory"
+
+    Returns:
+        sqlite3.Connection: a connection with rows as sqlite3.Row, like get_db
+    """
+    if mode == "disk":
+        connection = sqlite3.connect(db_path)
+    else:
+        connection = sqlite3.connect(":memory:")
+        with sqlite3.connect(db_path) as source:
+            source.backup(connection)
+        source.close()
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def run_cases(cases: list[Case], sizes: list[int], repeat: int, seed: int) -> dict:
+    """
+    Times every case at every size in both modes
+
+    Args:
+        cases (list[Case]): the cases to run
+        sizes (list[int]): the row counts to run them at
+        repeat (int): the number of timing rounds, the best is kept
+        seed (int): seed for the data generator
+
+    Returns:
+        dict: best seconds per call, keyed by "<case>[<mode>-<rows>]"
+    """
+    results = {}
+    start_dir = os.getcwd()
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as root:
+            db_path = build_database(root, rows, seed)
+            # the next database starts at the same table versions as the last one
+            detach_corpora()
+            for mode in ("memory", "disk"):
+                connection = open_database(db_path, mode)
+                cursor = connection.cursor()
+                for case in cases:
+                    if case.disk_only and mode != "disk":
+                        continue
+                    if case.max_rows is not None and rows > case.max_rows:
+                        print(f"  {case.name:<40} {mode:<6} {rows:>7}  skipped (> {case.max_rows} rows)")
+                        continue
+                    func = case.setup(cursor, connection)
+                    timer = timeit.Timer(func)
+                    number, _ = timer.autorange()
+                    best = min(timer.repeat(repeat=repeat, number=number)) / number
+                    results[f"{case.name}[{mode}-{rows}]"] = best
+                    print(f"  {case.name:<40} {mode:<6} {rows:>7}  {best * 1000:10.3f} ms")
+                connection.close()
+            os.chdir(start_dir)
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Finds the cases that got slower than their baseline by more than the tolerance
+
+    Args:
+        results (dict): the times just measured
+        baseline (dict): the saved times
+        tolerance (float): the allowed slowdown, 0.25 for 25%
+
+    Returns:
+        list[str]: a description of each regression
+    """
+    regressions = []
+    for key, seconds in sorted(results.items()):
+        saved = baseline.get(key)
+        if saved is None:
+            continue
+        if seconds > saved * (1 + tolerance) and seconds - saved > MIN_REGRESSION_SECONDS:
+            regressions.append(
+                f"{key}: {saved * 1000:.3f} ms -> {seconds * 1000:.3f} ms "
+                f"(+{(seconds / saved - 1) * 100:.0f}%)"
+            )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="1000,10000,100000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", default="", help="comma separated case names")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument(
+        "--require-baseline",
+        action="store_true",
+        help="fail if a case has no baseline result",
+    )
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    # the cases run with the generated database's src directory as the working directory
+    baseline_path = os.path.abspath(args.baseline)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    only = {name for name in args.only.split(",") if name}
+    unknown = only - {case.name for case in CASES}
+    if unknown:
+        sys.exit(f"unknown cases: {', '.join(sorted(unknown))}")
+    cases = [case for case in CASES if not only or case.name in only]
+
+    print(f"best of {args.repeat}, per call")
+    results = run_cases(cases, sizes, args.repeat, args.seed)
+
+    if args.save_baseline:
+        with open(baseline_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "recorded": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "python": sys.version.split()[0],
+                    "sqlite": sqlite3.sqlite_version,
+                    "results": results,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
+        print(f"Saved {len(results)} results to {baseline_path}")
+        return
+
+    if not os.path.exists(baseline_path):
+        sys.exit(f"No baseline at {baseline_path}, run with --save-baseline to record one")
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    missing = sorted(key for key in results if key not in baseline)
+    if missing:
+        print(f"{len(missing)} case(s) without a baseline:")
+        for key in missing:
+            print(f"  {key}")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    if missing and args.require_baseline:
+        sys.exit(1)
+    print(f"No regressions beyond {args.tolerance:.0%} of {baseline_path}")
+
+
+if __name__ == "__main__":
+    main()
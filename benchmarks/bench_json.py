@@ -0,0 +1,125 @@
+"""
+Benchmarks encoding the /findAll payload.
+
+Compares building dicts with get_all and encoding them with the stdlib
+encoder (the old jsonify path) or orjson, against get_all_json, where
+SQLite encodes the rows itself. Runs against a throwaway database laid out
+like the repo (`<tmp>/src` as the working directory, `<tmp>/data/data.db`).
+
+Usage:
+    python benchmarks/bench_json.py [--rows 10000] [--repeat 7]
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+from flask import Flask  # noqa: E402
+
+import idea_db  # noqa: E402
+from forecast import ensure_forecast_table  # noqa: E402
+from json_provider import FastJSONProvider, json_response_with_data, orjson  # noqa: E402
+
+
+def populate(rows: int) -> None:
+    """
+    Fills the items and forecast tables of the current database with random rows
+
+    Args:
+        rows (int): the number of items to insert
+
+    Returns:
+        None
+    """
+    idea_db.build_db()
+    ensure_forecast_table()
+    names = ["Hex Bolt", "Socket Cap Screw", "Wing Nut", "Flat Washer", "Dowel Pin"]
+    with idea_db.sqlite3.connect("../data/data.db") as connection:
+        connection.executemany(
+            """
+            INSERT INTO items (name, size, is_metric, loc_shelf, loc_rack, loc_box,
+            loc_row, loc_col, loc_depth, count, threshold)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [
+                (
+                    f"{random.choice(names)} {i}",
+                    f"M{random.randint(2, 12)}x{random.randint(4, 60)}",
+                    random.randint(0, 1),
+                    str(random.randint(1, 9)),
+                    str(random.randint(1, 9)),
+                    str(random.randint(1, 9)),
+                    str(random.randint(1, 9)),
+                    str(random.randint(1, 9)),
+                    str(random.randint(1, 9)),
+                    random.randint(0, 500),
+                    random.randint(0, 50),
+                )
+                for i in range(rows)
+            ],
+        )
+        connection.execute(
+            """
+            INSERT INTO item_forecasts
+            SELECT 'idea', id, 0.5, 11, count / 0.5, '2025-01-01 00:00:00'
+            FROM items WHERE id % 3 = 0
+            """
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        os.makedirs(os.path.join(root, "src"))
+        os.makedirs(os.path.join(root, "data"))
+        os.chdir(os.path.join(root, "src"))
+        populate(args.rows)
+
+        app = Flask(__name__)
+        app.json = FastJSONProvider(app)
+        connection = idea_db.sqlite3.connect("../data/data.db")
+        cursor = connection.cursor()
+
+        def dicts_stdlib() -> bytes:
+            items = idea_db.get_all(cursor)
+            for item in items:
+                item["is_metric"] = str(item["is_metric"] == 1)
+            return json.dumps({"data": items}, sort_keys=True).encode()
+
+        def dicts_orjson() -> bytes:
+            items = idea_db.get_all(cursor)
+            for item in items:
+                item["is_metric"] = str(item["is_metric"] == 1)
+            return app.json.response({"data": items}).get_data()
+
+        def sqlite_json() -> bytes:
+            return json_response_with_data(idea_db.get_all_json(cursor)).get_data()
+
+        cases = [("get_all + stdlib json", dicts_stdlib)]
+        if orjson is not None:
+            cases.append(("get_all + orjson", dicts_orjson))
+        cases.append(("get_all_json (SQLite)", sqlite_json))
+
+        with app.app_context():
+            sizes = {name: len(func()) for name, func in cases}
+            print(f"{args.rows} rows, best of {args.repeat}")
+            for name, func in cases:
+                best = min(timeit.repeat(func, number=1, repeat=args.repeat))
+                per_10k = best * 1000 * 10000 / args.rows
+                print(f"  {name:<24} {per_10k:8.2f} ms / 10k rows  ({sizes[name]} bytes)")
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
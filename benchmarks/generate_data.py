@@ -0,0 +1,374 @@
+"""
+Generates a synthetic inventory database for benchmarks and load tests.
+
+Creates `<root>/src`, `<root>/data/data.db` and `<root>/logs`, the layout the
+app expects when it runs with `<root>/src` as its working directory, builds
+the schema with the app's own functions and fills it with:
+
+    - IDEA lab fasteners: M2-M12 and UNC sizes with lengths, several materials
+    - passive parts: E24 resistors, E12 capacitors and polyfuses across decades,
+      with manufacturer style part numbers that share prefixes
+    - active parts: common IC and discrete families with package/revision
+      variants of the same base part id
+
+Counts follow a heavy-tailed distribution so a few items hold most of the
+stock. All IDEA items are marked as already contacted so load tests never
+send low-stock emails. A level 0 "loadtest" user is created and its login
+token written to `<root>/data/loadtest_token`.
+
+Usage:
+    python benchmarks/generate_data.py --root /tmp/inventory [--scale 1.0] [--seed 1]
+"""
+
+import argparse
+import itertools
+import math
+import os
+import random
+import secrets
+import sqlite3
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_DIR)
+
+# per unit of --scale
+BASE_ITEMS = 5000
+BASE_PASSIVE = 20000
+BASE_ACTIVE = 2000
+
+FASTENERS = [
+    "Socket Head Cap Screw",
+    "Hex Bolt",
+    "Hex Nut",
+    "Nylon Lock Nut",
+    "Flat Washer",
+    "Split Lock Washer",
+    "Button Head Screw",
+    "Flat Head Screw",
+    "Set Screw",
+    "Dowel Pin",
+    "Heat Set Insert",
+    "Standoff",
+]
+MATERIALS = ["Stainless", "Zinc Plated", "Black Oxide", "Brass"]
+METRIC_DIAMETERS = ["M2", "M2.5", "M3", "M4", "M5", "M6", "M8", "M10", "M12"]
+METRIC_LENGTHS = [4, 6, 8, 10, 12, 16, 20, 25, 30, 40, 50]
+UNC_THREADS = ["#2-56", "#4-40", "#6-32", "#8-32", "#10-24", "1/4-20", "5/16-18", "3/8-16"]
+UNC_LENGTHS = ["1/4", "3/8", "1/2", "5/8", "3/4", "1", "1-1/4", "1-1/2", "2"]
+# sizes are weighted towards the common middle of the range
+METRIC_WEIGHTS = [2, 3, 8, 7, 6, 5, 3, 2, 1]
+
+E24 = [1.0, 1.1, 1.2, 1.3, 1.5, 1.6, 1.8, 2.0, 2.2, 2.4, 2.7, 3.0,
+       3.3, 3.6, 3.9, 4.3, 4.7, 5.1, 5.6, 6.2, 6.8, 7.5, 8.2, 9.1]  # fmt: skip
+E12 = [1.0, 1.2, 1.5, 1.8, 2.2, 2.7, 3.3, 3.9, 4.7, 5.6, 6.8, 8.2]
+PACKAGES = ["0402", "0603", "0805", "1206"]
+SELLERS = ["Digikey", "Mouser", "LCSC", "Newark"]
+
+ACTIVE_FAMILIES = [
+    ("LM358", "Dual Op Amp", "IC", ["DR", "DT", "N", "PWR"]),
+    ("NE555", "Timer", "IC", ["DR", "P", "PWR"]),
+    ("LM7805", "5V Linear Regulator", "Regulator", ["CT", "ACT", "SRTG"]),
+    ("AMS1117", "LDO Regulator", "Regulator", ["-3.3", "-5.0", "-ADJ"]),
+    ("74HC595", "Shift Register", "IC", ["D", "N", "PW", "BQ"]),
+    ("74HC14", "Schmitt Inverter", "IC", ["D", "N", "PW"]),
+    ("ATMEGA328P", "8-bit Microcontroller", "Microcontroller", ["-AU", "-PU", "-MU"]),
+    ("STM32F103", "ARM Cortex-M3 MCU", "Microcontroller", ["C8T6", "CBT6", "RCT6"]),
+    ("ESP32-WROOM-32", "WiFi Module", "Module", ["E", "D", "UE"]),
+    ("2N3904", "NPN Transistor", "Transistor", ["BU", "TA", "-AP"]),
+    ("2N7000", "N-Channel MOSFET", "Transistor", ["TA", "-G", "BU"]),
+    ("IRLZ44N", "Logic Level MOSFET", "Transistor", ["PBF", "STRLPBF"]),
+    ("1N4148", "Signal Diode", "Diode", ["W-7-F", "TR", "WS"]),
+    ("1N5819", "Schottky Diode", "Diode", ["HW-7-F", "-T", "RLG"]),
+    ("TLV1117", "LDO Regulator", "Regulator", ["-33IDCYR", "-50IDCYR", "IDCYR"]),
+    ("MCP2515", "CAN Controller", "IC", ["-I/SO", "-I/P", "-E/ST"]),
+]
+
+
+def skewed_count(rng: random.Random) -> int:
+    """
+    Returns a stock count from a heavy-tailed distribution
+
+    Args:
+        rng (random.Random): the random generator
+
+    Returns:
+        int: the count, mostly small with a few very large values
+    """
+    return min(int(rng.paretovariate(1.1) * 8) - 8 + rng.randint(0, 5), 20000)
+
+
+def location(rng: random.Random) -> tuple[str, ...]:
+    """
+    Returns an IDEA lab location (shelf, rack, box, row, col, depth)
+
+    Args:
+        rng (random.Random): the random generator
+
+    Returns:
+        tuple[str, ...]: the location parts
+    """
+    return tuple(str(rng.randint(1, limit)) for limit in (6, 4, 12, 5, 5, 3))
+
+
+def generate_items(rng: random.Random, count: int) -> list[tuple]:
+    """
+    Generates unique IDEA lab fastener rows
+
+    Args:
+        rng (random.Random): the random generator
+        count (int): the number of rows
+
+    Returns:
+        list[tuple]: rows for the items table
+    """
+    metric = [
+        (d, f"{d}x{length}", 1)
+        for d in METRIC_DIAMETERS
+        for length in METRIC_LENGTHS
+    ]
+    imperial = [(t, f"{t} x {length}", 0) for t in UNC_THREADS for length in UNC_LENGTHS]
+    weights = {d: w for d, w in zip(METRIC_DIAMETERS, METRIC_WEIGHTS)}
+    keys = [
+        (f"{material} {fastener}", size, is_metric, weights.get(diameter, 2))
+        for fastener, material in itertools.product(FASTENERS, MATERIALS)
+        for diameter, size, is_metric in metric + imperial
+    ]
+    # weighted sample without replacement (Efraimidis-Spirakis keys)
+    keys.sort(key=lambda key: rng.random() ** (1 / key[3]), reverse=True)
+
+    rows = []
+    for i in range(count):
+        name, size, is_metric, _ = keys[i % len(keys)]
+        if i >= len(keys):
+            name = f"{name} Rev {i // len(keys)}"
+        threshold = rng.choice([10, 20, 25, 50, 100])
+        rows.append(
+            (name, size, is_metric, *location(rng), skewed_count(rng) + threshold, threshold, 1)
+        )
+    return rows
+
+
+def value_code(value: float, unit_digits: int = 2) -> str:
+    """
+    Encodes a value the way part numbers do, e.g. 4700 -> "472"
+
+    Args:
+        value (float): the component value
+        unit_digits (int, optional): significant digits in the code
+
+    Returns:
+        str: the value code
+    """
+    exponent = max(int(math.floor(math.log10(value))) - unit_digits + 1, 0)
+    digits = int(round(value / 10**exponent))
+    return f"{digits}{exponent}"
+
+
+def generate_passive(rng: random.Random, count: int) -> list[tuple]:
+    """
+    Generates passive part rows
+
+    Args:
+        rng (random.Random): the random generator
+        count (int): the number of rows
+
+    Returns:
+        list[tuple]: rows for the electrical_passive_items table
+    """
+    rows = []
+    for _ in range(count):
+        kind = rng.choices(["Resistor", "Capacitor", "Polyfuse"], weights=[6, 3, 1])[0]
+        package = rng.choice(PACKAGES)
+        smd = rng.random() < 0.8
+        mounting = f"SMD {package}" if smd else "Through Hole"
+        i_hold = None
+        dielectric = None
+        polarity = 0
+        if kind == "Resistor":
+            value = float(f"{rng.choice(E24)}e{rng.randint(0, 6)}")
+            tolerance = rng.choice([1.0, 1.0, 5.0])
+            part_number = f"RC{package}FR-07{value_code(value)}L"
+            max_p, max_v, max_i = rng.choice([0.063, 0.1, 0.125, 0.25]), 50.0, 0.0
+        elif kind == "Capacitor":
+            value = float(f"{rng.choice(E12)}e{rng.randint(-12, -4)}")
+            tolerance = rng.choice([10.0, 20.0])
+            dielectric = rng.choice(["X7R", "X5R", "C0G", "Y5V"])
+            polarity = int(value > 1e-5 and not smd)
+            part_number = f"GRM{package[:2]}8R71H{value_code(value * 1e12)}KA01D"
+            max_p, max_v, max_i = 0.0, rng.choice([6.3, 16.0, 25.0, 50.0]), 0.0
+        else:
+            value = float(f"{rng.choice(E12)}e{rng.randint(-2, 1)}")
+            tolerance = None
+            i_hold = rng.choice([0.05, 0.1, 0.2, 0.5, 1.1, 2.0])
+            part_number = f"MF-MSMF{int(i_hold * 100):03d}-2"
+            max_p, max_v, max_i = 0.6, rng.choice([6.0, 15.0, 30.0]), 40.0
+        rows.append(
+            (
+                kind,
+                value,
+                mounting,
+                tolerance,
+                part_number,
+                "EL",
+                rng.randint(1, 10),
+                f"{rng.choice('ABCDEFGH')}{rng.randint(1, 12)}",
+                skewed_count(rng),
+                f"https://example.com/parts/{part_number}",
+                max_p,
+                max_v,
+                max_i,
+                i_hold,
+                polarity,
+                rng.choice(SELLERS),
+                dielectric,
+            )
+        )
+    return rows
+
+
+def generate_active(rng: random.Random, count: int) -> list[tuple]:
+    """
+    Generates active part rows whose part ids share family prefixes
+
+    Args:
+        rng (random.Random): the random generator
+        count (int): the number of rows
+
+    Returns:
+        list[tuple]: rows for the electrical_active_items table
+    """
+    rows = []
+    seen = set()
+    while len(rows) < count:
+        base, description, item_type, suffixes = rng.choice(ACTIVE_FAMILIES)
+        part_id = f"{base}{rng.choice(suffixes)}"
+        if part_id in seen:
+            # further variants get a reel/revision suffix like real catalogs
+            part_id = f"{part_id}-{len(seen):05d}"
+        seen.add(part_id)
+        is_assembly = int(rng.random() < 0.1)
+        rows.append(
+            (
+                part_id,
+                f"{base} {description}",
+                description,
+                f"https://example.com/parts/{part_id}",
+                "EL",
+                rng.randint(1, 10),
+                skewed_count(rng),
+                f"{rng.choice('ABCDEFGH')}{rng.randint(1, 12)}",
+                is_assembly,
+                item_type,
+            )
+        )
+    return rows
+
+
+def build_schema(root: str) -> None:
+    """
+    Creates the database schema with the app's own functions
+
+    Args:
+        root (str): the directory holding src, data and logs
+
+    Returns:
+        None
+    """
+    import bootstrap
+
+    os.chdir(os.path.join(root, "src"))
+    bootstrap.bootstrap()
+
+
+def create_user(root: str, connection: sqlite3.Connection) -> str:
+    """
+    Creates the level 0 "loadtest" user and returns its login token
+
+    Args:
+        root (str): the directory holding src, data and logs
+        connection (sqlite3.Connection): connection to the generated database
+
+    Returns:
+        str: the login token
+    """
+    env_path = os.path.join(root, "data", ".env")
+    if not os.path.exists(env_path):
+        with open(env_path, "w", encoding="utf-8") as f:
+            f.write(f"Login_Token_Secret_Key={secrets.token_hex(32)}\n")
+
+    from auth_db import generate_token
+
+    token = generate_token("loadtest", 0)
+    connection.execute(
+        """
+        INSERT INTO users (username, password, salt, token, level)
+        VALUES ('loadtest', '', '', ?, 0)
+        ON CONFLICT (username) DO UPDATE SET token = excluded.token
+        """,
+        (token,),
+    )
+    with open(os.path.join(root, "data", "loadtest_token"), "w", encoding="utf-8") as f:
+        f.write(token)
+    return token
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--root", required=True, help="directory to create the layout in")
+    parser.add_argument("--scale", type=float, default=1.0, help="multiplies the row counts")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    root = os.path.abspath(args.root)
+    for name in ("src", "data", "logs"):
+        os.makedirs(os.path.join(root, name), exist_ok=True)
+    db_path = os.path.join(root, "data", "data.db")
+    if os.path.exists(db_path):
+        sys.exit(f"{db_path} already exists, pick an empty --root")
+
+    build_schema(root)
+    rng = random.Random(args.seed)
+    items = generate_items(rng, int(BASE_ITEMS * args.scale))
+    passive = generate_passive(rng, int(BASE_PASSIVE * args.scale))
+    active = generate_active(rng, int(BASE_ACTIVE * args.scale))
+
+    from fastener_size import parse_size
+
+    with sqlite3.connect(db_path) as connection:
+        connection.executemany(
+            """
+            INSERT INTO items (name, size, is_metric, loc_shelf, loc_rack, loc_box,
+            loc_row, loc_col, loc_depth, count, threshold, isContacted,
+            size_diameter, size_pitch, size_length)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            [(*item, *parse_size(item[1], bool(item[2]))) for item in items],
+        )
+        connection.executemany(
+            """
+            INSERT INTO electrical_passive_items (subtype, value, mounting_method,
+            tolerance, part_number, location, rack, slot, count, link, max_p, max_v,
+            max_i, i_hold, polarity, seller, dielectric_material)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            passive,
+        )
+        connection.executemany(
+            """
+            INSERT INTO electrical_active_items (part_id, name, description, link,
+            location, rack, count, slot, is_assembly, type)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            active,
+        )
+        create_user(root, connection)
+
+    print(
+        f"Wrote {len(items)} IDEA items, {len(passive)} passive and "
+        f"{len(active)} active parts to {db_path}"
+    )
+
+
+if __name__ == "__main__":
+    main()
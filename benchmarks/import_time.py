@@ -0,0 +1,80 @@
+"""
+Measures how long a worker takes to import the app.
+
+Runs `python -X importtime -c "import app"` in a fresh interpreter, twice,
+against a throwaway database laid out like the repo (`<tmp>/src` as the
+working directory, `<tmp>/data/data.db`): first with no database, so the
+schema bootstrap runs, then again with the schema in place, which is what
+every later worker start pays. Prints the wall time of both and the modules
+with the largest cumulative import time.
+
+Usage:
+    python benchmarks/import_time.py [--top 20]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+
+def import_app(cwd: str) -> tuple[float, list[tuple[int, int, str]]]:
+    """
+    Imports the app in a new interpreter
+
+    Args:
+        cwd (str): the working directory, `src` of the throwaway layout
+
+    Returns:
+        tuple[float, list[tuple[int, int, str]]]: the wall time in seconds, and
+            (self us, cumulative us, module) for every imported module
+    """
+    env = dict(os.environ, PYTHONPATH=SRC_DIR)
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=cwd,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    elapsed = time.perf_counter() - started
+
+    modules = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        modules.append((int(self_us), int(cumulative_us), name.rstrip()))
+    return elapsed, modules
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        for name in ("src", "data", "logs"):
+            os.makedirs(os.path.join(root, name))
+        cwd = os.path.join(root, "src")
+        cold, _ = import_app(cwd)
+        warm, modules = import_app(cwd)
+
+    print(f"import app, new database:      {cold * 1000:8.1f} ms")
+    print(f"import app, schema up to date: {warm * 1000:8.1f} ms")
+    print(f"\nslowest imports (cumulative, schema up to date):")
+    for self_us, cumulative_us, name in sorted(modules, key=lambda m: -m[1])[: args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {self_us / 1000:8.1f} ms self  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Replays a mixed inventory workload against the API and reports latency.
+
+Each virtual user keeps one HTTP/1.1 keep-alive connection open and sends
+requests back to back, picking the endpoint from MIX and the item from a
+sample of the database created by generate_data.py. Increments and
+decrements are paired per item so stock levels stay put over a run.
+
+Usage:
+    python benchmarks/load_test.py --root /tmp/inventory --spawn [--users 16] [--duration 30]
+    python benchmarks/load_test.py --root /tmp/inventory --url http://127.0.0.1:3000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+from urllib.parse import urlencode, urlsplit
+
+SRC_DIR = os.path.abspath(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+# relative weight of each kind of request
+MIX = {
+    "fuzzyfind": 30,
+    "findAll": 3,
+    "electricalFuzzyPassive": 20,
+    "electricalFuzzyActive": 12,
+    "increment": 10,
+    "decrement": 10,
+    "electricalIncrementPassive": 5,
+    "electricalDecrementPassive": 5,
+    "electricalFindBelowThreshold": 5,
+}
+
+INCREMENT_FOR = {
+    "decrement": "increment",
+    "electricalDecrementPassive": "electricalIncrementPassive",
+}
+
+
+class Sample:
+    """
+    Items to build requests from, read from the generated database
+    """
+
+    def __init__(self, db_path: str, token: str, size: int = 2000) -> None:
+        connection = sqlite3.connect(db_path)
+        self.items = connection.execute(
+            "SELECT name, size, is_metric FROM items ORDER BY random() LIMIT ?", (size,)
+        ).fetchall()
+        self.passive = connection.execute(
+            """
+            SELECT id, value, subtype FROM electrical_passive_items
+            ORDER BY random() LIMIT ?
+            """,
+            (size,),
+        ).fetchall()
+        self.active = connection.execute(
+            "SELECT part_id, name FROM electrical_active_items ORDER BY random() LIMIT ?",
+            (size,),
+        ).fetchall()
+        connection.close()
+        self.token = token
+
+
+def build_request(kind: str, sample: Sample, rng: random.Random) -> tuple[str, str, bytes]:
+    """
+    Builds one request of the given kind
+
+    Args:
+        kind (str): a key of MIX
+        sample (Sample): the items to pick from
+        rng (random.Random): the random generator of the virtual user
+
+    Returns:
+        tuple[str, str, bytes]: the method, the path with query string and the body
+    """
+    if kind in ("fuzzyfind", "increment", "decrement"):
+        name, size, is_metric = rng.choice(sample.items)
+        words = name.split()
+        query = {"name": " ".join(words[-2:]), "size": size, "is_metric": str(bool(is_metric))}
+        if kind != "fuzzyfind":
+            # every increment is matched by an equal decrement of the same item
+            query = {"name": name, "size": size, "is_metric": str(bool(is_metric))}
+            query.update(num=1, token=sample.token)
+        return "GET", f"/{kind}?{urlencode(query)}", b""
+    if kind == "findAll":
+        return "GET", "/findAll", b""
+    if kind == "electricalFuzzyPassive":
+        _, value, subtype = rng.choice(sample.passive)
+        query = {"value": value, "item_type": subtype}
+        return "GET", f"/electricalFuzzyPassive?{urlencode(query)}", b""
+    if kind == "electricalFuzzyActive":
+        part_id, name = rng.choice(sample.active)
+        query = {"part_id": part_id[:6]} if rng.random() < 0.5 else {"name": name}
+        return "GET", f"/electricalFuzzyActive?{urlencode(query)}", b""
+    if kind in ("electricalIncrementPassive", "electricalDecrementPassive"):
+        item_id = rng.choice(sample.passive)[0]
+        if kind == "electricalIncrementPassive":
+            body = {"item_id": item_id, "num_to_add": 1}
+        else:
+            body = {"id": item_id, "num_to_remove": 1}
+        body["token"] = sample.token
+        return "POST", f"/{kind}", json.dumps(body).encode()
+    body = {"threshold": rng.choice([5, 10, 25])}
+    return "POST", "/electricalFindBelowThreshold", json.dumps(body).encode()
+
+
+async def send(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    host: str,
+    method: str,
+    path: str,
+    body: bytes,
+) -> tuple[int, bool]:
+    """
+    Sends one request on a keep-alive connection and reads the whole response
+
+    Args:
+        reader (asyncio.StreamReader): the connection's reader
+        writer (asyncio.StreamWriter): the connection's writer
+        host (str): the Host header
+        method (str): the HTTP method
+        path (str): the path with query string
+        body (bytes): the request body
+
+    Returns:
+        tuple[int, bool]: the response status code and whether the connection can be reused
+    """
+    headers = [f"{method} {path} HTTP/1.1", f"Host: {host}", "Connection: keep-alive"]
+    if body:
+        headers += ["Content-Type: application/json", f"Content-Length: {len(body)}"]
+    writer.write(("\r\n".join(headers) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    chunked = False
+    keep_alive = True
+    while True:
+        line = (await reader.readline()).strip()
+        if not line:
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        name = name.lower()
+        if name == "content-length":
+            length = int(value)
+        elif name == "transfer-encoding" and "chunked" in value.lower():
+            chunked = True
+        elif name == "connection" and "close" in value.lower():
+            keep_alive = False
+    if chunked:
+        while True:
+            size = int((await reader.readline()).strip(), 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    else:
+        await reader.readexactly(length)
+    return status, keep_alive
+
+
+async def virtual_user(
+    url: str, sample: Sample, deadline: float, seed: int, results: dict
+) -> None:
+    """
+    Sends requests until the deadline, reconnecting if the server closes the connection
+
+    Args:
+        url (str): the base URL of the API
+        sample (Sample): the items to pick from
+        deadline (float): time.perf_counter() value to stop at
+        seed (int): the seed of this user's random generator
+        results (dict): latencies and errors per request kind, filled in place
+
+    Returns:
+        None
+    """
+    rng = random.Random(seed)
+    parts = urlsplit(url)
+    kinds, weights = list(MIX), list(MIX.values())
+    connection = None
+    pending_decrements: list[tuple[str, str, bytes]] = []
+
+    while time.perf_counter() < deadline:
+        kind = rng.choices(kinds, weights)[0]
+        if kind in INCREMENT_FOR and pending_decrements:
+            method, path, body = pending_decrements.pop()
+            kind = path.split("?")[0].lstrip("/")
+        else:
+            # a decrement with nothing to undo becomes an increment instead
+            kind = INCREMENT_FOR.get(kind, kind)
+            method, path, body = build_request(kind, sample, rng)
+            if kind in INCREMENT_FOR.values():
+                pending_decrements.append(paired_decrement(kind, path, body))
+
+        try:
+            if connection is None:
+                connection = await asyncio.open_connection(parts.hostname, parts.port)
+            started = time.perf_counter()
+            status, keep_alive = await send(*connection, parts.netloc, method, path, body)
+            elapsed = time.perf_counter() - started
+            if not keep_alive:
+                # e.g. the werkzeug development server closes after every response
+                connection[1].close()
+                connection = None
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            results.setdefault(kind, {"latencies": [], "errors": 0})["errors"] += 1
+            if connection is not None:
+                connection[1].close()
+            connection = None
+            continue
+
+        entry = results.setdefault(kind, {"latencies": [], "errors": 0})
+        entry["latencies"].append(elapsed)
+        if status >= 500:
+            entry["errors"] += 1
+
+    if connection is not None:
+        connection[1].close()
+
+
+def paired_decrement(kind: str, path: str, body: bytes) -> tuple[str, str, bytes]:
+    """
+    Builds the decrement that undoes an increment
+
+    Args:
+        kind (str): "increment" or "electricalIncrementPassive"
+        path (str): the increment's path with query string
+        body (bytes): the increment's body
+
+    Returns:
+        tuple[str, str, bytes]: the method, path and body of the decrement
+    """
+    if kind == "increment":
+        return "GET", path.replace("/increment", "/decrement", 1), b""
+    data = json.loads(body)
+    undo = {"id": data["item_id"], "num_to_remove": data["num_to_add"], "token": data["token"]}
+    return "POST", "/electricalDecrementPassive", json.dumps(undo).encode()
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    """
+    Returns a percentile of sorted values by the nearest-rank method
+
+    Args:
+        values (list[float]): the sorted values
+        fraction (float): the percentile as a fraction, e.g. 0.95
+
+    Returns:
+        float: the value at that rank
+    """
+    if not values:
+        return float("nan")
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))]
+
+
+def report(results: dict, duration: float) -> None:
+    """
+    Prints throughput and latency percentiles per request kind and overall
+
+    Args:
+        results (dict): latencies and errors per request kind
+        duration (float): the length of the run in seconds
+
+    Returns:
+        None
+    """
+    print(f"{'request':<30} {'count':>7} {'err':>5} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    everything: list[float] = []
+    errors = 0
+    for kind in sorted(results):
+        latencies = sorted(results[kind]["latencies"])
+        everything += latencies
+        errors += results[kind]["errors"]
+        print(
+            f"{kind:<30} {len(latencies):>7} {results[kind]['errors']:>5} "
+            f"{len(latencies) / duration:>8.1f} {percentile(latencies, 0.5) * 1000:>8.2f} "
+            f"{percentile(latencies, 0.95) * 1000:>8.2f} {percentile(latencies, 0.99) * 1000:>8.2f}"
+        )
+    everything.sort()
+    print(
+        f"{'total':<30} {len(everything):>7} {errors:>5} {len(everything) / duration:>8.1f} "
+        f"{percentile(everything, 0.5) * 1000:>8.2f} {percentile(everything, 0.95) * 1000:>8.2f} "
+        f"{percentile(everything, 0.99) * 1000:>8.2f}"
+    )
+
+
+def spawn_server(root: str, port: int) -> subprocess.Popen:
+    """
+    Starts the app against the generated database and waits until it accepts connections
+
+    Args:
+        root (str): the directory created by generate_data.py
+        port (int): the port to listen on
+
+    Returns:
+        subprocess.Popen: the server process
+    """
+    code = (
+        "from app import app, configure_logging; configure_logging(); "
+        f"app.run(port={port}, threaded=True)"
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-c", code],
+        cwd=os.path.join(root, "src"),
+        env={**os.environ, "PYTHONPATH": SRC_DIR},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.1).close()
+            return server
+        except OSError:
+            time.sleep(0.1)
+    server.terminate()
+    sys.exit("The server did not start")
+
+
+async def run(args: argparse.Namespace) -> None:
+    with open(os.path.join(args.root, "data", "loadtest_token"), encoding="utf-8") as f:
+        token = f.read().strip()
+    sample = Sample(os.path.join(args.root, "data", "data.db"), token)
+    results: dict = {}
+
+    if args.warmup:
+        deadline = time.perf_counter() + args.warmup
+        await asyncio.gather(
+            *(virtual_user(args.url, sample, deadline, -i, {}) for i in range(args.users))
+        )
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(
+        *(
+            virtual_user(args.url, sample, deadline, args.seed + i, results)
+            for i in range(args.users)
+        )
+    )
+    report(results, time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--root", required=True, help="directory created by generate_data.py")
+    parser.add_argument("--url", default="http://127.0.0.1:3000")
+    parser.add_argument("--spawn", action="store_true", help="start the app on the --url port")
+    parser.add_argument("--users", type=int, default=16, help="concurrent connections")
+    parser.add_argument("--duration", type=float, default=30.0, help="seconds to measure")
+    parser.add_argument("--warmup", type=float, default=3.0, help="seconds before measuring")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    args.root = os.path.abspath(args.root)
+
+    server = spawn_server(args.root, urlsplit(args.url).port) if args.spawn else None
+    try:
+        asyncio.run(run(args))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
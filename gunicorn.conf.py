@@ -0,0 +1,12 @@
+"""
+gunicorn settings, read from the working directory when gunicorn starts.
+
+The event streams (/changes and /followLog) hold their request thread for up
+to STREAM_MAX_SECONDS. With sync workers each open stream would take a whole
+worker, so the workers are threaded, and at most MAX_STREAMS requests per
+worker are streams (see utility_functions.StreamSlot).
+"""
+
+worker_class = "gthread"
+# requests served at once by each worker, more than MAX_STREAMS
+threads = 8
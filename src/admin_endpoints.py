@@ -0,0 +1,50 @@
+"""
+This module provides diagnostic endpoints for admins.
+It includes functions to:
+    - require an admin login token
+    - get the SQL query profile with plans and slow statements
+"""
+
+from typing import Tuple
+
+from flask import Response, jsonify, request
+
+from auth_db import check_admin
+from query_profiler import get_profile
+from utility_functions import get_db, handle_exceptions
+
+
+def require_admin(data: dict) -> None:
+    """
+    Raises if the request does not carry an admin's login token
+
+    Args:
+        data (dict): the request arguments
+
+    Returns:
+        None
+    """
+    if not data or "token" not in data:
+        raise KeyError("Missing required parameters")
+    if not check_admin(data["token"], get_db().cursor()):
+        raise KeyError("User does not have admin privileges")
+
+
+def get_query_profile() -> Tuple[Response, int]:
+    """
+    Handles getting the SQL query profile of all workers
+
+    Args:
+        token (str): the login token of an admin
+        flagged (str) optional: "true" to only return statements whose plan was flagged
+
+    Returns:
+        Tuple[Response, int]: a message with the statements, slow log and status code
+    """
+    try:
+        data = request.args
+        require_admin(data)
+        flagged_only = data.get("flagged", "").strip().lower() == "true"
+        return jsonify({"status": "success", **get_profile(flagged_only)}), 200
+    except Exception as e:
+        return handle_exceptions(e)
@@ -18,7 +18,7 @@ Functions:
     fzf(name: str, is_metric: int, size: str, cursor: sqlite3.Cursor, top_n: int = 5) -> list[dict]
     get_item(item_id: int, cursor: sqlite3.Cursor) -> list[dict] | None
     increment_item(item_id: int, num_added: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> None
-    decrement_item(item_id: int, num_removed: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> int
+    decrement_item(item_id: int, num_removed: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> tuple[int, int | None]
     add_item(name: str, size: str, is_metric: int, location: str, count: int, threshold: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> None
     remove_item(item_id: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> None
 
@@ -37,7 +37,18 @@ import glob
 import logging
 import sqlite3
 
-from fuzzywuzzy import fuzz, process
+from reservation_db import take_stock
+
+# columns left out of CSV backups, they are not restored by import_csv
+DERIVED_COLUMNS = (
+    "updated_seq",
+    "size_diameter",
+    "size_pitch",
+    "size_length",
+    "location_id",
+    "reserved",
+    "available",
+)
 
 
 def build_db() -> None:
@@ -138,6 +149,8 @@ def fzf(
     Returns:
         list[dict]: list of json objects
     """
+    from fuzzywuzzy import fuzz, process  # imported on first search, it is slow to load
+
     cursor.execute(
         """
         SELECT id, name, is_metric, size, loc_shelf, loc_rack, loc_box,
@@ -244,9 +257,9 @@ def decrement_item(
     num_removed: int,
     cursor: sqlite3.Cursor,
     connection: sqlite3.Connection,
-) -> int:
+) -> tuple[int, int | None]:
     """
-    decrements an item's count by num_removed
+    decrements an item's count by num_removed, never into reserved units
 
     Args:
         item_id (int): the item do decriment
@@ -255,19 +268,16 @@ def decrement_item(
         connection (sqlite3.Connection): SQLite connection object to commit changes
 
     Returns:
-        int: status code (0/1) for if an email needs to be sent
+        tuple[int, int | None]: status code (0/1) for if an email needs to be sent, and the
+            number of units removed, None if reserved units are in the way
     """
     item = get_item(item_id, cursor)
-    new_count = item[0]["count"] - num_removed
-    new_count = max(new_count, 0)
-    cursor.execute(
-        """update items set count = ? where id = ?""",
-        (
-            new_count,
-            item_id,
-        ),
-    )
+    removed = take_stock(cursor, "idea", item_id, num_removed)
+    if removed is None:
+        connection.rollback()
+        return 0, None
     connection.commit()
+    new_count = get_item(item_id, cursor)[0]["count"]
     if new_count < int(item[0]["threshold"]) and not item[0]["isContacted"]:
         cursor.execute(
             """
@@ -276,8 +286,8 @@ def decrement_item(
             (item_id,),
         )
         connection.commit()
-        return 1
-    return 0
+        return 1, removed
+    return 0, removed
 
 
 def add_item(
@@ -454,7 +464,12 @@ def backup_data(cursor: sqlite3.Cursor) -> None:
     items = cursor.fetchall()
 
     # Assuming column names are available in cursor.description
+    # updated_seq is sync bookkeeping and the size_*, location_id, reserved and
+    # available columns are derived, import_csv relies on the original columns
     column_names = [description[0] for description in cursor.description]
+    kept = [i for i, name in enumerate(column_names) if name not in DERIVED_COLUMNS]
+    column_names = [column_names[i] for i in kept]
+    items = [tuple(item[i] for i in kept) for item in items]
 
     date = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
 
@@ -3,6 +3,11 @@ This module provides API endpoints for an inventory management system.
 
 Functions:
     teardown_db: Cleans up the connections and global variable on quit.
+    begin_request_metrics: Starts timing each request.
+    not_modified: Answers conditional GETs of unchanged read endpoints with 304.
+    encode_response: Sets ETags and compresses large responses.
+    note_request_status: Remembers the status code for the request metrics.
+    end_request_metrics: Records the metrics of each finished request.
     run_server: Ensures the database has the required table for items,
                 then runs the development server.
 
@@ -10,10 +15,15 @@ Endpoints:
     /addItem: Adds a new item to the database.
     /find: Returns a specific item from the database.
     /findAll: Returns all items from the database.
+    /sync: Returns the items changed or deleted since a client's last sync.
+    /search: Searches the IDEA lab items, active parts, assemblies and passive parts at once.
+    /autocomplete: Completes item names and part numbers as they are typed.
+    /byLocation: Lists the items of every inventory on a shelf, rack or box.
     /increment: Increments an item's count by `num_added`.
     /decrement: Decrements an item's count by `num_removed`.
     /remove: Deletes an item from the database.
     /fuzzyfind: Returns a list of items that are similar to the search term.
+    /dimensionSearch: Returns the items with a thread size and length in a range.
     /updateitem: Updates an item in the database.
 
     /register: Registers a new user.
@@ -32,7 +42,27 @@ Endpoints:
     /downloadFile: Downloads a file from the database.
     /getBackupFiles: Returns a list of backup files.
 
-    /get_log: Returns a list of log entries.
+    /setBomLine: Sets how many of a component an assembly takes.
+    /buildable: Returns how many of an assembly can be built and what is short.
+    /build: Builds an assembly, taking all of its components out of stock at once.
+
+    /reserve: Holds units of an item for a project until the hold expires.
+    /updateReservation: Changes the quantity or expiry of a hold.
+    /fulfillReservation: Pulls the held units of a reservation for a kit.
+    /releaseReservation: Releases a hold without taking its units.
+    /reservations: Returns the reservations of a project or an item.
+
+    /history: Returns the stock movements of an item.
+    /compactHistory: Rolls up movements from previous months (admin only).
+    /runForecast: Recomputes the usage forecasts and suggested thresholds (admin only).
+
+    /get_log: Returns a page of log entries read from the end of the logs.
+    /followLog: Streams new log entries as server-sent events.
+
+    /changes: Streams inventory changes as server-sent events, or long-polls for them.
+
+    /metrics: Returns request and database metrics of all workers in Prometheus format.
+    /queryProfile: Returns the SQL statement profile, query plans and slow log (admin only).
 """
 
 import hashlib
@@ -40,15 +70,15 @@ import io
 import logging
 import os
 from io import BytesIO
-from logging.handlers import TimedRotatingFileHandler
 from typing import Tuple
 
 from flask import Flask, Response, g, jsonify, request, send_file
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 
-from api import backup_data, build_db, get_backup_files, get_item
-from auth_db import ensure_table
+from admin_endpoints import get_query_profile
+from api import backup_data, get_backup_files, get_item
+from app_logging import configure_logging
 from auth_endpoints import (
     change_user_password_level,
     check_auth_token,
@@ -59,13 +89,16 @@ from auth_endpoints import (
     register_new_user,
     try_login,
 )
+from bom_endpoints import build, get_buildable, set_assembly_component
+from bootstrap import bootstrap
+from change_feed import stream_changes, wait_for_changes
 from electrical_db import (
     backup_data_el,
-    calculate_multiplier,
-    ensure_tables,
     get_backup_files_el,
 )
 from electrical_endpoints import (  # update_passive_item,; update_active_item,
+    decrement_active_item,
+    decrement_passive_item,
     electrical_add_item,
     electrical_get_tooltip,
     electrical_update_item,
@@ -77,12 +110,18 @@ from electrical_endpoints import (  # update_passive_item,; update_active_item,
     fuzzy_find_passive_item,
     get_backup_files_el,
     get_mult,
+    increment_active_item,
+    increment_passive_item,
     remove_active_item,
     remove_passive_item,
+    update_mult,
 )
+from forecast import start_forecast_job
+from http_cache import check_not_modified, finish_response
 from idea_endpoints import (
     add_item_idea,
     decrement_idea,
+    dimension_search_idea,
     find_all_items_idea,
     fuzzy_find_idea,
     increment_idea,
@@ -90,6 +129,27 @@ from idea_endpoints import (
     single_search_idea,
     update_item_idea,
 )
+from json_provider import FastJSONProvider
+from ledger_endpoints import compact_history, get_item_history, run_forecast
+from log_reader import follow_log, query_log
+from metrics import (
+    finish_request,
+    note_response,
+    render_metrics,
+    reset_metrics_dir,
+    start_request,
+)
+from request_profiler import RequestProfiler
+from reservation_db import start_sweeper
+from reservation_endpoints import (
+    change_reservation_item,
+    fulfill_reservation_item,
+    list_reservations,
+    release_reservation_item,
+    reserve_item,
+)
+from search_endpoints import autocomplete, by_location, unified_search
+from sync_endpoints import sync_items
 from utility_functions import (
     add_from_csv,
     delete_backup,
@@ -98,9 +158,17 @@ from utility_functions import (
     import_csv,
     import_csv_el,
     refresh_from_csv_el,
+    stream_response,
 )
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)  # orjson when installed, stdlib otherwise
+app.wsgi_app = RequestProfiler(app.wsgi_app)  # profiles requests flagged by an admin or sampled
+bootstrap()  # sets up the schema once, also under gunicorn
+configure_logging()  # once per process, gunicorn never calls run_server
+reset_metrics_dir()  # drops the counters of dead workers and earlier deploys
+start_forecast_job()  # in every worker, only the one holding the job lock runs it
+start_sweeper()  # expires overdue holds, also under gunicorn
 
 CORS(
     app,
@@ -114,6 +182,46 @@ log = logging.getLogger("werkzeug")
 log.disabled = True  # Enable CORS for Angular frontend
 
 
+@app.before_request
+def begin_request_metrics() -> None:
+    """
+    starts timing the request, registered first so 304s are timed too
+    """
+    start_request()
+
+
+@app.before_request
+def not_modified() -> Response | None:
+    """
+    answers conditional GETs of unchanged read endpoints with 304
+    """
+    return check_not_modified()
+
+
+@app.after_request
+def encode_response(response: Response) -> Response:
+    """
+    sets ETags and compresses large responses
+    """
+    return finish_response(response)
+
+
+@app.after_request
+def note_request_status(response: Response) -> Response:
+    """
+    remembers the status code for the request metrics
+    """
+    return note_response(response)
+
+
+@app.teardown_request
+def end_request_metrics(error: BaseException | None) -> None:
+    """
+    records the metrics of the finished request
+    """
+    finish_request(error)
+
+
 @app.teardown_appcontext
 def teardown_db(_: Exception) -> None:
     """
@@ -180,6 +288,14 @@ def fuzzy_find() -> Tuple[Response, int]:
     return fuzzy_find_idea()
 
 
+@app.route("/dimensionSearch", methods=["GET"])
+def dimension_search() -> Tuple[Response, int]:
+    """
+    endpoint to find items by thread size and length
+    """
+    return dimension_search_idea()
+
+
 @app.route("/findAll", methods=["GET"])
 def find_all() -> Tuple[Response, int]:
     """
@@ -395,25 +511,116 @@ def download_file() -> Tuple[Response, int]:
 @app.route("/get_log", methods=["GET"])
 def get_log() -> Tuple[Response, int]:
     """
-    Handles getting the log files contents
+    Handles getting a page of log entries, newest first
 
     Args:
-        None
+        cursor (str) optional: the cursor returned by the previous page
+        limit (int) optional: the maximum number of entries to return
+        level (str) optional: only return entries with this level
+        user (str) optional: only return entries mentioning this user
+        since (str) optional: only return entries at or after this time
+        until (str) optional: only return entries at or before this time
 
     Returns:
         Tuple[Response, int]: a message with possible log contents and status code
     """
     try:
-        log_contents = ""
-        for file in os.listdir("../logs"):
-            with open(f"../logs/{file}", "r", encoding="utf-8") as f:
-                log_contents += f.read()
+        data = request.args
+        page = query_log(
+            cursor=data.get("cursor"),
+            limit=int(data.get("limit", 200)),
+            level=data.get("level"),
+            user=data.get("user"),
+            since=data.get("since"),
+            until=data.get("until"),
+        )
+        # keep the plain text view in chronological order for the log page
+        log_contents = "\n".join(
+            f"[{entry['time']}] {entry['level']}:  {entry['message']}"
+            for entry in reversed(page["entries"])
+        )
+
+        return (
+            jsonify(
+                {
+                    "status": "success",
+                    "log": log_contents,
+                    "entries": page["entries"],
+                    "cursor": page["cursor"],
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+@app.route("/followLog", methods=["GET"])
+def follow_log_stream() -> Response | Tuple[Response, int]:
+    """
+    Handles streaming new log entries as server-sent events
+
+    Args:
+        since (int) optional: the id of the last event seen, the Last-Event-ID header on reconnect
+        level (str) optional: only send entries with this level
+        user (str) optional: only send entries mentioning this user
+
+    Returns:
+        Response: an event stream of log entries, 503 if MAX_STREAMS streams are open
+    """
+    try:
+        data = request.args
+        since = request.headers.get("Last-Event-ID", data.get("since"))
+        since = int(since) if since not in (None, "") else None
+        return stream_response(
+            follow_log(level=data.get("level"), user=data.get("user"), since=since)
+        )
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+@app.route("/changes", methods=["GET"])
+def follow_changes() -> Response | Tuple[Response, int]:
+    """
+    Handles streaming inventory changes to clients
+
+    Args:
+        since (int) optional: the last sequence number the client has seen
+        mode (str) optional: "poll" to long-poll instead of streaming
+        timeout (float) optional: seconds a long-poll waits for a change, at most 60
 
-        return jsonify({"status": "success", "log": log_contents}), 200
+    Returns:
+        Response: an event stream of changes, or the changes after `since` when polling,
+            503 if MAX_STREAMS streams are open
+    """
+    try:
+        data = request.args
+        since = request.headers.get("Last-Event-ID", data.get("since"))
+        since = int(since) if since not in (None, "") else None
+        if data.get("mode") == "poll":
+            timeout = min(float(data.get("timeout", 25)), 60.0)
+            return jsonify(wait_for_changes(since or 0, timeout)), 200
+        return stream_response(stream_changes(since))
     except Exception as e:
         return handle_exceptions(e)
 
 
+@app.route("/metrics", methods=["GET"])
+def metrics() -> Response:
+    """
+    endpoint to get the request metrics in Prometheus format
+    """
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/queryProfile", methods=["GET"])
+def query_profile() -> Tuple[Response, int]:
+    """
+    endpoint to get the SQL query profile
+    """
+    return get_query_profile()
+
+
 @app.route("/checkToken", methods=["POST"])
 def check_user_token() -> Tuple[Response, int]:
     """
@@ -518,6 +725,38 @@ def fuzzy_find_assembly_el() -> Tuple[Response, int]:
     return fuzzy_find_active_item(True)
 
 
+@app.route("/electricalIncrementPassive", methods=["POST"])
+def increment_passive_el() -> Tuple[Response, int]:
+    """
+    endpoint to increment a passive item's count
+    """
+    return increment_passive_item()
+
+
+@app.route("/electricalDecrementPassive", methods=["POST"])
+def decrement_passive_el() -> Tuple[Response, int]:
+    """
+    endpoint to decrement a passive item's count
+    """
+    return decrement_passive_item()
+
+
+@app.route("/electricalIncrementActive", methods=["POST"])
+def increment_active_el() -> Tuple[Response, int]:
+    """
+    endpoint to increment an active item's count
+    """
+    return increment_active_item()
+
+
+@app.route("/electricalDecrementActive", methods=["POST"])
+def decrement_active_el() -> Tuple[Response, int]:
+    """
+    endpoint to decrement an active item's count
+    """
+    return decrement_active_item()
+
+
 @app.route("/electricalFindBelowThreshold", methods=["POST"])
 def find_below_threshold_el() -> Tuple[Response, int]:
     """
@@ -558,6 +797,126 @@ def get_multipliers() -> Tuple[Response, int]:
     return get_mult()
 
 
+@app.route("/search", methods=["GET"])
+def search() -> Tuple[Response, int]:
+    """
+    endpoint to search every inventory at once
+    """
+    return unified_search()
+
+
+@app.route("/autocomplete", methods=["GET"])
+def complete_search() -> Tuple[Response, int]:
+    """
+    endpoint to complete item names and part numbers as they are typed
+    """
+    return autocomplete()
+
+
+@app.route("/byLocation", methods=["GET"])
+def list_location() -> Tuple[Response, int]:
+    """
+    endpoint to list everything stored at a location
+    """
+    return by_location()
+
+
+@app.route("/setBomLine", methods=["POST"])
+def set_bom_line() -> Tuple[Response, int]:
+    """
+    endpoint to set a component of an assembly's bill of materials
+    """
+    return set_assembly_component()
+
+
+@app.route("/buildable", methods=["GET"])
+def buildable() -> Tuple[Response, int]:
+    """
+    endpoint to check how many of an assembly can be built
+    """
+    return get_buildable()
+
+
+@app.route("/build", methods=["POST"])
+def build_assembly() -> Tuple[Response, int]:
+    """
+    endpoint to build an assembly from its components
+    """
+    return build()
+
+
+@app.route("/reserve", methods=["POST"])
+def reserve() -> Tuple[Response, int]:
+    """
+    endpoint to hold units of an item for a project
+    """
+    return reserve_item()
+
+
+@app.route("/updateReservation", methods=["POST"])
+def update_reservation() -> Tuple[Response, int]:
+    """
+    endpoint to change the quantity or expiry of a hold
+    """
+    return change_reservation_item()
+
+
+@app.route("/fulfillReservation", methods=["POST"])
+def fulfill_reservation() -> Tuple[Response, int]:
+    """
+    endpoint to pull the held units of a reservation
+    """
+    return fulfill_reservation_item()
+
+
+@app.route("/releaseReservation", methods=["POST"])
+def release_reservation() -> Tuple[Response, int]:
+    """
+    endpoint to release a hold
+    """
+    return release_reservation_item()
+
+
+@app.route("/reservations", methods=["GET"])
+def reservations() -> Tuple[Response, int]:
+    """
+    endpoint to list the reservations of a project or an item
+    """
+    return list_reservations()
+
+
+@app.route("/sync", methods=["GET"])
+def sync() -> Tuple[Response, int]:
+    """
+    endpoint to get the items changed since the client's last sync
+    """
+    return sync_items()
+
+
+@app.route("/history", methods=["GET"])
+def item_history() -> Tuple[Response, int]:
+    """
+    endpoint to get the stock movements of an item
+    """
+    return get_item_history()
+
+
+@app.route("/compactHistory", methods=["POST"])
+def compact_item_history() -> Tuple[Response, int]:
+    """
+    endpoint for admins to roll up movements from previous months
+    """
+    return compact_history()
+
+
+@app.route("/runForecast", methods=["POST"])
+def forecast_usage() -> Tuple[Response, int]:
+    """
+    endpoint for admins to recompute the usage forecasts
+    """
+    return run_forecast()
+
+
 @app.route("/getElectricalFiles", methods=["GET"])
 def get_files_el() -> Tuple[Response, int]:
     """
@@ -697,7 +1056,10 @@ def delete_backup_file() -> Tuple[Response, int]:
 
 def run_server() -> None:
     """
-    Ensures the database is has the table for items, then runs the development server
+    Runs the development server
+
+    The schema is set up by `bootstrap`, and logging, the forecast job and
+    the reservation sweeper are started when this module is imported.
 
     Args:
         None
@@ -705,23 +1067,6 @@ def run_server() -> None:
     Returns:
         None
     """
-    build_db()
-    ensure_tables()
-
-    # sets up logging
-    logger = logging.getLogger("app")
-    logger.setLevel(logging.INFO)
-    logger.propagate = False  # Prevent duplicate logs in parent logger
-
-    # Add the TimedRotatingFileHandler
-    if not logger.handlers:  # Avoid adding duplicate handlers
-        handler = TimedRotatingFileHandler(
-            "../logs/app.log", when="W0", interval=1, backupCount=4
-        )
-        formatter = logging.Formatter("[%(asctime)s]:  %(message)s")
-        handler.setFormatter(formatter)
-        handler.setLevel(logging.INFO)
-        logger.addHandler(handler)
     app.run(debug=True, port=3000)  # Runs on http://localhost:3000
 
 
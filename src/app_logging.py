@@ -0,0 +1,167 @@
+"""
+This module sets up the application log.
+
+Request handlers only put records on an in-memory queue, and a background
+listener thread formats them as JSON lines and writes them to the rotating
+log file, so disk latency never lands on a request. The pipeline is built
+when the app is imported, once in each process, so gunicorn workers log too.
+A worker forked from a preloaded app inherits the queue handler but not the
+writer thread, so `log_action` starts a new one on its first record there.
+
+Functions:
+    configure_logging(log_dir: str = LOG_DIR) -> logging.Logger
+    stop_logging() -> None
+    log_action(action: str, message: str, user: str | None = None, ...) -> None
+"""
+
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from typing import Optional
+
+LOG_DIR = "../logs"
+LOG_FILE = "app.log"
+LOGGER_NAME = "app"
+STRUCTURED_FIELDS = ("user", "action", "item", "delta", "duration_ms")
+
+_listener: Optional[QueueListener] = None
+# the process that started the listener, a forked worker does not have its thread
+_listener_pid: Optional[int] = None
+_configure_lock = threading.Lock()
+
+
+class JsonLineFormatter(logging.Formatter):
+    """
+    Formats a record as a single JSON object per line
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        """
+        Formats the record with its structured fields
+
+        Args:
+            record (logging.LogRecord): the record to format
+
+        Returns:
+            str: the JSON encoded record
+        """
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created).strftime(
+                "%Y-%m-%d %H:%M:%S,%f"
+            )[:-3],
+            "level": record.levelname,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(log_dir: str = LOG_DIR) -> logging.Logger:
+    """
+    Attaches a queue handler to the app logger and starts the file writer thread
+
+    Calling this more than once is safe, the pipeline is only built the first
+    time in each process.
+
+    Args:
+        log_dir (str): the directory to write the log file to
+
+    Returns:
+        logging.Logger: the app logger
+    """
+    global _listener, _listener_pid
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False  # Prevent duplicate logs in parent logger
+
+    with _configure_lock:
+        if _listener is not None and _listener_pid == os.getpid():
+            return logger
+
+        os.makedirs(log_dir, exist_ok=True)
+        file_handler = TimedRotatingFileHandler(
+            os.path.join(log_dir, LOG_FILE), when="W0", interval=1, backupCount=4
+        )
+        file_handler.setFormatter(JsonLineFormatter())
+        file_handler.setLevel(logging.INFO)
+
+        log_queue: queue.SimpleQueue = queue.SimpleQueue()
+        logger.handlers = [QueueHandler(log_queue)]
+
+        _listener = QueueListener(log_queue, file_handler, respect_handler_level=True)
+        _listener.start()
+        if _listener_pid is None:
+            atexit.register(stop_logging)
+        _listener_pid = os.getpid()
+    return logger
+
+
+def stop_logging() -> None:
+    """
+    Flushes any queued records and stops the writer thread
+
+    Returns:
+        None
+    """
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+def log_action(
+    action: str,
+    message: str,
+    user: Optional[str] = None,
+    item: Optional[str] = None,
+    delta: Optional[int] = None,
+    started: Optional[float] = None,
+    level: int = logging.INFO,
+) -> None:
+    """
+    Logs a user action with its structured fields
+
+    Args:
+        action (str): short name of the action, e.g. "increment"
+        message (str): human readable description of the action
+        user (str, optional): the user who performed the action
+        item (str, optional): key of the item the action touched
+        delta (int, optional): the change in count caused by the action
+        started (float, optional): time.perf_counter() value from when the action began
+        level (int, optional): the logging level. Defaults to logging.INFO.
+
+    Returns:
+        None
+    """
+    if _listener_pid is not None and _listener_pid != os.getpid():
+        # forked after logging was configured, the writer thread stayed in the parent
+        configure_logging()
+    duration_ms = None
+    if started is not None:
+        duration_ms = round((time.perf_counter() - started) * 1000, 3)
+    logging.getLogger(LOGGER_NAME).log(
+        level,
+        message,
+        extra={
+            "user": user,
+            "action": action,
+            "item": item,
+            "delta": delta,
+            "duration_ms": duration_ms,
+        },
+    )
@@ -4,6 +4,7 @@ SQLite database for a user authentication and management system.
 It includes functions to:
     - Ensure the user table exists in the database
     - Generate and verify login tokens
+    - Check that a token belongs to an admin
     - Log in a user
     - Create a new user account
     - Change a user's password or access level
@@ -31,7 +32,7 @@ def ensure_table():
     Returns:
         None
     """
-    with sqlite3.connect("data/data.db") as connection:
+    with sqlite3.connect("../data/data.db") as connection:
         cursor = connection.cursor()
         cursor.execute(
             """
@@ -46,7 +47,6 @@ def ensure_table():
                 """
         )
         connection.commit()
-        connection.close()
 
 
 def generate_token(username: str, level: int):
@@ -130,6 +130,34 @@ def check_token(token: str, username: str, cursor: sqlite3.Cursor) -> bool:
     return True
 
 
+def check_admin(token: str, cursor: sqlite3.Cursor) -> bool:
+    """
+    Checks that a token is a valid, current login token of an admin (level 0)
+
+    Unlike the level checks that only decode the token, the signature is
+    verified and the level is read from the users table.
+
+    Args:
+        token (str): the token of the user
+        cursor (sqlite3.Cursor): the cursor to the database
+
+    Returns:
+        bool: whether the token belongs to a logged in admin
+    """
+    load_dotenv("../data/.env")
+    SECRET_KEY = os.environ.get("Login_Token_Secret_Key")
+    try:
+        username = jwt.decode(token, SECRET_KEY, algorithms=["HS256"]).get("username")
+    except jwt.PyJWTError:
+        return False
+    cursor.execute(
+        "SELECT token, level FROM users WHERE username = ?",
+        (username,),
+    )
+    user = cursor.fetchone()
+    return user is not None and user[0] == token and user[1] == 0
+
+
 def create_account(
     username: str,
     level: int,
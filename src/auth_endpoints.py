@@ -12,7 +12,6 @@ It includes functions to:
 from typing import Tuple
 import hashlib
 import os
-import logging
 import jwt
 from flask import request, jsonify, Response
 
@@ -26,6 +25,7 @@ from auth_db import (
     generate_token,
     delete_user,
 )
+from app_logging import log_action
 from utility_functions import handle_exceptions, get_db
 
 
@@ -64,8 +64,7 @@ def try_login() -> Tuple[Response, int]:
         token = login(username, hashed_password, cursor, connection)
         if token == "":
             raise Exception("Login failed")
-        logger = logging.getLogger("app")
-        logger.info(f"User '{username}' logged in")
+        log_action("login", f"User '{username}' logged in", user=username)
         return jsonify({"status": "success", "token": token}), 200
     except Exception as e:
         return handle_exceptions(e)
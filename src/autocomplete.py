@@ -0,0 +1,326 @@
+"""
+This module provides typeahead completions over the inventory names and part numbers.
+
+Every IDEA item's name and size, active item's name and part_id and passive
+item's part number is indexed under its whole lower-cased text and under
+each word it contains, so "bolt" completes "Hex Bolt". The keys are kept in
+one sorted list: the completions of a prefix are the slice found with two
+bisections, ranked by stock count. Only copying the slice holds the lock,
+the ranking runs outside it. Slices of short prefixes are large, so the
+completions of each prefix are memoized until the next write.
+
+The index is loaded from the database on first use and then kept up to date
+from the change feed: each change re-reads that one item and replaces its
+keys, and a reset (a CSV restore) reloads its whole inventory. A change
+that cannot be applied reloads every inventory.
+
+Functions:
+    index_keys(text: str) -> set[str]
+    complete(prefix: str, limit: int = 10) -> list[dict]
+"""
+
+import bisect
+import heapq
+import queue
+import sqlite3
+import threading
+from typing import Optional
+
+from change_feed import subscribe, unsubscribe
+
+DB_PATH = "../data/data.db"
+# the most memoized prefixes, the memo is emptied when it is full
+MEMO_SIZE = 4096
+
+# the table and the indexed columns of each inventory
+INDEXED_COLUMNS = {
+    "idea": ("items", ("name", "size")),
+    "active": ("electrical_active_items", ("name", "part_id")),
+    "passive": ("electrical_passive_items", ("part_number",)),
+}
+
+# (key, source, item id, field), sorted
+_keys: list[tuple[str, str, int, str]] = []
+# (source, item id) -> (keys, count, {field: text})
+_items: dict[tuple[str, int], tuple[list, int, dict]] = {}
+_memo: dict[tuple[str, int], list[dict]] = {}
+# counts the writes, a completion ranked across a write is not memoized
+_generation = 0
+_lock = threading.Lock()
+_init_lock = threading.Lock()
+_updater: Optional[threading.Thread] = None
+
+
+def index_keys(text: str) -> set[str]:
+    """
+    Returns the keys a text is found under: the whole text and every suffix starting at a word
+
+    Args:
+        text (str): the indexed name or part number
+
+    Returns:
+        set[str]: the lower-cased keys
+    """
+    text = " ".join(text.lower().split())
+    keys = {text} if text else set()
+    for i, char in enumerate(text):
+        if char == " " and i + 1 < len(text):
+            keys.add(text[i + 1 :])
+    return keys
+
+
+def read_items(
+    cursor: sqlite3.Cursor, source: str, item_id: Optional[int] = None
+) -> list[tuple]:
+    """
+    Reads the indexed columns of an inventory, or of one item
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        source (str): the inventory ("idea", "active" or "passive")
+        item_id (int, optional): the item to read. Defaults to every item.
+
+    Returns:
+        list[tuple]: (id, count, *indexed columns) per item
+    """
+    table, columns = INDEXED_COLUMNS[source]
+    query = f"SELECT id, count, {', '.join(columns)} FROM {table}"
+    if item_id is None:
+        cursor.execute(query)
+    else:
+        cursor.execute(f"{query} WHERE id = ?", (item_id,))
+    return cursor.fetchall()
+
+
+def item_keys(source: str, row: tuple) -> tuple[list, int, dict]:
+    """
+    Builds the index entry of an item
+
+    Args:
+        source (str): the item's inventory
+        row (tuple): the item as returned by read_items
+
+    Returns:
+        tuple[list, int, dict]: the item's keys, its count and its indexed text by field
+    """
+    item_id, count, *values = row
+    fields = dict(zip(INDEXED_COLUMNS[source][1], values))
+    keys = [
+        (key, source, item_id, field)
+        for field, text in fields.items()
+        if text
+        for key in index_keys(str(text))
+    ]
+    return keys, count or 0, fields
+
+
+def remove_item(source: str, item_id: int) -> None:
+    """
+    Removes an item's keys from the index, the caller holds _lock
+
+    Args:
+        source (str): the item's inventory
+        item_id (int): the item's id
+
+    Returns:
+        None
+    """
+    entry = _items.pop((source, item_id), None)
+    if entry is None:
+        return
+    for key in entry[0]:
+        i = bisect.bisect_left(_keys, key)
+        if i < len(_keys) and _keys[i] == key:
+            del _keys[i]
+
+
+def add_item(source: str, row: tuple) -> None:
+    """
+    Adds an item's keys to the index, the caller holds _lock
+
+    Args:
+        source (str): the item's inventory
+        row (tuple): the item as returned by read_items
+
+    Returns:
+        None
+    """
+    entry = item_keys(source, row)
+    for key in entry[0]:
+        bisect.insort(_keys, key)
+    _items[(source, row[0])] = entry
+
+
+def load_source(cursor: sqlite3.Cursor, source: str) -> None:
+    """
+    Replaces the indexed items of one inventory with what is in the database
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        source (str): the inventory to reload
+
+    Returns:
+        None
+    """
+    global _keys, _generation
+
+    rows = read_items(cursor, source)
+    with _lock:
+        kept = [key for key in _keys if key[1] != source]
+        for key in list(_items):
+            if key[0] == source:
+                del _items[key]
+        # one sort of the whole list is faster than inserting every key
+        _keys = kept
+        for row in rows:
+            entry = item_keys(source, row)
+            _keys.extend(entry[0])
+            _items[(source, row[0])] = entry
+        _keys.sort()
+        _memo.clear()
+        _generation += 1
+
+
+def apply_change(cursor: sqlite3.Cursor, event: dict) -> None:
+    """
+    Updates the index for one change feed event
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        event (dict): the change event
+
+    Returns:
+        None
+    """
+    global _generation
+
+    source = event["source"]
+    if source not in INDEXED_COLUMNS:
+        return
+    if event["op"] == "reset" or event["item_id"] is None:
+        load_source(cursor, source)
+        return
+
+    # the event is read after its commit, so the row is re-read rather than
+    # trusted from the event: a later update or delete may already be in
+    rows = read_items(cursor, source, event["item_id"])
+    with _lock:
+        remove_item(source, event["item_id"])
+        for row in rows:
+            add_item(source, row)
+        _memo.clear()
+        _generation += 1
+
+
+def update_loop(subscriber: queue.Queue) -> None:
+    """
+    Applies change feed events to the index as they arrive
+
+    Args:
+        subscriber (queue.Queue): the change feed subscription
+
+    Returns:
+        None
+    """
+    connection = sqlite3.connect(DB_PATH, check_same_thread=False)
+    cursor = connection.cursor()
+    while True:
+        event = subscriber.get()
+        try:
+            apply_change(cursor, event)
+        except Exception as e:
+            # the change is lost, so the index is reloaded rather than left stale
+            print(f"Autocomplete index error: {e!r}, reloading the index")
+            try:
+                for source in INDEXED_COLUMNS:
+                    load_source(cursor, source)
+            except Exception as e:
+                print(f"Autocomplete reload error: {e!r}")
+
+
+def ensure_index() -> None:
+    """
+    Loads the index and starts following the change feed, once per process
+
+    The subscription starts before the load so no change committed during it is missed.
+
+    Returns:
+        None
+    """
+    global _updater
+
+    if _updater is not None:
+        return
+    with _init_lock:
+        if _updater is not None:
+            return
+        subscriber = subscribe()
+        connection = sqlite3.connect(DB_PATH)
+        try:
+            for source in INDEXED_COLUMNS:
+                load_source(connection.cursor(), source)
+        except BaseException:
+            unsubscribe(subscriber)
+            raise
+        finally:
+            connection.close()
+        _updater = threading.Thread(
+            target=update_loop, args=(subscriber,), name="autocomplete", daemon=True
+        )
+        _updater.start()
+
+
+def complete(prefix: str, limit: int = 10) -> list[dict]:
+    """
+    Returns the items with a name or part number starting with the prefix, most stocked first
+
+    Args:
+        prefix (str): what has been typed so far
+        limit (int, optional): the most completions to return
+
+    Returns:
+        list[dict]: the completions, one per item: its source, id, matching field, text and count
+    """
+    ensure_index()
+    prefix = " ".join(prefix.lower().split())
+    if not prefix:
+        return []
+
+    memo_key = (prefix, limit)
+    with _lock:
+        if memo_key in _memo:
+            return _memo[memo_key]
+        generation = _generation
+        start = bisect.bisect_left(_keys, (prefix,))
+        # the first string after every string starting with the prefix
+        end = bisect.bisect_left(_keys, (prefix[:-1] + chr(ord(prefix[-1]) + 1),))
+        matches = _keys[start:end]
+
+    # the entries are replaced, never changed, so each one read is consistent
+    entries: dict[tuple[str, int], tuple[str, tuple]] = {}
+    for _, source, item_id, field in matches:
+        if (source, item_id) not in entries:
+            entry = _items.get((source, item_id))
+            if entry is not None:
+                entries[(source, item_id)] = (field, entry)
+    top = heapq.nlargest(limit, entries, key=lambda item: entries[item][1][1])
+
+    completions = []
+    for source, item_id in top:
+        field, (_, count, fields) = entries[(source, item_id)]
+        completions.append(
+            {
+                "source": source,
+                "id": item_id,
+                "field": field,
+                "text": fields[field],
+                "count": count,
+            }
+        )
+
+    with _lock:
+        if generation == _generation:
+            if len(_memo) >= MEMO_SIZE:
+                _memo.clear()
+            _memo[memo_key] = completions
+    return completions
@@ -0,0 +1,289 @@
+"""
+This module provides the bills of materials of the electrical assemblies.
+
+An assembly is an active item with `is_assembly` set. Its `bom_lines` list
+the active and passive components one assembly takes and how many of each.
+Whether an assembly can be built is one query joining its lines to both
+item tables, and building it takes all of its components out of stock in
+one transaction, with one UPDATE per item table. Only available units count,
+units held by reservations are short like missing ones. Lines are deleted by
+triggers when their assembly or component is removed, the same way the
+locations are kept, so no code removing items has to know about them.
+
+Functions:
+    bom_triggers() -> list[str]
+    find_assembly_id(cursor: sqlite3.Cursor, assembly: str) -> int
+    set_bom_line(cursor: sqlite3.Cursor, connection: sqlite3.Connection, assembly_id: int, source: str, component_id: int, quantity: int) -> None
+    check_buildable(cursor: sqlite3.Cursor, assembly_id: int, quantity: int = 1) -> dict
+    build_assembly(connection: sqlite3.Connection, assembly_id: int, quantity: int) -> dict
+"""
+
+import sqlite3
+
+from change_feed import emit_change
+
+# the inventories a component can come from, and their tables
+COMPONENT_TABLES = {
+    "active": "electrical_active_items",
+    "passive": "electrical_passive_items",
+}
+
+BOM_TABLE = """
+    CREATE TABLE IF NOT EXISTS bom_lines (
+        assembly_id INTEGER NOT NULL REFERENCES electrical_active_items(id),
+        component_source TEXT NOT NULL CHECK (component_source IN ('active', 'passive')),
+        component_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        PRIMARY KEY (assembly_id, component_source, component_id)
+    ) WITHOUT ROWID
+"""
+
+# finds the assemblies a removed component is used in
+BOM_COMPONENT_INDEX = """
+    CREATE INDEX IF NOT EXISTS idx_bom_lines_component
+    ON bom_lines (component_source, component_id)
+"""
+
+# the lines of an assembly with the unreserved stock of their components, at least 0
+BOM_QUERY = """
+    SELECT
+        b.component_source,
+        b.component_id,
+        b.quantity,
+        coalesce(a.part_id, p.part_number) AS part,
+        coalesce(a.name, p.subtype) AS name,
+        coalesce(a.count, p.count, 0) AS count,
+        max(coalesce(a.available, p.available, 0), 0) AS available
+    FROM bom_lines b
+    LEFT JOIN electrical_active_items a
+        ON b.component_source = 'active' AND a.id = b.component_id
+    LEFT JOIN electrical_passive_items p
+        ON b.component_source = 'passive' AND p.id = b.component_id
+    WHERE b.assembly_id = :assembly
+"""
+
+
+def bom_triggers() -> list[str]:
+    """
+    Builds the triggers that delete the lines of removed assemblies and components
+
+    Returns:
+        list[str]: the CREATE TRIGGER statements
+    """
+    triggers = []
+    for source, table in COMPONENT_TABLES.items():
+        removed = f"component_source = '{source}' AND component_id = OLD.id"
+        if source == "active":
+            removed = f"assembly_id = OLD.id OR ({removed})"
+        triggers.append(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_bom_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM bom_lines WHERE {removed};
+            END
+            """
+        )
+    return triggers
+
+
+def find_assembly_id(cursor: sqlite3.Cursor, assembly: str) -> int:
+    """
+    Finds an assembly by its id or part id
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        assembly (str): the id or part id of the assembly
+
+    Returns:
+        int: the id of the assembly
+
+    Raises:
+        ValueError: if there is no such assembly
+    """
+    assembly = str(assembly).strip()
+    column = "id" if assembly.isdigit() else "part_id"
+    cursor.execute(
+        f"SELECT id FROM electrical_active_items WHERE {column} = ? AND is_assembly = 1",
+        (assembly,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Assembly not found: {assembly}")
+    return row[0]
+
+
+def set_bom_line(
+    cursor: sqlite3.Cursor,
+    connection: sqlite3.Connection,
+    assembly_id: int,
+    source: str,
+    component_id: int,
+    quantity: int,
+) -> None:
+    """
+    Sets how many of a component one assembly takes, a quantity of 0 removes the line
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        connection (sqlite3.Connection): SQLite connection object to commit changes
+        assembly_id (int): the id of the assembly
+        source (str): the inventory of the component ("active" or "passive")
+        component_id (int): the id of the component in its table
+        quantity (int): the number of the component per assembly
+
+    Returns:
+        None
+
+    Raises:
+        ValueError: if the component does not exist, is the assembly itself or the quantity is negative
+    """
+    if source not in COMPONENT_TABLES:
+        raise ValueError(f"Unknown component source: {source}")
+    if quantity < 0:
+        raise ValueError("quantity must not be negative")
+    if source == "active" and component_id == assembly_id:
+        raise ValueError("An assembly cannot be its own component")
+
+    if quantity == 0:
+        cursor.execute(
+            """
+            DELETE FROM bom_lines
+            WHERE assembly_id = ? AND component_source = ? AND component_id = ?
+            """,
+            (assembly_id, source, component_id),
+        )
+    else:
+        cursor.execute(
+            f"SELECT 1 FROM {COMPONENT_TABLES[source]} WHERE id = ?", (component_id,)
+        )
+        if cursor.fetchone() is None:
+            raise ValueError(f"Component not found: {source}:{component_id}")
+        cursor.execute(
+            """
+            INSERT INTO bom_lines (assembly_id, component_source, component_id, quantity)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (assembly_id, component_source, component_id)
+            DO UPDATE SET quantity = excluded.quantity
+            """,
+            (assembly_id, source, component_id, quantity),
+        )
+    connection.commit()
+
+
+def check_buildable(cursor: sqlite3.Cursor, assembly_id: int, quantity: int = 1) -> dict:
+    """
+    Works out how many of an assembly the stock allows and what is short for `quantity` of them
+
+    The maximum and the shortages are computed by the query itself, over all
+    lines at once.
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        assembly_id (int): the id of the assembly
+        quantity (int, optional): the number of assemblies wanted
+
+    Returns:
+        dict: `max_buildable`, the `components` with their needed, in stock, available and short counts, and the `shortages`
+    """
+    cursor.execute(
+        f"""
+        SELECT
+            *,
+            quantity * :wanted AS needed,
+            max(quantity * :wanted - available, 0) AS short,
+            min(available / quantity) OVER () AS max_buildable
+        FROM ({BOM_QUERY})
+        ORDER BY short DESC, component_source, component_id
+        """,
+        {"assembly": assembly_id, "wanted": quantity},
+    )
+    columns = [column[0] for column in cursor.description]
+    components = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    # an assembly without lines cannot be built, there is nothing to take
+    max_buildable = components[0].pop("max_buildable") if components else 0
+    for component in components[1:]:
+        del component["max_buildable"]
+
+    return {
+        "assembly_id": assembly_id,
+        "quantity": quantity,
+        "max_buildable": max_buildable,
+        "buildable": bool(components) and max_buildable >= quantity,
+        "components": components,
+        "shortages": [component for component in components if component["short"]],
+    }
+
+
+def build_assembly(connection: sqlite3.Connection, assembly_id: int, quantity: int) -> dict:
+    """
+    Builds `quantity` of an assembly: takes all of its components out of stock and adds the assemblies
+
+    The stock is checked and changed in one write transaction, so two builds
+    cannot both take the same components. Nothing changes if anything is short.
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        assembly_id (int): the id of the assembly
+        quantity (int): the number of assemblies to build
+
+    Returns:
+        dict: the check_buildable result, `built` is whether the stock was changed
+    """
+    if quantity <= 0:
+        raise ValueError("quantity must be positive")
+    if connection.in_transaction:
+        connection.commit()
+    cursor = connection.cursor()
+    cursor.execute("BEGIN IMMEDIATE")
+    try:
+        result = check_buildable(cursor, assembly_id, quantity)
+        if not result["buildable"]:
+            connection.rollback()
+            return {**result, "built": False}
+
+        for source, table in COMPONENT_TABLES.items():
+            lines = "SELECT component_id FROM bom_lines WHERE assembly_id = ? AND component_source = ?"
+            line_count = sum(c["component_source"] == source for c in result["components"])
+            taken = f"""
+                ? * (
+                    SELECT quantity FROM bom_lines
+                    WHERE assembly_id = ? AND component_source = ? AND component_id = {table}.id
+                )
+            """
+            params = (quantity, assembly_id, source)
+            if source == "active":
+                # flag low stock like decrement_active_item_el does
+                cursor.execute(
+                    f"""
+                    UPDATE {table}
+                    SET count = count - {taken},
+                        is_contacted = CASE WHEN count - {taken} <= threshold THEN 1 ELSE is_contacted END
+                    WHERE id IN ({lines}) AND available >= {taken}
+                    """,
+                    params + params + (assembly_id, source) + params,
+                )
+            else:
+                cursor.execute(
+                    f"""
+                    UPDATE {table} SET count = count - {taken}
+                    WHERE id IN ({lines}) AND available >= {taken}
+                    """,
+                    params + (assembly_id, source) + params,
+                )
+            # reserved units are never taken, even if the check above missed them
+            if cursor.rowcount != line_count:
+                connection.rollback()
+                return {**result, "buildable": False, "built": False}
+            emit_change(cursor, source, "update", f"id IN ({lines})", (assembly_id, source))
+
+        cursor.execute(
+            "UPDATE electrical_active_items SET count = count + ? WHERE id = ?",
+            (quantity, assembly_id),
+        )
+        emit_change(cursor, "active", "update", params=(assembly_id,))
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return {**result, "built": True}
@@ -0,0 +1,111 @@
+"""
+This module provides endpoints for the bills of materials of the electrical assemblies.
+It includes functions to:
+    - set how many of a component an assembly takes
+    - check how many of an assembly can be built and what is short
+    - build an assembly, taking all of its components out of stock at once
+"""
+
+from typing import Tuple
+
+from flask import Response, jsonify, request
+
+from bom_db import build_assembly, check_buildable, find_assembly_id, set_bom_line
+from ledger_db import record_movement
+from utility_functions import get_db, get_token_username, handle_exceptions
+
+
+def set_assembly_component() -> Tuple[Response, int]:
+    """
+    Handles setting a line of an assembly's bill of materials
+
+    Args:
+        assembly (str): the id or part id of the assembly
+        component (str): the component as "active:id" or "passive:id"
+        quantity (int): how many one assembly takes, 0 removes the component
+
+    Returns:
+        Tuple[Response, int]: a message and status code
+    """
+    try:
+        data = request.get_json()
+        if not data or not all(key in data for key in ("assembly", "component", "quantity")):
+            raise KeyError("Missing required parameters")
+        source, _, component_id = str(data["component"]).partition(":")
+        if not component_id.isdigit():
+            raise ValueError("component must be given as source:id")
+
+        connection = get_db()
+        cursor = connection.cursor()
+        assembly_id = find_assembly_id(cursor, data["assembly"])
+        set_bom_line(
+            cursor, connection, assembly_id, source, int(component_id), int(data["quantity"])
+        )
+        return jsonify({"status": "success", "message": "Bill of materials updated"}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def get_buildable() -> Tuple[Response, int]:
+    """
+    Handles checking whether an assembly can be built
+
+    Args:
+        assembly (str): the id or part id of the assembly
+        qty (int) optional: the number of assemblies wanted (default 1)
+
+    Returns:
+        Tuple[Response, int]: a message with the most that can be built, the components and the shortages, and status code
+    """
+    try:
+        data = request.args
+        if not data or "assembly" not in data:
+            raise KeyError("Missing required parameters")
+        quantity = int(data.get("qty", 1))
+        if quantity <= 0:
+            raise ValueError("qty must be positive")
+
+        cursor = get_db().cursor()
+        result = check_buildable(cursor, find_assembly_id(cursor, data["assembly"]), quantity)
+        return jsonify({"status": "success", **result}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def build() -> Tuple[Response, int]:
+    """
+    Handles building an assembly from stock
+
+    Args:
+        assembly (str): the id or part id of the assembly
+        qty (int): the number of assemblies to build
+
+    Returns:
+        Tuple[Response, int]: a message with what was taken, or the shortages with 409, and status code
+    """
+    try:
+        data = request.get_json()
+        if not data or "assembly" not in data or "qty" not in data:
+            raise KeyError("Missing required parameters")
+        connection = get_db()
+        assembly_id = find_assembly_id(connection.cursor(), data["assembly"])
+        result = build_assembly(connection, assembly_id, int(data["qty"]))
+        if not result["built"]:
+            return (
+                jsonify({"status": "error", "message": "Not enough components", **result}),
+                409,
+            )
+
+        user = get_token_username(data.get("token"))
+        for component in result["components"]:
+            record_movement(
+                component["component_source"],
+                component["component_id"],
+                -component["needed"],
+                user,
+                "build",
+            )
+        record_movement("active", assembly_id, result["quantity"], user, "build")
+        return jsonify({"status": "success", "message": "Assembly built", **result}), 200
+    except Exception as e:
+        return handle_exceptions(e)
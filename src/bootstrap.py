@@ -0,0 +1,118 @@
+"""
+This module sets up the database schema once, when the app is imported.
+
+The schema version is kept in SQLite's `PRAGMA user_version`. A new
+database (version 0) gets the base schema from the `ensure_*` functions and
+its multipliers computed, which is version 1, then the migrations in
+migrations.py bring it up to SCHEMA_VERSION. Later starts only read one
+pragma. Because this runs when `app` is imported it also runs under
+gunicorn, where `run_server` is never called. A lock file keeps workers that
+start together from setting up the schema at the same time.
+
+Functions:
+    bootstrap() -> None
+"""
+
+import contextlib
+import os
+import sqlite3
+from typing import Iterator
+
+from api import build_db
+from auth_db import ensure_table
+from change_feed import ensure_changes_table
+from electrical_db import calculate_multiplier, ensure_tables
+from forecast import ensure_forecast_table
+from http_cache import ensure_version_table
+from ledger_db import ensure_ledger_tables
+from migrations import SCHEMA_VERSION, migrate
+from sync_db import ensure_sync_schema
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DB_PATH = "../data/data.db"
+LOCK_PATH = "../data/.bootstrap.lock"
+# the schema the ensure_* functions create, changes after it are migrations
+BASE_VERSION = 1
+
+
+@contextlib.contextmanager
+def bootstrap_lock() -> Iterator[None]:
+    """
+    Holds an exclusive lock on LOCK_PATH, where fcntl is available
+
+    Returns:
+        Iterator[None]: a context manager
+    """
+    os.makedirs(os.path.dirname(LOCK_PATH), exist_ok=True)
+    with open(LOCK_PATH, "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_schema_version() -> int:
+    """
+    Reads the schema version stored in the database
+
+    Returns:
+        int: the version, 0 for a new database
+    """
+    connection = sqlite3.connect(DB_PATH)
+    try:
+        return connection.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        connection.close()
+
+
+def bootstrap() -> None:
+    """
+    Creates the base schema of a new database and runs any pending migrations
+
+    Returns:
+        None
+    """
+    if os.path.exists(DB_PATH) and get_schema_version() >= SCHEMA_VERSION:
+        return
+
+    with bootstrap_lock():
+        # another worker may have finished while this one waited
+        version = get_schema_version()
+        if version >= SCHEMA_VERSION:
+            return
+        if version < BASE_VERSION:
+            create_base_schema()
+        migrate(DB_PATH)
+
+
+def create_base_schema() -> None:
+    """
+    Creates the version 1 tables and computes the multipliers
+
+    Returns:
+        None
+    """
+    build_db()
+    ensure_table()
+    ensure_tables()
+    ensure_ledger_tables()
+    ensure_forecast_table()
+    ensure_changes_table()
+    ensure_sync_schema()
+    ensure_version_table()
+
+    connection = sqlite3.connect(DB_PATH)
+    try:
+        calculate_multiplier(connection.cursor(), connection)
+        # PRAGMA does not take parameters, BASE_VERSION is a constant int
+        connection.execute(f"PRAGMA user_version = {BASE_VERSION}")
+        connection.commit()
+    finally:
+        connection.close()
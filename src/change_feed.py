@@ -0,0 +1,465 @@
+"""
+This module provides the inventory change feed.
+
+The DB mutation helpers call `emit_change` inside their transaction, which
+appends one row per touched item to the `changes` table. A bridge thread
+watches `PRAGMA data_version` to notice commits from any connection, in
+this worker or another one, reads the new rows and fans them out to every
+subscriber in this process through an in-memory pub/sub.
+
+Only the newest RETAINED_CHANGES events are kept. The writers prune the
+older ones themselves every PRUNE_INTERVAL events, so the table stays
+bounded whether or not anyone is subscribed. A client asking for events
+from before the oldest one kept is sent a reset of every inventory first.
+
+Functions:
+    ensure_changes_table() -> None
+    emit_change(cursor: sqlite3.Cursor, source: str, op: str, where: str = "id = ?", params: tuple = ()) -> None
+    emit_reset(cursor: sqlite3.Cursor, source: str) -> None
+    get_changes(cursor: sqlite3.Cursor, since: int, limit: int = 500) -> list[dict]
+    pruned_resets(cursor: sqlite3.Cursor, since: int) -> list[dict]
+    prune_changes(cursor: sqlite3.Cursor, keep: int = RETAINED_CHANGES) -> None
+    subscribe() -> queue.Queue
+    unsubscribe(subscriber: queue.Queue) -> None
+    stream_changes(since: int | None = None, max_seconds: float = STREAM_MAX_SECONDS) -> Iterator[str]
+    wait_for_changes(since: int, timeout: float) -> dict
+"""
+
+import datetime
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional
+
+DB_PATH = "../data/data.db"
+POLL_INTERVAL = 0.25
+KEEPALIVE_INTERVAL = 15.0
+SUBSCRIBER_QUEUE_SIZE = 1000
+RETAINED_CHANGES = 50000
+# a stream ends after this long, the client reconnects with Last-Event-ID
+STREAM_MAX_SECONDS = float(os.environ.get("STREAM_MAX_SECONDS", 300))
+# events this process emits between prunes
+PRUNE_INTERVAL = 1000
+
+ITEM_TABLES = {
+    "idea": "items",
+    "active": "electrical_active_items",
+    "passive": "electrical_passive_items",
+}
+
+_subscribers: set = set()
+_lock = threading.Lock()
+_wakeup = threading.Event()
+_bridge: Optional[threading.Thread] = None
+_emitted = 0
+
+
+def ensure_changes_table() -> None:
+    """
+    Ensures the changes table exists in the database
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    with sqlite3.connect(DB_PATH) as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS changes (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    source TEXT NOT NULL,
+                    item_id INTEGER,
+                    op TEXT NOT NULL,
+                    count INTEGER,
+                    created_at TEXT NOT NULL
+                )
+                """
+        )
+        connection.commit()
+
+
+def now_timestamp() -> str:
+    """
+    Returns the current UTC time in the format stored by the change feed
+
+    Returns:
+        str: the time as "YYYY-MM-DD HH:MM:SS"
+    """
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def emit_change(
+    cursor: sqlite3.Cursor,
+    source: str,
+    op: str,
+    where: str = "id = ?",
+    params: tuple = (),
+) -> None:
+    """
+    Records a change event for every item matching `where`
+
+    Must be called before the caller commits, and before the rows are
+    deleted for "delete" events, so the event is part of the same transaction.
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object of the mutating transaction
+        source (str): the inventory the items belong to ("idea", "active" or "passive")
+        op (str): the kind of change ("insert", "update" or "delete")
+        where (str, optional): SQL condition selecting the changed rows. Defaults to "id = ?".
+        params (tuple, optional): parameters for the condition
+
+    Returns:
+        None
+    """
+    global _emitted
+
+    cursor.execute(
+        f"""
+        INSERT INTO changes (source, item_id, op, count, created_at)
+        SELECT ?, id, ?, count, ? FROM {ITEM_TABLES[source]} WHERE {where}
+        """,
+        (source, op, now_timestamp(), *params),
+    )
+    with _lock:
+        _emitted += max(cursor.rowcount, 0)
+        prune = _emitted >= PRUNE_INTERVAL
+        if prune:
+            _emitted = 0
+    if prune:
+        # in the writer's transaction, a range delete at the start of the table
+        prune_changes(cursor)
+    _wakeup.set()
+
+
+def emit_reset(cursor: sqlite3.Cursor, source: str) -> None:
+    """
+    Records that a whole inventory was replaced, e.g. by a CSV restore
+
+    Clients receiving a reset should re-fetch that inventory.
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object of the mutating transaction
+        source (str): the inventory that was replaced
+
+    Returns:
+        None
+    """
+    cursor.execute(
+        """
+        INSERT INTO changes (source, item_id, op, count, created_at)
+        VALUES (?, NULL, 'reset', NULL, ?)
+        """,
+        (source, now_timestamp()),
+    )
+    _wakeup.set()
+
+
+def get_changes(cursor: sqlite3.Cursor, since: int, limit: int = 500) -> list[dict]:
+    """
+    Returns the change events after a sequence number
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        since (int): the last sequence number the client has seen
+        limit (int, optional): the maximum number of events to return
+
+    Returns:
+        list[dict]: the events in sequence order
+    """
+    cursor.execute(
+        """
+        SELECT seq, source, item_id, op, count, created_at
+        FROM changes WHERE seq > ? ORDER BY seq LIMIT ?
+        """,
+        (since, limit),
+    )
+    return [
+        dict(zip([column[0] for column in cursor.description], row))
+        for row in cursor.fetchall()
+    ]
+
+
+def get_first_seq(cursor: sqlite3.Cursor) -> Optional[int]:
+    """
+    Returns the oldest sequence number still kept in the change feed
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+
+    Returns:
+        int | None: the oldest sequence number, None if there are no changes
+    """
+    cursor.execute("SELECT MIN(seq) FROM changes")
+    return cursor.fetchone()[0]
+
+
+def pruned_resets(cursor: sqlite3.Cursor, since: int) -> list[dict]:
+    """
+    Returns resets of every inventory if events after `since` have been pruned
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        since (int): the last sequence number the client has seen
+
+    Returns:
+        list[dict]: the resets, numbered just before the oldest kept event, or none
+    """
+    first_seq = get_first_seq(cursor)
+    if first_seq is None or first_seq <= since + 1:
+        return []
+    return reset_events(first_seq - 1, now_timestamp())
+
+
+def get_last_seq(cursor: sqlite3.Cursor) -> int:
+    """
+    Returns the newest sequence number in the change feed
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+
+    Returns:
+        int: the newest sequence number, or 0 if there are no changes
+    """
+    cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM changes")
+    return cursor.fetchone()[0]
+
+
+def reset_events(seq: int, created_at: str) -> list[dict]:
+    """
+    Builds a reset event for every inventory, telling a subscriber to re-fetch everything
+
+    Args:
+        seq (int): the sequence number the subscriber should continue after
+        created_at (str): the time of the resets
+
+    Returns:
+        list[dict]: one reset event per source in ITEM_TABLES
+    """
+    return [
+        {
+            "seq": seq,
+            "source": source,
+            "item_id": None,
+            "op": "reset",
+            "count": None,
+            "created_at": created_at,
+        }
+        for source in ITEM_TABLES
+    ]
+
+
+def publish(event: dict) -> None:
+    """
+    Sends an event to every subscriber in this process
+
+    Subscribers that have fallen too far behind are sent a reset of every
+    inventory instead, so they re-fetch rather than silently miss events:
+    the dropped events may have been of any inventory.
+
+    Args:
+        event (dict): the change event
+
+    Returns:
+        None
+    """
+    with _lock:
+        subscribers = list(_subscribers)
+    for subscriber in subscribers:
+        try:
+            subscriber.put_nowait(event)
+        except queue.Full:
+            with subscriber.mutex:
+                subscriber.queue.clear()
+                subscriber.queue.extend(reset_events(event["seq"], event["created_at"]))
+                subscriber.not_empty.notify()
+
+
+def subscribe() -> queue.Queue:
+    """
+    Registers a new subscriber and starts the bridge thread if needed
+
+    Returns:
+        queue.Queue: the queue the subscriber's events are put on
+    """
+    subscriber: queue.Queue = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+    with _lock:
+        _subscribers.add(subscriber)
+    start_bridge()
+    return subscriber
+
+
+def unsubscribe(subscriber: queue.Queue) -> None:
+    """
+    Removes a subscriber
+
+    Args:
+        subscriber (queue.Queue): the queue returned by subscribe
+
+    Returns:
+        None
+    """
+    with _lock:
+        _subscribers.discard(subscriber)
+
+
+def start_bridge() -> None:
+    """
+    Starts the thread that moves committed changes from the database to subscribers
+
+    Returns:
+        None
+    """
+    global _bridge
+
+    with _lock:
+        if _bridge is not None and _bridge.is_alive():
+            return
+        _bridge = threading.Thread(target=bridge_loop, name="change-bridge", daemon=True)
+        _bridge.start()
+
+
+def bridge_loop() -> None:
+    """
+    Polls `PRAGMA data_version` and publishes new change rows
+
+    data_version only changes when another connection commits, which covers
+    both this worker's request connections and other workers.
+
+    Returns:
+        None
+    """
+    connection = sqlite3.connect(DB_PATH, check_same_thread=False)
+    cursor = connection.cursor()
+    last_seq = get_last_seq(cursor)
+    data_version = None
+
+    while True:
+        _wakeup.wait(POLL_INTERVAL)
+        _wakeup.clear()
+        try:
+            cursor.execute("PRAGMA data_version")
+            current_version = cursor.fetchone()[0]
+            if current_version == data_version:
+                continue
+            data_version = current_version
+            for event in get_changes(cursor, last_seq):
+                last_seq = event["seq"]
+                publish(event)
+        except sqlite3.Error as e:
+            print(f"Change feed error: {e}")
+
+
+def prune_changes(cursor: sqlite3.Cursor, keep: int = RETAINED_CHANGES) -> None:
+    """
+    Deletes all but the newest `keep` change events, in the caller's transaction
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        keep (int, optional): the number of events to keep
+
+    Returns:
+        None
+    """
+    cursor.execute(
+        "DELETE FROM changes WHERE seq <= (SELECT MAX(seq) FROM changes) - ?", (keep,)
+    )
+
+
+def format_event(event: dict) -> str:
+    """
+    Formats a change event as a server-sent event message
+
+    Args:
+        event (dict): the change event
+
+    Returns:
+        str: the message, using the sequence number as the event id
+    """
+    return f"id: {event['seq']}\nevent: change\ndata: {json.dumps(event)}\n\n"
+
+
+def stream_changes(
+    since: Optional[int] = None, max_seconds: float = STREAM_MAX_SECONDS
+) -> Iterator[str]:
+    """
+    Yields change events as server-sent events
+
+    Events after `since` are replayed from the database first, then live
+    events are streamed as they are committed. The stream ends after
+    `max_seconds` so it does not hold a worker forever, and the client
+    reconnects with the last id to continue where it stopped.
+
+    Args:
+        since (int, optional): the last sequence number the client has seen.
+            Defaults to only streaming new events.
+        max_seconds (float, optional): seconds before the stream ends
+
+    Returns:
+        Iterator[str]: server-sent event messages
+    """
+    deadline = time.monotonic() + max_seconds
+    subscriber = subscribe()
+    try:
+        with sqlite3.connect(DB_PATH) as connection:
+            cursor = connection.cursor()
+            last_seq = get_last_seq(cursor) if since is None else since
+            backlog = pruned_resets(cursor, last_seq)
+            backlog += get_changes(cursor, last_seq, limit=-1)
+        yield "retry: 3000\n\n"
+        for event in backlog:
+            last_seq = event["seq"]
+            yield format_event(event)
+
+        while time.monotonic() < deadline:
+            try:
+                event = subscriber.get(
+                    timeout=min(KEEPALIVE_INTERVAL, max(deadline - time.monotonic(), 0))
+                )
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            if event["seq"] <= last_seq and event["op"] != "reset":
+                continue
+            last_seq = max(last_seq, event["seq"])
+            yield format_event(event)
+    finally:
+        unsubscribe(subscriber)
+
+
+def wait_for_changes(since: int, timeout: float = 25.0) -> dict:
+    """
+    Returns the events after `since`, waiting up to `timeout` seconds for one
+
+    This is the long-poll fallback for clients that cannot use event streams.
+
+    Args:
+        since (int): the last sequence number the client has seen
+        timeout (float, optional): the maximum number of seconds to wait
+
+    Returns:
+        dict: the events and the sequence number to send on the next poll
+    """
+    subscriber = subscribe()
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            with sqlite3.connect(DB_PATH) as connection:
+                cursor = connection.cursor()
+                events = pruned_resets(cursor, since) + get_changes(cursor, since)
+            remaining = deadline - time.monotonic()
+            if events or remaining <= 0:
+                break
+            try:
+                subscriber.get(timeout=remaining)
+            except queue.Empty:
+                pass
+        last_seq = events[-1]["seq"] if events else since
+        return {"changes": events, "last_seq": last_seq}
+    finally:
+        unsubscribe(subscriber)
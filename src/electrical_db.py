@@ -6,12 +6,17 @@ Functions:
     add_active_item_el()
     add_passive_item_el()
     search_similar_passive_items_el()
+    normalize_part_id()
+    find_active_by_part_id_el()
+    get_active_choices_el()
+    search_similar_active_items_el()
     search_active_el()
     search_passive_el()
     decrement_passive_item_el()
     decrement_active_item_el()
     increment_passive_item_el()
     increment_active_item_el()
+    find_active_item_id_el()
     remove_active_item_el()
     remove_passive_item_el()
 """
@@ -22,10 +27,24 @@ import glob
 import json
 import math
 import sqlite3
+import string
+from collections.abc import Mapping
 
-from fuzzywuzzy import fuzz, process
 from typing_extensions import Optional
 
+from change_feed import emit_change
+from http_cache import read_table_version
+from query_cache import cached_query
+from reservation_db import take_stock
+from shared_cache import load_corpus
+
+# folded out of part numbers so "LM7805-CT" finds "lm7805ct"
+PART_ID_PUNCTUATION = " -_./,#()"
+# ASCII only, like SQLite's lower()
+_PART_ID_FOLD = str.maketrans(
+    string.ascii_uppercase, string.ascii_lowercase, PART_ID_PUNCTUATION
+)
+
 
 def ensure_tables():
     """
@@ -100,7 +119,6 @@ def ensure_tables():
                 )
             """
         )
-        calculate_multiplier(cursor, connection)
         connection.commit()
 
 
@@ -142,7 +160,7 @@ def add_active_item_el(
             """
             SELECT * FROM electrical_active_items WHERE part_id = ?
             """,
-            (part_id),
+            (part_id,),
         )
         if cursor.fetchone() is not None:
             cursor.execute(
@@ -153,6 +171,7 @@ def add_active_item_el(
                 """,
                 (count, part_id),
             )
+            emit_change(cursor, "active", "update", "part_id = ?", (part_id,))
             connection.commit()
             return
         cursor.execute(
@@ -182,6 +201,7 @@ def add_active_item_el(
                 is_assembly,
             ),
         )
+        emit_change(cursor, "active", "insert", params=(cursor.lastrowid,))
         connection.commit()
     except sqlite3.IntegrityError:
         connection.commit()
@@ -287,6 +307,7 @@ def add_passive_item_el(
             mounting_method,
         ),
     )
+    emit_change(cursor, "passive", "insert", params=(cursor.lastrowid,))
     connection.commit()
 
 
@@ -308,6 +329,7 @@ def remove_active_item_el(
     Returns:
         None
     """
+    emit_change(cursor, "active", "delete", "id = ? OR name = ?", (item_id, name))
     cursor.execute(
         """
                     DELETE FROM electrical_active_items 
@@ -335,6 +357,9 @@ def remove_passive_item_el(
     """
 
     # TODO: check if part number is unique.
+    emit_change(
+        cursor, "passive", "delete", "subtype = ? AND id = ?", (item_type, item_id)
+    )
     cursor.execute(
         """
                     DELETE FROM electrical_passive_items 
@@ -429,6 +454,7 @@ def update_passive_item_el(
             item_id,
         ),
     )
+    emit_change(cursor, "passive", "update", params=(item_id,))
     connection.commit()
 
 
@@ -498,9 +524,38 @@ def update_active_item_el(
             name,
         ),
     )
+    emit_change(
+        cursor, "active", "update", "part_id = ? OR name = ?", (new_item_id, new_name)
+    )
     connection.commit()
 
 
+def find_active_item_id_el(
+    cursor: sqlite3.Cursor,
+    name: Optional[str] = None,
+    part_id: Optional[str] = None,
+) -> Optional[int]:
+    """
+    Returns the id of an active item from its name or part id
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        name (str, optional): name of the item
+        part_id (str, optional): part id of the item
+
+    Returns:
+        int | None: the id of the item, or None if it does not exist
+    """
+    if part_id is not None:
+        cursor.execute(
+            "SELECT id FROM electrical_active_items WHERE part_id = ?", (part_id,)
+        )
+    else:
+        cursor.execute("SELECT id FROM electrical_active_items WHERE name = ?", (name,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
 def increment_active_item_el(
     num_to_add: int,
     cursor: sqlite3.Cursor,
@@ -529,6 +584,7 @@ def increment_active_item_el(
                    """,
         (num_to_add, item_id, name),
     )
+    emit_change(cursor, "active", "update", "id = ? OR name = ?", (item_id, name))
     connection.commit()
 
 
@@ -558,6 +614,7 @@ def increment_passive_item_el(
                    """,
         (num_to_add, item_id),
     )
+    emit_change(cursor, "passive", "update", params=(item_id,))
     connection.commit()
 
 
@@ -567,9 +624,10 @@ def decrement_active_item_el(
     connection: sqlite3.Connection,
     item_id: Optional[int] = None,
     name: Optional[str] = None,
-) -> None:
+) -> Optional[int]:
     """
     Decrements the count of an item in the electrical_active_items table and checks threshold.
+    Reserved units are never removed.
 
     Args:
         item_id (int): ID of the item.
@@ -577,6 +635,9 @@ def decrement_active_item_el(
         num_to_remove (int): Number of items to remove.
         cursor (sqlite3.Cursor): SQLite cursor object.
         connection (sqlite3.Connection): SQLite connection object.
+
+    Returns:
+        int | None: the number of units removed, None if reserved units are in the way
     """
     if item_id is None and name is None:
         raise ValueError("Either item_id or name must be provided.")
@@ -584,16 +645,16 @@ def decrement_active_item_el(
     if item_id:
         cursor.execute(
             """
-            SELECT item_id, count, is_contacted, threshold
+            SELECT id, count, is_contacted, threshold
             FROM electrical_active_items
-            WHERE item_id = ?
+            WHERE id = ?
         """,
             (item_id,),
         )
     else:
         cursor.execute(
             """
-            SELECT item_id, count, is_contacted, threshold
+            SELECT id, count, is_contacted, threshold
             FROM electrical_active_items
             WHERE name = ?
         """,
@@ -616,16 +677,16 @@ def decrement_active_item_el(
         contact_val = 1
 
     # Update and fetch in a single transaction
-    cursor.execute(
-        """
-        UPDATE electrical_active_items
-        SET count = count - ? is_contacted = ?
-        WHERE id = ?
-    """,
-        (num_to_remove, contact_val, item_id),
+    removed = take_stock(
+        cursor, "active", item_id, num_to_remove, "is_contacted = ?", (contact_val,)
     )
+    if removed is None:
+        connection.rollback()
+        return None
+    emit_change(cursor, "active", "update", params=(item_id,))
 
     connection.commit()
+    return removed
 
 
 def decrement_passive_item_el(
@@ -633,9 +694,9 @@ def decrement_passive_item_el(
     num_to_remove: int,
     cursor: sqlite3.Cursor,
     connection: sqlite3.Connection,
-) -> None:
+) -> Optional[int]:
     """
-    decrements the count of an item in the passive items table
+    decrements the count of an item in the passive items table, never into reserved units
 
     Args:
         item_id (int): id of the item
@@ -644,18 +705,16 @@ def decrement_passive_item_el(
         connection (sqlite3.Connection): SQLite connection object to commit changes
 
     Returns:
-        None
+        int | None: the number of units removed, None if reserved units are in the way
     """
     # TODO: add  email/threshold check
-    cursor.execute(
-        """
-                    UPDATE electrical_passive_items 
-                    SET count = count - ? 
-                    WHERE id = ?
-                   """,
-        (num_to_remove, item_id),
-    )
+    removed = take_stock(cursor, "passive", item_id, num_to_remove)
+    if removed is None:
+        connection.rollback()
+        return None
+    emit_change(cursor, "passive", "update", params=(item_id,))
     connection.commit()
+    return removed
 
 
 def search_passive_el(
@@ -745,6 +804,7 @@ def search_active_el(
     return output
 
 
+@cached_query(("electrical_passive_items",))
 def search_similar_passive_items_el(
     cursor: sqlite3.Cursor,
     value: float,
@@ -795,6 +855,151 @@ def search_similar_passive_items_el(
     return output
 
 
+def normalize_part_id(part_id: str) -> str:
+    """
+    Folds a part number to lowercase without punctuation, as stored in part_id_norm
+
+    Args:
+        part_id (str): the part number
+
+    Returns:
+        str: the normalized part number
+    """
+    return part_id.strip().translate(_PART_ID_FOLD)
+
+
+def part_id_norm_sql(column: str = "part_id") -> str:
+    """
+    Builds the SQL expression that normalizes a part number like normalize_part_id
+
+    Args:
+        column (str, optional): the column holding the part number
+
+    Returns:
+        str: the SQL expression
+    """
+    expression = f"lower({column})"
+    for character in PART_ID_PUNCTUATION:
+        expression = f"replace({expression}, '{character}', '')"
+    return expression
+
+
+def active_partition_filter(
+    location: str, is_assembly: bool, subtype: Optional[str]
+) -> tuple[str, list]:
+    """
+    Builds the WHERE conditions selecting one partition of the active items
+
+    The conditions match the idx_active_partition index.
+
+    Args:
+        location (str): the lab the items are in
+        is_assembly (bool): whether to select assemblies
+        subtype (Optional[str]): the `type` of item, case insensitive, None for all
+
+    Returns:
+        tuple[str, list]: the conditions and their parameters
+    """
+    conditions = "location = ? AND is_assembly = ?"
+    params: list = [location, is_assembly]
+    if subtype:
+        conditions += " AND type = ? COLLATE NOCASE"
+        params.append(subtype.strip())
+    return conditions, params
+
+
+def find_active_by_part_id_el(
+    cursor: sqlite3.Cursor,
+    part_id: str,
+    is_assembly: bool = False,
+    top_n: int = 10,
+    subtype: Optional[str] = None,
+    location: str = "EL",
+) -> list:
+    """
+    Looks up active items by part number using the indexes instead of fuzzy matching
+
+    Tries an exact match on the part number first, then part numbers starting
+    with it once case and punctuation are folded, a range scan of the
+    part_id_norm index.
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries.
+        part_id (str): the part number or its beginning
+        is_assembly (bool): whether to look up assemblies
+        top_n (int): the most prefix matches to return
+        subtype (Optional[str]): only items of this `type`
+        location (str): the lab the items are in
+
+    Returns:
+        list: the matching rows, empty if neither lookup found anything
+    """
+    conditions, params = active_partition_filter(location, is_assembly, subtype)
+    cursor.execute(
+        f"SELECT * FROM electrical_active_items WHERE part_id = ? AND {conditions}",
+        [part_id.strip(), *params],
+    )
+    rows = cursor.fetchall()
+    if rows:
+        return rows
+
+    prefix = normalize_part_id(part_id)
+    if not prefix:
+        return []
+    # every string starting with prefix sorts below prefix with its last character bumped
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    cursor.execute(
+        f"""
+        SELECT * FROM electrical_active_items
+        WHERE part_id_norm >= ? AND part_id_norm < ? AND {conditions}
+        ORDER BY part_id_norm LIMIT ?
+        """,
+        [prefix, upper, *params, top_n],
+    )
+    return cursor.fetchall()
+
+
+def get_active_choices_el(
+    cursor: sqlite3.Cursor,
+    location: str = "EL",
+    is_assembly: bool = False,
+    subtype: Optional[str] = None,
+) -> tuple[Mapping, dict]:
+    """
+    Returns the fuzzy matching candidates of one partition of the active items
+
+    Each (location, is_assembly, subtype) partition is a corpus shared by all
+    workers, rebuilt with an indexed query for just that partition once the
+    table's version in `table_versions` has moved on.
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries.
+        location (str): the lab the items are in
+        is_assembly (bool): whether to load assemblies
+        subtype (Optional[str]): only items of this `type`, None for all
+
+    Returns:
+        tuple[Mapping, dict]: the rows and the "name part_id" choice strings, both by corpus index
+    """
+
+    def build() -> list[tuple[str, dict]]:
+        conditions, params = active_partition_filter(location, is_assembly, subtype)
+        cursor.execute(
+            f"SELECT * FROM electrical_active_items WHERE {conditions}", params
+        )
+        return [(f"{row['name']} {row['part_id']}", dict(row)) for row in cursor.fetchall()]
+
+    name = f"active-{location}-{int(bool(is_assembly))}-{(subtype or '').strip().lower()}"
+    corpus = load_corpus(
+        name, read_table_version(cursor, "electrical_active_items"), build
+    )
+    if corpus is None:
+        return {}, {}
+    return corpus, corpus.choices
+
+
+# part_id keeps its case in the key, the exact part number lookup is case sensitive
+@cached_query(("electrical_active_items",), fold_case=("name", "subtype"))
 def search_similar_active_items_el(
     cursor: sqlite3.Cursor,
     name: Optional[str] = "",
@@ -802,49 +1007,46 @@ def search_similar_active_items_el(
     is_assembly: bool = False,
     subtype: Optional[str] = None,
     top_n: int = 10,
+    location: str = "EL",
 ) -> list:
     """
     Search for similar active items in the database based on `name`, `part_id`, or both.
 
+    A `part_id` that matches a part number exactly, or the beginning of one,
+    is answered from the indexes; fuzzy matching is the fallback. Only items
+    in `location` with the given `is_assembly` and `subtype` are considered.
+
     Args:
         cursor (sqlite3.Cursor): SQLite cursor object to execute queries.
         name (Optional[str]): Name of the item to search for (fuzzy matching).
-        part_id (Optional[str]): Part ID to search for (fuzzy matching).
+        part_id (Optional[str]): Part ID to search for (exact, prefix, then fuzzy matching).
+        is_assembly (bool): Whether to search assemblies.
+        subtype (Optional[str]): Only items of this `type`, case insensitive.
         top_n (int): Number of top matches to return.
+        location (str): The lab to search.
 
     Returns:
         list: List of dictionaries containing matched active items.
     """
+    if part_id:
+        rows = find_active_by_part_id_el(
+            cursor, part_id, is_assembly, top_n, subtype, location
+        )
+        if rows:
+            return [{**dict(row), "type": "active"} for row in rows]
+
+    from fuzzywuzzy import fuzz, process  # imported on first search, it is slow to load
 
     # Normalize inputs by stripping and converting to lowercase
     if name:
         name = name.strip().lower()
     if part_id:
         part_id = part_id.strip().lower()
-    query = "SELECT * FROM electrical_active_items WHERE location = 'EL' AND is_assembly = ?"
-    params = []
-    params.append(is_assembly)
-    if subtype:
-        subtype = subtype.strip().lower()
-        query += " AND subtype = ?"
-        params.append(subtype)
-
-    # Initial query to get all data from the database
-    cursor.execute(
-        "SELECT * FROM electrical_active_items WHERE is_assembly = ? AND location = 'EL'",
-        (is_assembly,),
-    )
-    data = cursor.fetchall()
 
-    if not data:
+    row_dict, choices = get_active_choices_el(cursor, location, is_assembly, subtype)
+    if not choices:
         return []
 
-    # Convert rows to dictionaries
-    row_dict = {row["part_id"]: dict(row) for row in data}
-
-    # Create a dictionary {id: "name"} for fuzzy matching
-    choices = {row["part_id"]: f"{row['name']}" for row in data}
-
     # Build the search query based on user input
     search_query = []
 
@@ -876,6 +1078,7 @@ def search_below_threshold_el(
 ) -> list[dict]:
     """
     Search for items in the database that have a count below a certain threshold.
+    Each item includes its precomputed usage forecast, if there is one.
 
     Args:
         cursor (sqlite3.Cursor): SQLite cursor object to execute queries.
@@ -894,16 +1097,22 @@ def search_below_threshold_el(
     output = []
 
     for table in tables:
-        query = f"SELECT * FROM {table_dict[table]} WHERE count <= ?"
-        params: list = [threshold]
+        query = f"""
+            SELECT t.*, f.daily_rate, f.suggested_threshold, f.days_until_stockout
+            FROM {table_dict[table]} t
+            LEFT JOIN item_forecasts f
+            ON f.source = ? AND f.item_id = t.id
+            WHERE t.count <= ?
+        """
+        params: list = ["passive" if table == "passive" else "active", threshold]
 
         if table == "passive":
             if types:
                 placeholders = ",".join("?" for _ in types)
-                query += f" AND type IN ({placeholders})"
+                query += f" AND t.subtype IN ({placeholders})"
                 params.extend(types)
 
-        query += " AND location = 'EL'"
+        query += " AND t.location = 'EL'"
 
         cursor.execute(query, params)
         output.extend({**dict(row), "type": table} for row in cursor.fetchall())
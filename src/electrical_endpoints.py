@@ -10,6 +10,7 @@ from electrical_db import (  # update_passive,; update_active,
     calculate_multiplier,
     decrement_active_item_el,
     decrement_passive_item_el,
+    find_active_item_id_el,
     get_multiplier,
     increment_active_item_el,
     increment_passive_item_el,
@@ -22,7 +23,13 @@ from electrical_db import (  # update_passive,; update_active,
     search_similar_passive_items_el,
     update_tooltip,
 )
-from utility_functions import get_db, handle_exceptions
+from ledger_db import record_movement
+from utility_functions import (
+    get_db,
+    get_token_username,
+    handle_exceptions,
+    reserved_stock_response,
+)
 
 
 def add_passive_item() -> Tuple[Response, int]:
@@ -412,6 +419,8 @@ def fuzzy_find_active_item(is_assembly: bool = False) -> Tuple[Response, int]:
         part_id (str) optional: part id of the item
 
         is_assembly (bool) optional: whether the item is an assembly
+        subtype (str) optional: only assemblies of this type
+        location (str) optional: the lab to search, defaults to EL
 
     Returns:
         Tuple[Response, int]: a message and status code
@@ -424,6 +433,7 @@ def fuzzy_find_active_item(is_assembly: bool = False) -> Tuple[Response, int]:
         subtype = None
         if is_assembly and "subtype" in data:
             subtype = data["subtype"]
+        location = data.get("location", "EL")
         if "part_id" in data:
             part_id = data["part_id"]
             return (
@@ -431,7 +441,11 @@ def fuzzy_find_active_item(is_assembly: bool = False) -> Tuple[Response, int]:
                     {
                         "status": "success",
                         "items": search_similar_active_items_el(
-                            cursor, part_id, is_assembly=is_assembly, subtype=subtype
+                            cursor,
+                            part_id=part_id,
+                            is_assembly=is_assembly,
+                            subtype=subtype,
+                            location=location,
                         ),
                     }
                 ),
@@ -443,7 +457,11 @@ def fuzzy_find_active_item(is_assembly: bool = False) -> Tuple[Response, int]:
                 {
                     "status": "success",
                     "items": search_similar_active_items_el(
-                        cursor, name, is_assembly=is_assembly, subtype=subtype
+                        cursor,
+                        name,
+                        is_assembly=is_assembly,
+                        subtype=subtype,
+                        location=location,
                     ),
                 }
             ),
@@ -462,7 +480,7 @@ def decrement_passive_item() -> Tuple[Response, int]:
         num_to_remove (int): The number of items to remove
 
     Returns:
-        Tuple[Response, int]: a message and status code
+        Tuple[Response, int]: a message with the number removed and status code, 409 if reserved units are in the way
     """
     try:
         data = request.get_json()
@@ -470,8 +488,22 @@ def decrement_passive_item() -> Tuple[Response, int]:
             raise KeyError("Missing required parameters")
         item_id = data["id"]
         num_to_remove = data["num_to_remove"]
-        decrement_passive_item_el(item_id, num_to_remove, get_db().cursor(), get_db())
-        return jsonify({"status": "success", "message": "Item decremented"}), 200
+        removed = decrement_passive_item_el(
+            item_id, int(num_to_remove), get_db().cursor(), get_db()
+        )
+        if removed is None:
+            return reserved_stock_response()
+        record_movement(
+            "passive",
+            item_id,
+            -removed,
+            get_token_username(data.get("token")),
+            "decrement",
+        )
+        return (
+            jsonify({"status": "success", "message": "Item decremented", "removed": removed}),
+            200,
+        )
     except Exception as e:
         return handle_exceptions(e)
 
@@ -486,7 +518,7 @@ def decrement_active_item() -> Tuple[Response, int]:
         num_to_remove (int): The number of items to remove
 
     Returns:
-        Tuple[Response, int]: a message and status code
+        Tuple[Response, int]: a message with the number removed and status code, 409 if reserved units are in the way
     """
     try:
         connection = get_db()
@@ -494,16 +526,43 @@ def decrement_active_item() -> Tuple[Response, int]:
         data = request.get_json()
         if not data or "num_to_remove" not in data:
             raise KeyError("Missing required parameters")
+        user = get_token_username(data.get("token"))
         if "name" in data:
             name = data["name"]
             num_to_remove = data["num_to_remove"]
-            decrement_active_item_el(num_to_remove, cursor, connection, name)
-            return jsonify({"status": "success", "message": "Item decremented"}), 200
+            removed = decrement_active_item_el(
+                int(num_to_remove), cursor, connection, name=name
+            )
+            if removed is None:
+                return reserved_stock_response()
+            record_movement(
+                "active",
+                find_active_item_id_el(cursor, name=name),
+                -removed,
+                user,
+                "decrement",
+            )
+            return (
+                jsonify(
+                    {"status": "success", "message": "Item decremented", "removed": removed}
+                ),
+                200,
+            )
         if "item_id" in data:
             item_id = data["item_id"]
             num_to_remove = data["num_to_remove"]
-            decrement_active_item_el(num_to_remove, cursor, connection, item_id)
-            return jsonify({"status": "success", "message": "Item decremented"}), 200
+            removed = decrement_active_item_el(
+                int(num_to_remove), cursor, connection, item_id
+            )
+            if removed is None:
+                return reserved_stock_response()
+            record_movement("active", item_id, -removed, user, "decrement")
+            return (
+                jsonify(
+                    {"status": "success", "message": "Item decremented", "removed": removed}
+                ),
+                200,
+            )
 
         raise KeyError("Missing required parameters")
     except Exception as e:
@@ -530,6 +589,13 @@ def increment_passive_item() -> Tuple[Response, int]:
         connection = get_db()
         cursor = connection.cursor()
         increment_passive_item_el(item_id, num_to_add, cursor, connection)
+        record_movement(
+            "passive",
+            item_id,
+            int(num_to_add),
+            get_token_username(data.get("token")),
+            "increment",
+        )
         return jsonify({"status": "success", "message": "Item incremented"}), 200
     except Exception as e:
         return handle_exceptions(e)
@@ -559,14 +625,25 @@ def increment_active_item() -> Tuple[Response, int]:
         connection = get_db()
         cursor = connection.cursor()
         num_to_add = data["num_to_add"]
+        user = get_token_username(data.get("token"))
 
         if "part_id" in data:
-            part_id = data["part_id"]
-            increment_active_item_el(num_to_add, cursor, connection, part_id)
+            item_id = find_active_item_id_el(cursor, part_id=data["part_id"])
+            if item_id is None:
+                raise ValueError("Item not found")
+            increment_active_item_el(num_to_add, cursor, connection, item_id)
+            record_movement("active", item_id, int(num_to_add), user, "increment")
             return jsonify({"status": "success", "message": "Item incremented"}), 200
 
         name = data["name"]
         increment_active_item_el(num_to_add, cursor, connection, name=name)
+        record_movement(
+            "active",
+            find_active_item_id_el(cursor, name=name),
+            int(num_to_add),
+            user,
+            "increment",
+        )
         return jsonify({"status": "success", "message": "Item incremented"}), 200
     except Exception as e:
         return handle_exceptions(e)
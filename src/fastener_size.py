@@ -0,0 +1,252 @@
+"""
+This module reads fastener sizes such as "M3x10", "M3-0.5x10", "1/4-20 x 1",
+"#8-32 x 1-1/2" and "5/16" into numbers.
+
+The thread diameter, thread pitch and length are returned in millimetres,
+whether the size is metric or imperial, so both can be stored in the same
+indexed columns of the items table (size_diameter, size_pitch and
+size_length) and compared with range queries. Imperial pitches are given in
+threads per inch and stored as the pitch they make (25.4 / TPI). Sizes that
+are not fasteners ("Assorted", "LG") parse to all None.
+
+Functions:
+    parse_size(size: str, is_metric: bool = True) -> FastenerSize
+    parse_length(length: str, is_metric: bool) -> float
+    size_dimension(size: str, is_metric: int, part: int) -> float | None
+"""
+
+import re
+from typing import NamedTuple, Optional
+
+MM_PER_INCH = 25.4
+# the precision the dimensions are stored and compared at
+PRECISION = 4
+# unified thread number sizes and their major diameters in inches
+NUMBER_SIZES = {
+    0: 0.060,
+    1: 0.073,
+    2: 0.086,
+    3: 0.099,
+    4: 0.112,
+    5: 0.125,
+    6: 0.138,
+    8: 0.164,
+    10: 0.190,
+    12: 0.216,
+}
+# threads per inch of the number sizes, so "6/32" reads as #6-32 rather than 6/32"
+NUMBER_SIZE_TPI = {24, 32, 40, 48, 56, 64, 72, 80}
+
+_NUMBER = r"\d+(?:\.\d+)?|\.\d+"
+_INCHES = r"\d+\s*-\s*\d+/\d+|\d+\s+\d+/\d+|\d+/\d+|\d*\.\d+|\d+"
+METRIC_SIZE = re.compile(
+    rf"^(m)?\s*({_NUMBER})(?:\s*([-x])\s*({_NUMBER}))?(?:\s*x\s*({_NUMBER}))?(?:\s*mm)?$"
+)
+IMPERIAL_SIZE = re.compile(
+    rf"^(#\s*\d+|\d+/\d+|\d*\.\d+|\d+)(?:\s*-\s*(\d+))?(?:\s*[x-]\s*({_INCHES}))?\s*(?:\"|in)?$"
+)
+
+
+class FastenerSize(NamedTuple):
+    """
+    A parsed fastener size in millimetres, None for the parts the size does not give
+    """
+
+    diameter: Optional[float] = None
+    pitch: Optional[float] = None
+    length: Optional[float] = None
+
+
+def clean(size: str) -> str:
+    """
+    Lower cases a size and unifies the ways of writing "x"
+
+    Args:
+        size (str): the size as entered
+
+    Returns:
+        str: the cleaned size
+    """
+    return " ".join(size.lower().replace("×", "x").replace("*", "x").split())
+
+
+def inches(text: str) -> float:
+    """
+    Reads an inch measurement: "3/4", "1-1/2", "1 1/2", ".25" or "2"
+
+    Args:
+        text (str): the measurement
+
+    Returns:
+        float: the measurement in inches
+    """
+    whole, _, fraction = re.sub(r"\s*-\s*|\s+", " ", text.strip()).rpartition(" ")
+    if "/" in fraction:
+        numerator, denominator = fraction.split("/")
+        value = int(numerator) / int(denominator)
+    else:
+        whole, value = "", float(fraction)
+    return value + (int(whole) if whole else 0)
+
+
+def to_mm(value: Optional[float]) -> Optional[float]:
+    """
+    Rounds a millimetre value to the stored precision
+
+    Args:
+        value (float | None): the value in millimetres
+
+    Returns:
+        float | None: the rounded value
+    """
+    return None if value is None else round(value, PRECISION)
+
+
+def parse_metric(size: str, require_prefix: bool) -> Optional[FastenerSize]:
+    """
+    Reads a metric size: "M3", "M3x10", "M3-0.5", "M3-0.5x10" or "M3x0.5x10"
+
+    Args:
+        size (str): the cleaned size
+        require_prefix (bool): whether the size must start with "m"
+
+    Returns:
+        FastenerSize | None: the size, None if it is not metric
+    """
+    match = METRIC_SIZE.match(size)
+    if match is None:
+        return None
+    prefix, diameter, separator, second, third = match.groups()
+    # without the "m" a lone number is not a size
+    if not prefix and (require_prefix or separator is None):
+        return None
+    pitch = length = None
+    if third is not None:
+        pitch, length = second, third
+    elif separator == "-":
+        pitch = second
+    else:
+        length = second
+    return FastenerSize(
+        to_mm(float(diameter)),
+        to_mm(float(pitch)) if pitch else None,
+        to_mm(float(length)) if length else None,
+    )
+
+
+def parse_imperial(size: str) -> Optional[FastenerSize]:
+    """
+    Reads an imperial size: "1/4-20", "#8-32 x 1-1/2", "10-32x3/4", "6/32" or "5/16"
+
+    Args:
+        size (str): the cleaned size
+
+    Returns:
+        FastenerSize | None: the size, None if it is not imperial
+    """
+    match = IMPERIAL_SIZE.match(size)
+    if match is None:
+        return None
+    diameter, tpi, length = match.groups()
+
+    if diameter.startswith("#"):
+        number = int(diameter[1:].strip())
+        if number not in NUMBER_SIZES:
+            return None
+        diameter_in = NUMBER_SIZES[number]
+    elif "/" in diameter:
+        numerator, denominator = (int(part) for part in diameter.split("/"))
+        if (
+            tpi is None
+            and numerator in NUMBER_SIZES
+            and denominator in NUMBER_SIZE_TPI
+        ):
+            # "6/32" is how #6-32 is often written
+            diameter_in, tpi = NUMBER_SIZES[numerator], str(denominator)
+        elif denominator == 0:
+            return None
+        else:
+            diameter_in = numerator / denominator
+    elif "." in diameter:
+        diameter_in = float(diameter)
+    elif tpi is not None and int(diameter) in NUMBER_SIZES:
+        # "10-32", a number size written without the "#"
+        diameter_in = NUMBER_SIZES[int(diameter)]
+    else:
+        # a bare whole number could be anything
+        return None
+
+    if diameter_in <= 0 or (tpi is not None and int(tpi) == 0):
+        return None
+    return FastenerSize(
+        to_mm(diameter_in * MM_PER_INCH),
+        to_mm(MM_PER_INCH / int(tpi)) if tpi else None,
+        to_mm(inches(length) * MM_PER_INCH) if length else None,
+    )
+
+
+def parse_size(size: str, is_metric: bool = True) -> FastenerSize:
+    """
+    Reads the thread diameter, pitch and length of a fastener size
+
+    Sizes starting with "M" are always read as metric. Other sizes of items
+    marked metric are read as metric too ("3x10" means M3x10), and those of
+    the other items as imperial.
+
+    Args:
+        size (str): the size as entered, e.g. "M3x10" or "1/4-20 x 1"
+        is_metric (bool, optional): whether the item is metric
+
+    Returns:
+        FastenerSize: the dimensions in millimetres, all None if the size is not a fastener size
+    """
+    if not size:
+        return FastenerSize()
+    size = clean(size)
+    parsed = parse_metric(size, require_prefix=not is_metric)
+    if parsed is None and not is_metric and not size.startswith("m"):
+        parsed = parse_imperial(size)
+    return parsed or FastenerSize()
+
+
+def parse_length(length: str, is_metric: bool) -> float:
+    """
+    Reads a length bound of a dimension search, in millimetres or inches
+
+    Args:
+        length (str): e.g. "16", "3/4" or "1-1/2"
+        is_metric (bool): whether the length is in millimetres
+
+    Returns:
+        float: the length in millimetres
+
+    Raises:
+        ValueError: if the length is not a number, or a fraction of a metric length
+    """
+    length = length.strip().lower().removesuffix("mm").removesuffix('"').strip()
+    if is_metric:
+        if not re.fullmatch(_NUMBER, length):
+            raise ValueError(
+                f"Invalid length: {length}, metric lengths are millimetres such as 16 or 2.5"
+            )
+        return to_mm(float(length))
+    if not re.fullmatch(_INCHES, length) or re.search(r"/0+$", length):
+        raise ValueError(
+            f"Invalid length: {length}, imperial lengths are inches such as 1, 3/4 or 1-1/2"
+        )
+    return to_mm(inches(length) * MM_PER_INCH)
+
+
+def size_dimension(size: str, is_metric: int, part: int) -> Optional[float]:
+    """
+    One dimension of a size, registered as an SQLite function for backfills
+
+    Args:
+        size (str): the size as entered
+        is_metric (int): whether the item is metric (1) or not (0)
+        part (int): 0 for the diameter, 1 for the pitch, 2 for the length
+
+    Returns:
+        float | None: the dimension in millimetres
+    """
+    return parse_size(size or "", bool(is_metric))[part]
@@ -0,0 +1,264 @@
+"""
+This module forecasts how fast items are being used.
+
+It reads the decrements recorded in the movement ledger, computes an
+exponentially weighted daily consumption rate per item with pandas, and
+stores the rate, a suggested reorder threshold and the days until the item
+runs out in the `item_forecasts` table. The read endpoints join that table,
+so showing the forecast costs nothing at query time.
+
+The daily job is started when the app is imported, so every gunicorn worker
+starts one, but only the worker holding the lock on JOB_LOCK_PATH runs it.
+If that worker exits, the lock is released and a waiting worker takes over.
+
+Functions:
+    ensure_forecast_table() -> None
+    compute_forecasts(connection: sqlite3.Connection, ...) -> int
+    start_forecast_job(interval_hours: float = 24) -> None
+"""
+
+import datetime
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DB_PATH = "../data/data.db"
+JOB_LOCK_PATH = "../data/.forecast.lock"
+HALFLIFE_DAYS = 14
+LEAD_TIME_DAYS = 14
+SAFETY_DAYS = 7
+
+ITEM_TABLES = {
+    "idea": "items",
+    "active": "electrical_active_items",
+    "passive": "electrical_passive_items",
+}
+
+_job: Optional[threading.Thread] = None
+
+
+def ensure_forecast_table() -> None:
+    """
+    Ensures the forecast table exists in the database
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    with sqlite3.connect(DB_PATH) as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS item_forecasts (
+                    source TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    daily_rate REAL NOT NULL,
+                    suggested_threshold INTEGER NOT NULL,
+                    days_until_stockout REAL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (source, item_id)
+                ) WITHOUT ROWID
+                """
+        )
+        connection.commit()
+
+
+def load_usage(connection: sqlite3.Connection):
+    """
+    Loads the daily usage of every item from the ledger
+
+    Compacted months only have a monthly total, which is spread evenly over
+    the days of that month.
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object to read from
+
+    Returns:
+        pandas.DataFrame: columns source, item_id, day and used
+    """
+    import pandas as pd
+
+    recent = pd.read_sql_query(
+        """
+        SELECT source, item_id, substr(created_at, 1, 10) AS day, -SUM(delta) AS used
+        FROM movements
+        WHERE delta < 0
+        GROUP BY source, item_id, day
+        """,
+        connection,
+    )
+    monthly = pd.read_sql_query(
+        """
+        SELECT source, item_id, month, removed
+        FROM movement_rollups
+        WHERE removed > 0
+        """,
+        connection,
+    )
+
+    frames = [recent.assign(day=pd.to_datetime(recent["day"]))]
+    if not monthly.empty:
+        periods = pd.PeriodIndex(monthly["month"], freq="M")
+        monthly["used"] = monthly["removed"].to_numpy() / periods.days_in_month
+        monthly["day"] = [
+            pd.date_range(period.start_time, period.end_time.normalize(), freq="D")
+            for period in periods
+        ]
+        monthly = monthly.explode("day")
+        monthly["day"] = pd.to_datetime(monthly["day"])
+        frames.append(monthly[["source", "item_id", "day", "used"]])
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def load_counts(connection: sqlite3.Connection):
+    """
+    Loads the current count of every item in every inventory
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object to read from
+
+    Returns:
+        pandas.DataFrame: columns source, item_id and count
+    """
+    import pandas as pd
+
+    frames = [
+        pd.read_sql_query(
+            f"SELECT '{source}' AS source, id AS item_id, count FROM {table}",
+            connection,
+        )
+        for source, table in ITEM_TABLES.items()
+    ]
+    return pd.concat(frames, ignore_index=True)
+
+
+def compute_forecasts(
+    connection: sqlite3.Connection,
+    halflife_days: float = HALFLIFE_DAYS,
+    lead_time_days: float = LEAD_TIME_DAYS,
+    safety_days: float = SAFETY_DAYS,
+    apply_thresholds: bool = False,
+) -> int:
+    """
+    Recomputes the consumption forecast of every item with recorded usage
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object to read and write
+        halflife_days (float, optional): half-life of the exponential weighting in days
+        lead_time_days (float, optional): days it takes for an order to arrive
+        safety_days (float, optional): extra days of stock to keep on hand
+        apply_thresholds (bool, optional): also write the suggested thresholds to the IDEA items
+
+    Returns:
+        int: the number of items forecast
+    """
+    import pandas as pd
+
+    usage = load_usage(connection)
+    if usage.empty:
+        return 0
+
+    today = pd.Timestamp(datetime.date.today())
+    rates = {}
+    for (source, item_id), group in usage.groupby(["source", "item_id"]):
+        daily = group.groupby("day")["used"].sum()
+        # fill the days without decrements with zero usage up to today
+        daily = daily.reindex(
+            pd.date_range(daily.index.min(), max(today, daily.index.max()), freq="D"),
+            fill_value=0,
+        )
+        rates[(source, int(item_id))] = float(
+            daily.ewm(halflife=halflife_days).mean().iloc[-1]
+        )
+
+    counts = load_counts(connection).set_index(["source", "item_id"])["count"]
+    updated_at = datetime.datetime.now(datetime.timezone.utc).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+    rows = []
+    for (source, item_id), rate in rates.items():
+        if (source, item_id) not in counts.index:
+            continue
+        count = int(counts.loc[(source, item_id)])
+        suggested = math.ceil(rate * (lead_time_days + safety_days))
+        days_left = count / rate if rate > 0 else None
+        rows.append((source, item_id, rate, suggested, days_left, updated_at))
+
+    cursor = connection.cursor()
+    cursor.execute("DELETE FROM item_forecasts")
+    cursor.executemany(
+        """
+        INSERT INTO item_forecasts
+        (source, item_id, daily_rate, suggested_threshold, days_until_stockout, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+        """,
+        rows,
+    )
+    if apply_thresholds:
+        cursor.execute(
+            """
+            UPDATE items SET threshold = (
+                SELECT suggested_threshold FROM item_forecasts
+                WHERE source = 'idea' AND item_id = items.id
+            )
+            WHERE id IN (SELECT item_id FROM item_forecasts WHERE source = 'idea')
+            """
+        )
+    connection.commit()
+    return len(rows)
+
+
+def forecast_loop(interval_hours: float) -> None:
+    """
+    Waits for the job lock, then recomputes the forecasts forever, sleeping between runs
+
+    The lock is never released, it is dropped with the process.
+
+    Args:
+        interval_hours (float): hours to wait between runs
+
+    Returns:
+        None
+    """
+    os.makedirs(os.path.dirname(JOB_LOCK_PATH), exist_ok=True)
+    lock_file = open(JOB_LOCK_PATH, "a")
+    if fcntl is not None:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+    while True:
+        try:
+            with sqlite3.connect(DB_PATH) as connection:
+                compute_forecasts(connection)
+        except Exception as e:
+            print(f"Forecast job error: {e}")
+        time.sleep(interval_hours * 3600)
+
+
+def start_forecast_job(interval_hours: float = 24) -> None:
+    """
+    Starts the background thread that refreshes the forecasts, one per process
+
+    Args:
+        interval_hours (float, optional): hours to wait between runs. Defaults to 24.
+
+    Returns:
+        None
+    """
+    global _job
+
+    if _job is not None and _job.is_alive():
+        return
+    _job = threading.Thread(
+        target=forecast_loop, args=(interval_hours,), name="forecast", daemon=True
+    )
+    _job.start()
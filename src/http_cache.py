@@ -0,0 +1,222 @@
+"""
+This module provides conditional GET and compression for API responses.
+
+Triggers bump a per-table counter in `table_versions` on every insert,
+update and delete. The ETag of a cacheable read endpoint is derived from the
+versions of the tables it reads and the request arguments, so a matching
+`If-None-Match` is answered with 304 before the endpoint runs its queries.
+JSON responses above a size threshold are compressed with brotli when it is
+installed and the client accepts it, otherwise with gzip.
+
+Functions:
+    ensure_version_table() -> None
+    get_table_versions(tables: tuple[str, ...]) -> list[int]
+    read_table_version(cursor: sqlite3.Cursor, table: str) -> int
+    check_not_modified() -> Response | None
+    finish_response(response: Response) -> Response
+"""
+
+import gzip
+import hashlib
+import sqlite3
+import threading
+from typing import Optional
+
+from flask import Response, g, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DB_PATH = "../data/data.db"
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ("application/json", "text/plain", "text/csv")
+
+TRACKED_TABLES = (
+    "items",
+    "electrical_active_items",
+    "electrical_passive_items",
+    "multipliers",
+    "settings",
+    "item_forecasts",
+)
+
+# read endpoints (by URL rule) and the tables their responses depend on
+CACHEABLE_ROUTES = {
+    "/findAll": ("items", "item_forecasts"),
+    "/fuzzyfind": ("items",),
+    "/electricalFuzzyPassive": ("electrical_passive_items",),
+    "/getMultipliers": ("multipliers",),
+    "/getElectricalTooltip": ("settings",),
+}
+
+_connection: Optional[sqlite3.Connection] = None
+_lock = threading.Lock()
+
+
+def ensure_version_table() -> None:
+    """
+    Ensures the table version counters and the triggers that bump them exist
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    with sqlite3.connect(DB_PATH) as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS table_versions (
+                    name TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL DEFAULT 0
+                ) WITHOUT ROWID
+                """
+        )
+        for table in TRACKED_TABLES:
+            cursor.execute(
+                "INSERT OR IGNORE INTO table_versions (name, version) VALUES (?, 0)",
+                (table,),
+            )
+            for event in ("INSERT", "UPDATE", "DELETE"):
+                cursor.execute(
+                    f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_version_{event.lower()}
+                    AFTER {event} ON {table}
+                    BEGIN
+                        UPDATE table_versions SET version = version + 1
+                        WHERE name = '{table}';
+                    END
+                    """
+                )
+        connection.commit()
+
+
+def get_table_versions(tables: tuple[str, ...]) -> list[int]:
+    """
+    Returns the current version of each table
+
+    A single shared connection is reused so the lookup costs one primary key read.
+
+    Args:
+        tables (tuple[str, ...]): the tables to look up
+
+    Returns:
+        list[int]: the versions in the same order as `tables`
+    """
+    global _connection
+
+    with _lock:
+        if _connection is None:
+            _connection = sqlite3.connect(DB_PATH, check_same_thread=False)
+        placeholders = ", ".join("?" for _ in tables)
+        rows = dict(
+            _connection.execute(
+                f"SELECT name, version FROM table_versions WHERE name IN ({placeholders})",
+                tables,
+            ).fetchall()
+        )
+    return [rows.get(table, 0) for table in tables]
+
+
+def read_table_version(cursor: sqlite3.Cursor, table: str) -> int:
+    """
+    Returns the current version of a table on the caller's own connection
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        table (str): one of TRACKED_TABLES
+
+    Returns:
+        int: the version, 0 if the table is not tracked yet
+    """
+    cursor.execute("SELECT version FROM table_versions WHERE name = ?", (table,))
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def compute_etag(rule: str, tables: tuple[str, ...]) -> str:
+    """
+    Builds the ETag of a cacheable request
+
+    Args:
+        rule (str): the URL rule of the endpoint
+        tables (tuple[str, ...]): the tables the endpoint reads
+
+    Returns:
+        str: a hash of the rule, the table versions and the sorted request arguments
+    """
+    versions = get_table_versions(tables)
+    args = sorted(request.args.items(multi=True))
+    key = f"{rule}|{versions}|{args}".encode("utf-8")
+    return hashlib.blake2b(key, digest_size=12).hexdigest()
+
+
+def check_not_modified() -> Optional[Response]:
+    """
+    Answers a conditional GET with 304 if the client's copy is still current
+
+    Called before the endpoint so an unchanged response never reaches the item tables.
+
+    Returns:
+        Response | None: an empty 304 response, or None to run the endpoint
+    """
+    if request.method != "GET" or request.url_rule is None:
+        return None
+    tables = CACHEABLE_ROUTES.get(request.url_rule.rule)
+    if tables is None:
+        return None
+
+    try:
+        g.etag = compute_etag(request.url_rule.rule, tables)
+    except sqlite3.Error:
+        # without version counters the endpoint is served uncached
+        return None
+    if request.if_none_match.contains_weak(g.etag):
+        response = Response(status=304)
+        response.set_etag(g.etag, weak=True)
+        return response
+    return None
+
+
+def finish_response(response: Response) -> Response:
+    """
+    Adds the ETag to cacheable responses and compresses large bodies
+
+    Args:
+        response (Response): the response from the endpoint
+
+    Returns:
+        Response: the response with caching and encoding headers set
+    """
+    etag = g.pop("etag", None)
+    if etag is not None and response.status_code == 200:
+        response.set_etag(etag, weak=True)
+        response.headers["Cache-Control"] = "no-cache"
+
+    if (
+        response.direct_passthrough
+        or response.is_streamed
+        or response.status_code != 200
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_TYPES
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < MIN_COMPRESS_SIZE:
+        return response
+
+    response.vary.add("Accept-Encoding")
+    accepted = request.accept_encodings
+    if brotli is not None and accepted["br"]:
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
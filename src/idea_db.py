@@ -14,11 +14,14 @@ It includes functions to:
 Functions:
     build_db() -> None
     get_all(cursor: sqlite3.Cursor) -> list[dict]
+    get_all_json(cursor: sqlite3.Cursor) -> str
     find_by_name(name: str, is_metric: int, size: str, cursor: sqlite3.Cursor) -> int | None
     fzf(name: str, is_metric: int, size: str, cursor: sqlite3.Cursor, top_n: int = 5) -> list[dict]
+    get_choices(cursor: sqlite3.Cursor) -> tuple[Mapping, dict]
+    search_by_dimensions(cursor: sqlite3.Cursor, diameter: float, pitch: float | None = None, length_min: float | None = None, length_max: float | None = None, limit: int = 50, is_metric: int | None = None) -> list[dict]
     get_item(item_id: int, cursor: sqlite3.Cursor) -> list[dict] | None
     increment_item(item_id: int, num_added: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> None
-    decrement_item(item_id: int, num_removed: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> int
+    decrement_item(item_id: int, num_removed: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> tuple[int, int | None]
     add_item(name: str, size: str, is_metric: int, location: str, count: int, threshold: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> None
     remove_item(item_id: int, cursor: sqlite3.Cursor, connection: sqlite3.Connection) -> None
 
@@ -35,9 +38,15 @@ import csv
 import datetime
 import glob
 import sqlite3
+from collections.abc import Mapping
 from typing import Optional
 
-from fuzzywuzzy import fuzz, process
+from change_feed import emit_change
+from fastener_size import PRECISION, parse_size
+from http_cache import read_table_version
+from query_cache import cached_query
+from reservation_db import take_stock
+from shared_cache import load_corpus
 
 
 def build_db() -> None:
@@ -70,7 +79,7 @@ def build_db() -> None:
 
 def get_all(cursor: sqlite3.Cursor) -> list[dict]:
     """
-    returns all items from the database
+    returns all items from the database with their precomputed usage forecast
 
     Args:
         cursor (sqlite3.Cursor): SQLite cursor object to execute queries
@@ -82,8 +91,11 @@ def get_all(cursor: sqlite3.Cursor) -> list[dict]:
         """
                    SELECT id, name, size, is_metric, loc_shelf,
                    loc_rack, loc_box, loc_row, loc_col, 
-                   loc_depth, count, threshold, isContacted
+                   loc_depth, count, threshold, isContacted,
+                   f.daily_rate, f.suggested_threshold, f.days_until_stockout
                    FROM items
+                   LEFT JOIN item_forecasts f
+                   ON f.source = 'idea' AND f.item_id = items.id
                    """
     )
     items = cursor.fetchall()
@@ -93,6 +105,39 @@ def get_all(cursor: sqlite3.Cursor) -> list[dict]:
     ]
 
 
+def get_all_json(cursor: sqlite3.Cursor) -> str:
+    """
+    returns all items as a JSON array encoded by SQLite
+
+    The fields match get_all, with is_metric as "True" or "False" like /findAll
+    sends it, so the rows never become Python objects.
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+
+    Returns:
+        str: the JSON encoded list of items
+    """
+    cursor.execute(
+        """
+                   SELECT json_group_array(json_object(
+                       'id', id, 'name', name, 'size', size,
+                       'is_metric', CASE WHEN is_metric = 1 THEN 'True' ELSE 'False' END,
+                       'loc_shelf', loc_shelf, 'loc_rack', loc_rack, 'loc_box', loc_box,
+                       'loc_row', loc_row, 'loc_col', loc_col, 'loc_depth', loc_depth,
+                       'count', count, 'threshold', threshold, 'isContacted', isContacted,
+                       'daily_rate', f.daily_rate,
+                       'suggested_threshold', f.suggested_threshold,
+                       'days_until_stockout', f.days_until_stockout
+                   ))
+                   FROM items
+                   LEFT JOIN item_forecasts f
+                   ON f.source = 'idea' AND f.item_id = items.id
+                   """
+    )
+    return cursor.fetchone()[0]
+
+
 def find_by_name(
     name: str, is_metric: int, size: str, cursor: sqlite3.Cursor
 ) -> int | None:
@@ -122,6 +167,7 @@ def find_by_name(
     return item[0] if item else None  # Return ID if found, otherwise None
 
 
+@cached_query(("items",), fold_case=("name", "size"))
 def fzf(
     name: str, is_metric: int, size: str, cursor: sqlite3.Cursor, top_n: int = 10
 ) -> list[dict]:
@@ -138,40 +184,113 @@ def fzf(
     Returns:
         list[dict]: list of json objects
     """
-    cursor.execute(
-        """
-        SELECT id, name, is_metric, size, loc_shelf, loc_rack, loc_box,
-        loc_row, loc_col, loc_depth, count, threshold
-        FROM items WHERE is_metric = ?
-        """,
-        (is_metric,),
-    )
-    cursor.execute("SELECT * FROM items")
-    data = cursor.fetchall()
+    from fuzzywuzzy import fuzz, process  # imported on first search, it is slow to load
 
-    if not data:
-        return []
-
-    # Convert rows to dictionaries
-    row_dict = {row["id"]: dict(row) for row in data}
+    # the candidates are shared by all workers, keyed by corpus index
+    row_dict, choices = get_choices(cursor)
 
-    # Create a dictionary {id: "name size"} for fuzzy matching
-    choices = {row["id"]: f"{row['name']} {row['size']}" for row in data}
+    if not choices:
+        return []
 
     # Handle cases where size is empty or None
     query = f"{name} {size}" if size else name
 
-    # Get top N matches with their IDs
+    # Get top N matches with their corpus indexes
     best_matches = process.extract(
         query, choices, scorer=fuzz.partial_ratio, limit=top_n
     )
 
-    # Extract full rows as dictionaries using their IDs
+    # Extract full rows as dictionaries using their indexes
     results = [row_dict[match[2]] for match in best_matches]
 
     return results  # Return structured output
 
 
+def get_choices(cursor: sqlite3.Cursor) -> tuple[Mapping, dict]:
+    """
+    returns the fuzzy matching candidates, shared by all workers until the items table changes
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+
+    Returns:
+        tuple[Mapping, dict]: the rows and the "name size" choice strings, both by corpus index
+    """
+
+    def build() -> list[tuple[str, dict]]:
+        cursor.execute(
+            """
+            SELECT id, name, size, is_metric, loc_shelf, loc_rack, loc_box,
+            loc_row, loc_col, loc_depth, count, threshold, isContacted
+            FROM items
+            """
+        )
+        return [(f"{row['name']} {row['size']}", dict(row)) for row in cursor.fetchall()]
+
+    corpus = load_corpus("items", read_table_version(cursor, "items"), build)
+    if corpus is None:
+        return {}, {}
+    return corpus, corpus.choices
+
+
+def search_by_dimensions(
+    cursor: sqlite3.Cursor,
+    diameter: float,
+    pitch: Optional[float] = None,
+    length_min: Optional[float] = None,
+    length_max: Optional[float] = None,
+    limit: int = 50,
+    is_metric: Optional[int] = None,
+) -> list[dict]:
+    """
+    finds the items with a thread diameter, and optionally a pitch and a length range, from the dimension index
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        diameter (float): the thread diameter in millimetres
+        pitch (float, optional): the thread pitch in millimetres
+        length_min (float, optional): the shortest length in millimetres
+        length_max (float, optional): the longest length in millimetres
+        limit (int, optional): the most items to return
+        is_metric (int, optional): only metric (1) or imperial (0) items. Defaults to both.
+
+    Returns:
+        list[dict]: the items, shortest first
+    """
+    # the stored dimensions are rounded, the tolerance absorbs the rounding
+    tolerance = 10**-PRECISION
+    conditions = ["size_diameter BETWEEN ? AND ?"]
+    params: list = [diameter - tolerance, diameter + tolerance]
+    if is_metric is not None:
+        conditions.append("is_metric = ?")
+        params.append(is_metric)
+    if length_min is not None or length_max is not None:
+        conditions.append("size_length BETWEEN ? AND ?")
+        params += [
+            (length_min if length_min is not None else 0) - tolerance,
+            (length_max if length_max is not None else float("inf")) + tolerance,
+        ]
+    if pitch is not None:
+        # sizes without a pitch use the standard one, so they match any pitch
+        conditions.append("(size_pitch IS NULL OR size_pitch BETWEEN ? AND ?)")
+        params += [pitch - tolerance, pitch + tolerance]
+
+    cursor.execute(
+        f"""
+        SELECT id, name, size, is_metric, loc_shelf, loc_rack, loc_box,
+        loc_row, loc_col, loc_depth, count, threshold, isContacted,
+        size_diameter, size_pitch, size_length
+        FROM items WHERE {" AND ".join(conditions)}
+        ORDER BY size_length, name LIMIT ?
+        """,
+        (*params, limit),
+    )
+    return [
+        dict(zip([column[0] for column in cursor.description], row))
+        for row in cursor.fetchall()
+    ]
+
+
 def get_item(item_id: int, cursor: sqlite3.Cursor) -> Optional[list[dict]]:
     """
     returns item information from item id
@@ -197,7 +316,9 @@ def get_item(item_id: int, cursor: sqlite3.Cursor) -> Optional[list[dict]]:
             loc_depth, 
             count, 
             threshold, 
-            isContacted 
+            isContacted,
+            reserved,
+            available
         FROM items 
             WHERE id = ?""",
         (item_id,),
@@ -237,6 +358,7 @@ def increment_item(
             item_id,
         ),
     )
+    emit_change(cursor, "idea", "update", params=(item_id,))
 
     connection.commit()  # save the database
 
@@ -246,9 +368,9 @@ def decrement_item(
     num_removed: int,
     cursor: sqlite3.Cursor,
     connection: sqlite3.Connection,
-) -> int:
+) -> tuple[int, Optional[int]]:
     """
-    decrements an item's count by num_removed
+    decrements an item's count by num_removed, never into reserved units
 
     Args:
         item_id (int): the item do decriment
@@ -257,21 +379,20 @@ def decrement_item(
         connection (sqlite3.Connection): SQLite connection object to commit changes
 
     Returns:
-        int: status code (0/1) for if an email needs to be sent
+        tuple[int, int | None]: status code (0/1) for if an email needs to be sent, and the
+            number of units removed (less than num_removed if the count reached 0), None if
+            reserved units are in the way and nothing was removed
     """
     item = get_item(item_id, cursor)
     if item is None:
         raise ValueError("Item not found. No update performed.")
-    new_count = item[0]["count"] - num_removed
-    new_count = max(new_count, 0)
-    cursor.execute(
-        """update items set count = ? where id = ?""",
-        (
-            new_count,
-            item_id,
-        ),
-    )
+    removed = take_stock(cursor, "idea", item_id, num_removed)
+    if removed is None:
+        connection.rollback()
+        return 0, None
+    emit_change(cursor, "idea", "update", params=(item_id,))
     connection.commit()
+    new_count = get_item(item_id, cursor)[0]["count"]
     if new_count < int(item[0]["threshold"]) and not item[0]["isContacted"]:
         cursor.execute(
             """
@@ -280,8 +401,8 @@ def decrement_item(
             (item_id,),
         )
         connection.commit()
-        return 1
-    return 0
+        return 1, removed
+    return 0, removed
 
 
 def add_item(
@@ -331,15 +452,23 @@ def add_item(
             """UPDATE items set count = ? WHERE name = ? and is_metric = ? and size = ?""",
             (new_count, name, is_metric, size),
         )
+        emit_change(
+            cursor,
+            "idea",
+            "update",
+            "name = ? and is_metric = ? and size = ?",
+            (name, is_metric, size),
+        )
     else:
 
         cursor.execute(
             """
                        INSERT INTO items
                        ( name, size, is_metric, loc_shelf, 
-                       loc_rack, loc_box, loc_row, loc_col, loc_depth, count, threshold)
+                       loc_rack, loc_box, loc_row, loc_col, loc_depth, count, threshold,
+                       size_diameter, size_pitch, size_length)
                        VALUES
-                        (?,?,?,?,?,?,?,?,?,?,?)
+                        (?,?,?,?,?,?,?,?,?,?,?,?,?,?)
                        """,
             (
                 name,
@@ -353,8 +482,10 @@ def add_item(
                 loc_depth,
                 count,
                 threshold,
+                *parse_size(size, bool(is_metric)),
             ),
         )
+        emit_change(cursor, "idea", "insert", params=(cursor.lastrowid,))
 
     connection.commit()
 
@@ -373,6 +504,7 @@ def remove_item(
     Returns:
         None
     """
+    emit_change(cursor, "idea", "delete", params=(item_id,))
     cursor.execute(
         """
                     DELETE FROM items WHERE id = ?
@@ -424,7 +556,8 @@ def update_item(
     cursor.execute(
         """
                    UPDATE items SET name = ?, size = ?, is_metric = ?, loc_shelf = ?, 
-                   loc_rack = ?, loc_box = ?, loc_row = ?, loc_col = ?, loc_depth = ?, count = ?, threshold = ? WHERE id = ?
+                   loc_rack = ?, loc_box = ?, loc_row = ?, loc_col = ?, loc_depth = ?, count = ?, threshold = ?,
+                   size_diameter = ?, size_pitch = ?, size_length = ? WHERE id = ?
                    """,
         (
             new_name,
@@ -438,9 +571,11 @@ def update_item(
             loc_depth,
             new_count,
             threshold,
+            *parse_size(new_size, bool(new_is_metric)),
             item_id,
         ),
     )
+    emit_change(cursor, "idea", "update", params=(item_id,))
     connection.commit()
 
 
@@ -9,16 +9,17 @@ It includes functions to:
     - find a specific item
     - find all items
     - search for similar items
+    - search for items by thread size and length
     - update an item
 """
 
 import logging
+import time
 from typing import Tuple
 
 import jwt
 from dotenv import load_dotenv
 import os
-import resend
 
 from flask import Response, jsonify, request
 
@@ -27,14 +28,24 @@ from idea_db import (
     find_by_name,
     decrement_item,
     get_item,
-    get_all,
+    get_all_json,
     add_item,
     remove_item,
     fzf,
+    search_by_dimensions,
     update_item,
 )
+from app_logging import log_action
+from fastener_size import parse_length, parse_size
 from auth_db import check_token
-from utility_functions import handle_exceptions, get_db, parse_location_to_list
+from json_provider import json_response_with_data
+from ledger_db import record_movement
+from utility_functions import (
+    handle_exceptions,
+    get_db,
+    parse_location_to_list,
+    reserved_stock_response,
+)
 
 
 def increment_idea() -> Tuple[Response, int]:
@@ -53,6 +64,7 @@ def increment_idea() -> Tuple[Response, int]:
         Tuple[Response, int]: a message and status code
     """
     try:
+        started = time.perf_counter()
         connection = get_db()
         cursor = connection.cursor()
         data = request.args
@@ -68,11 +80,6 @@ def increment_idea() -> Tuple[Response, int]:
         if not check_token(token, username, cursor):
             raise ValueError("Invalid token")
 
-        logger = logging.getLogger("app")
-        logger.info(
-            "User '{username}' incremented '{data['name']} {data['size']}' by {data['num']}"
-        )
-
         # find item
         item_id = find_by_name(
             data["name"],
@@ -90,6 +97,15 @@ def increment_idea() -> Tuple[Response, int]:
             cursor,
             connection,
         )
+        log_action(
+            "increment",
+            f"User '{username}' incremented '{data['name']} {data['size']}' by {data['num']}",
+            user=username,
+            item=f"{data['name']} {data['size']}",
+            delta=int(data["num"]),
+            started=started,
+        )
+        record_movement("idea", item_id, int(data["num"]), username, "increment")
         return jsonify({"status": "success"}), 200
     except Exception as e:
         return handle_exceptions(e)
@@ -109,9 +125,10 @@ def decrement_idea() -> Tuple[Response, int]:
        token (str): the cookie of the user
 
     Returns:
-        Tuple[Response, int]: a message and status code
+        Tuple[Response, int]: a message with the number removed and status code, 409 if reserved units are in the way
     """
     try:
+        started = time.perf_counter()
         connection = get_db()
         cursor = connection.cursor()
         data = request.args
@@ -129,11 +146,6 @@ def decrement_idea() -> Tuple[Response, int]:
         if not check_token(token, username, cursor):
             raise ValueError("Invalid token")
 
-        logger = logging.getLogger("app")
-        logger.info(
-            f"User '{username}' decremented '{data['name']} {data['size']}' by {data['num']}"
-        )
-
         # find item
         item_id = find_by_name(
             data["name"],
@@ -148,15 +160,29 @@ def decrement_idea() -> Tuple[Response, int]:
         size = data["size"]
         is_metric = data["is_metric"].strip().lower() == "true"
         # decrement item
-        message_status = decrement_item(
+        message_status, removed = decrement_item(
             item_id,
             int(data["num"]),
             cursor,
             connection,
         )
+        if removed is None:
+            return reserved_stock_response()
+        # removed is less than num when the count reached 0
+        log_action(
+            "decrement",
+            f"User '{username}' decremented '{name} {size}' by {removed}",
+            user=username,
+            item=f"{name} {size}",
+            delta=-removed,
+            started=started,
+        )
+        record_movement("idea", item_id, -removed, username, "decrement")
         if message_status == 1:
             # send email
             try:
+                import resend  # loads requests, so only when an email is sent
+
                 load_dotenv("data/.env")
                 print("Resend API Key:", os.getenv("Resend_API"))
                 resend.api_key = os.getenv("Resend_API")
@@ -183,7 +209,7 @@ def decrement_idea() -> Tuple[Response, int]:
                     500,
                 )
 
-        return jsonify({"status": "success"}), 200
+        return jsonify({"status": "success", "removed": removed}), 200
     except Exception as e:
         return handle_exceptions(e)
 
@@ -270,6 +296,7 @@ def add_item_idea() -> Tuple[Response, int]:
     print("Adding item...")
 
     try:
+        started = time.perf_counter()
         connection = get_db()
         cursor = connection.cursor()
         print("Connected to database")
@@ -301,11 +328,6 @@ def add_item_idea() -> Tuple[Response, int]:
         if not check_token(token, username, cursor):
             raise ValueError("Invalid token")
 
-        logger = logging.getLogger("app")
-        logger.info(
-            f"User '{username}' added item with name: {data['name']}, size: {data['size']}, is_metric: {data['is_metric']}, num: {data['num']}, threshold: {data['threshold']}, loc_shelf: {data['loc_shelf']}, loc_rack: {data['loc_rack']}, loc_box: {data['loc_box']}, loc_row: {data['loc_row']}, loc_col: {data['loc_col']}, loc_depth: {data['loc_depth']}"
-        )
-
         add_item(
             data["name"],
             data["size"],
@@ -321,6 +343,21 @@ def add_item_idea() -> Tuple[Response, int]:
             cursor,
             connection,
         )
+        item_id = find_by_name(
+            data["name"],
+            data["is_metric"].strip().lower() == "true",
+            data["size"],
+            cursor,
+        )
+        record_movement("idea", item_id, int(data["num"]), username, "add")
+        log_action(
+            "add",
+            f"User '{username}' added item with name: {data['name']}, size: {data['size']}, is_metric: {data['is_metric']}, num: {data['num']}, threshold: {data['threshold']}, loc_shelf: {data['loc_shelf']}, loc_rack: {data['loc_rack']}, loc_box: {data['loc_box']}, loc_row: {data['loc_row']}, loc_col: {data['loc_col']}, loc_depth: {data['loc_depth']}",
+            user=username,
+            item=f"{data['name']} {data['size']}",
+            delta=int(data["num"]),
+            started=started,
+        )
         return jsonify({"status": "success"}), 200
     except Exception as e:
         return handle_exceptions(e)
@@ -341,6 +378,7 @@ def remove_item_idea() -> Tuple[Response, int]:
         Tuple[Response, int]: a message and status code
     """
     try:
+        started = time.perf_counter()
         connection = get_db()
         cursor = connection.cursor()
         data = request.args
@@ -358,11 +396,6 @@ def remove_item_idea() -> Tuple[Response, int]:
         if level > 1:
             raise ValueError("User does not have permission to remove items")
 
-        logger = logging.getLogger("app")
-        logger.info(
-            f"User '{username}' removed item with name: {data['name']}, size: {data['size']}, is_metric: {data['is_metric']}"
-        )
-
         # find item
         item_id = find_by_name(
             data["name"],
@@ -375,6 +408,13 @@ def remove_item_idea() -> Tuple[Response, int]:
 
         # remove item
         remove_item(item_id, cursor, connection)
+        log_action(
+            "remove",
+            f"User '{username}' removed item with name: {data['name']}, size: {data['size']}, is_metric: {data['is_metric']}",
+            user=username,
+            item=f"{data['name']} {data['size']}",
+            started=started,
+        )
         return jsonify({"status": "success"}), 200
     except Exception as e:
         return handle_exceptions(e)
@@ -422,31 +462,56 @@ def fuzzy_find_idea() -> Tuple[Response, int]:
         return handle_exceptions(e)
 
 
-def find_all_items_idea() -> Tuple[Response, int]:
+def dimension_search_idea() -> Tuple[Response, int]:
     """
-    Handles retrieving all items in the database.
+    Handles finding items by their parsed thread size and length.
     Data is passed from frontend through a GET request
 
     Args:
-        None
+       size (str): the thread, e.g. "M3", "M3-0.5", "1/4-20" or "#8", with a length ("M3x10") to find only that length
+       is_metric (str) optional: "true" for metric items, "false" for imperial ones, by default metric if the size starts with "M"
+       length_min (str) optional: the shortest length, in mm for metric threads and inches otherwise
+       length_max (str) optional: the longest length, in the same unit
+       limit (int) optional: the most items to return (default 50, at most 200)
 
     Returns:
-        Tuple[Response, int]: a message with possible data and status code
+        Tuple[Response, int]: a message with the items, shortest first, and status code
     """
     try:
-        connection = get_db()
-        cursor = connection.cursor()
+        cursor = get_db().cursor()
+        data = request.args
+        if not data or not data.get("size", "").strip():
+            raise KeyError("Missing required parameters")
 
-        # gets all items and converts is_metric to string
-        items = get_all(cursor)
+        if "is_metric" in data:
+            is_metric = data["is_metric"].strip().lower() == "true"
+        else:
+            is_metric = data["size"].strip().lower().startswith("m")
+        size = parse_size(data["size"], is_metric)
+        if size.diameter is None:
+            raise ValueError(f"Not a thread size: {data['size']}")
+        length_min = length_max = size.length
+        if "length_min" in data:
+            length_min = parse_length(data["length_min"], is_metric)
+        if "length_max" in data:
+            length_max = parse_length(data["length_max"], is_metric)
+        limit = min(int(data.get("limit", 50)), 200)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+
+        # the same diameter in metric and imperial rows are different fasteners
+        items = search_by_dimensions(
+            cursor, size.diameter, size.pitch, length_min, length_max, limit, int(is_metric)
+        )
         for item in items:
+            if item["loc_shelf"] is not None:
+                item["location"] = parse_location_to_list(item)
             item["is_metric"] = str(item["is_metric"] == 1)
-
         return (
             jsonify(
                 {
                     "status": "success",
-                    "message": "items found successfully",
+                    "message": "Items found successfully",
                     "data": items,
                 }
             ),
@@ -456,6 +521,34 @@ def find_all_items_idea() -> Tuple[Response, int]:
         return handle_exceptions(e)
 
 
+def find_all_items_idea() -> Tuple[Response, int]:
+    """
+    Handles retrieving all items in the database.
+    Data is passed from frontend through a GET request
+
+    Args:
+        None
+
+    Returns:
+        Tuple[Response, int]: a message with possible data and status code
+    """
+    try:
+        connection = get_db()
+        cursor = connection.cursor()
+
+        # SQLite encodes the items (with is_metric as a string) straight to JSON
+        return (
+            json_response_with_data(
+                get_all_json(cursor),
+                status="success",
+                message="items found successfully",
+            ),
+            200,
+        )
+    except Exception as e:
+        return handle_exceptions(e)
+
+
 def update_item_idea() -> Tuple[Response, int]:
     """
     Handles updating an item in the database.
@@ -483,6 +576,7 @@ def update_item_idea() -> Tuple[Response, int]:
         Tuple[Response, int]: a message and status code
     """
     try:
+        started = time.perf_counter()
         print("Updating item...")
         data = request.args
         if not data or not all(
@@ -508,7 +602,6 @@ def update_item_idea() -> Tuple[Response, int]:
         ):
             raise KeyError("Missing required parameters")
 
-        logger = logging.getLogger("app")
         try:
             token = data["token"]
             username = jwt.decode(token, options={"verify_signature": False}).get(
@@ -516,11 +609,13 @@ def update_item_idea() -> Tuple[Response, int]:
             )
             if not check_token(token, username, get_db().cursor()):
                 raise KeyError("Invalid token")
-            logger.info(
-                f"User: '{username}' updated item: {data['size']} {data['name']}"
-            )
         except Exception as e:
-            logger.error("An invalidated user attempted to update an item")
+            log_action(
+                "update",
+                "An invalidated user attempted to update an item",
+                item=f"{data['name']} {data['size']}",
+                level=logging.ERROR,
+            )
             return jsonify({"status": "error", "output": "false"}), 401
 
         connection = get_db()
@@ -543,6 +638,13 @@ def update_item_idea() -> Tuple[Response, int]:
             cursor,
             connection,
         )
+        log_action(
+            "update",
+            f"User: '{username}' updated item: {data['size']} {data['name']}",
+            user=username,
+            item=f"{data['name']} {data['size']}",
+            started=started,
+        )
         return jsonify({"status": "success"}), 200
     except Exception as e:
         return handle_exceptions(e)
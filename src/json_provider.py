@@ -0,0 +1,118 @@
+"""
+This module provides the JSON encoding used by the Flask app.
+
+`FastJSONProvider` encodes with orjson when it is installed and falls back
+to Flask's stdlib based provider otherwise. `json_response_with_data` sends
+a JSON array that SQLite already encoded (see `json_group_array`) without
+decoding it into Python objects first.
+
+Functions:
+    json_response_with_data(data_json: str, status_code: int = 200, **fields) -> Response
+"""
+
+import typing as t
+
+from flask import Response, current_app
+from flask.json.provider import DefaultJSONProvider, _default
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that uses orjson when available, keeping Flask's sorted keys
+    """
+
+    def dumps(self, obj: t.Any, **kwargs: t.Any) -> str:
+        """
+        Serializes data as JSON
+
+        Args:
+            obj (Any): the data to serialize
+            **kwargs: options for the stdlib encoder, `sort_keys` and `indent` are honoured by orjson
+
+        Returns:
+            str: the JSON text
+        """
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        return self.dump_bytes(
+            obj, kwargs.get("sort_keys", self.sort_keys), kwargs.get("indent")
+        ).decode("utf-8")
+
+    def loads(self, s: str | bytes, **kwargs: t.Any) -> t.Any:
+        """
+        Deserializes data from JSON
+
+        Args:
+            s (str | bytes): the JSON text
+
+        Returns:
+            Any: the decoded data
+        """
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: t.Any, **kwargs: t.Any) -> Response:
+        """
+        Serializes the arguments as JSON and wraps them in a response
+
+        Args:
+            *args: a single value, or several values sent as a list
+            **kwargs: values sent as an object
+
+        Returns:
+            Response: the JSON response
+        """
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = None
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            indent = 2
+        body = self.dump_bytes(obj, self.sort_keys, indent) + b"\n"
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def dump_bytes(self, obj: t.Any, sort_keys: bool, indent: int | None) -> bytes:
+        """
+        Serializes data with orjson
+
+        Args:
+            obj (Any): the data to serialize
+            sort_keys (bool): whether to sort object keys
+            indent (int | None): pretty print with two space indentation when set
+
+        Returns:
+            bytes: the UTF-8 encoded JSON
+        """
+        option = orjson.OPT_NON_STR_KEYS
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=_default, option=option)
+
+
+def json_response_with_data(
+    data_json: str, status_code: int = 200, **fields: t.Any
+) -> Response:
+    """
+    Builds a JSON response whose "data" field is already encoded JSON
+
+    Args:
+        data_json (str): the encoded value of "data", e.g. from json_group_array
+        status_code (int, optional): the HTTP status code. Defaults to 200.
+        **fields: the other fields of the response object
+
+    Returns:
+        Response: the JSON response
+    """
+    encoded = current_app.json.dumps(fields)[1:-1]
+    body = "{" + encoded + ("," if encoded else "") + '"data":' + data_json + "}\n"
+    return current_app.response_class(
+        body, status=status_code, mimetype=current_app.json.mimetype
+    )
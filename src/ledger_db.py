@@ -0,0 +1,318 @@
+"""
+This module provides the inventory movement ledger.
+
+Every stock change for IDEA lab and electrical items is appended to the
+`movements` table. Inserts are buffered in memory and written in batches by
+a background thread, and movements from past months are rolled up into
+per-item monthly aggregates so the table does not grow without bound.
+
+Functions:
+    ensure_ledger_tables() -> None
+    record_movement(source: str, item_id: int, delta: int, user: str | None = None, reason: str = "") -> None
+    flush_movements() -> int
+    compact_movements(cursor: sqlite3.Cursor, connection: sqlite3.Connection, before: str | None = None) -> int
+    get_history(cursor: sqlite3.Cursor, source: str, item_id: int, ...) -> dict
+"""
+
+import atexit
+import datetime
+import sqlite3
+import threading
+from typing import Optional
+
+DB_PATH = "../data/data.db"
+SOURCES = ("idea", "active", "passive")
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 2.0
+
+_pending: list[tuple] = []
+_lock = threading.Lock()
+_flush_requested = threading.Event()
+_writer: Optional[threading.Thread] = None
+_last_compacted_month: Optional[str] = None
+
+
+def ensure_ledger_tables() -> None:
+    """
+    Ensures the movement and rollup tables exist in the database
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    with sqlite3.connect(DB_PATH) as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS movements (
+                    id INTEGER PRIMARY KEY,
+                    source TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    delta INTEGER NOT NULL,
+                    user TEXT,
+                    reason TEXT NOT NULL DEFAULT '',
+                    created_at TEXT NOT NULL
+                )
+                """
+        )
+        cursor.execute(
+            """
+                CREATE INDEX IF NOT EXISTS idx_movements_item
+                ON movements (source, item_id, created_at)
+                """
+        )
+        cursor.execute(
+            """
+                CREATE INDEX IF NOT EXISTS idx_movements_created
+                ON movements (created_at)
+                """
+        )
+        cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS movement_rollups (
+                    source TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    month TEXT NOT NULL,
+                    added INTEGER NOT NULL DEFAULT 0,
+                    removed INTEGER NOT NULL DEFAULT 0,
+                    movement_count INTEGER NOT NULL DEFAULT 0,
+                    PRIMARY KEY (source, item_id, month)
+                ) WITHOUT ROWID
+                """
+        )
+        connection.commit()
+
+
+def now_timestamp() -> str:
+    """
+    Returns the current UTC time in the format stored by the ledger
+
+    Returns:
+        str: the time as "YYYY-MM-DD HH:MM:SS"
+    """
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def record_movement(
+    source: str,
+    item_id: int,
+    delta: int,
+    user: Optional[str] = None,
+    reason: str = "",
+) -> None:
+    """
+    Queues a stock movement to be written to the ledger
+
+    The movement is written by the background writer within FLUSH_INTERVAL
+    seconds, or sooner once BATCH_SIZE movements are waiting.
+
+    Args:
+        source (str): the inventory the item belongs to ("idea", "active" or "passive")
+        item_id (int): the id of the item in its table
+        delta (int): the change in count, negative for removals
+        user (str, optional): the user who made the change
+        reason (str, optional): why the count changed, e.g. "decrement"
+
+    Returns:
+        None
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown inventory source: {source}")
+    if item_id is None or not delta:
+        return
+
+    with _lock:
+        _pending.append(
+            (source, int(item_id), int(delta), user, reason, now_timestamp())
+        )
+        pending = len(_pending)
+    start_writer()
+    if pending >= BATCH_SIZE:
+        _flush_requested.set()
+
+
+def flush_movements() -> int:
+    """
+    Writes every queued movement to the database in a single transaction
+
+    Returns:
+        int: the number of movements written
+    """
+    global _pending
+
+    with _lock:
+        batch, _pending = _pending, []
+    if not batch:
+        return 0
+
+    try:
+        with sqlite3.connect(DB_PATH) as connection:
+            connection.executemany(
+                """
+                INSERT INTO movements (source, item_id, delta, user, reason, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                batch,
+            )
+    except sqlite3.Error:
+        # put the batch back so it is retried on the next flush
+        with _lock:
+            _pending = batch + _pending
+        raise
+    return len(batch)
+
+
+def start_writer() -> None:
+    """
+    Starts the background writer thread if it is not already running
+
+    Returns:
+        None
+    """
+    global _writer
+
+    if _writer is not None and _writer.is_alive():
+        return
+    with _lock:
+        if _writer is not None and _writer.is_alive():
+            return
+        _writer = threading.Thread(
+            target=writer_loop, name="movement-writer", daemon=True
+        )
+        _writer.start()
+
+
+def writer_loop() -> None:
+    """
+    Flushes queued movements periodically and compacts once per month
+
+    Returns:
+        None
+    """
+    global _last_compacted_month
+
+    while True:
+        _flush_requested.wait(FLUSH_INTERVAL)
+        _flush_requested.clear()
+        try:
+            flush_movements()
+            month = now_timestamp()[:7]
+            if _last_compacted_month != month:
+                with sqlite3.connect(DB_PATH) as connection:
+                    compact_movements(connection.cursor(), connection)
+                _last_compacted_month = month
+        except sqlite3.Error as e:
+            print(f"Movement ledger error: {e}")
+
+
+def compact_movements(
+    cursor: sqlite3.Cursor,
+    connection: sqlite3.Connection,
+    before: Optional[str] = None,
+) -> int:
+    """
+    Rolls movements older than `before` up into monthly per-item aggregates
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        connection (sqlite3.Connection): SQLite connection object to commit changes
+        before (str, optional): timestamp to compact before, at most and by default the start of the current month
+
+    Returns:
+        int: the number of movements that were compacted
+
+    Raises:
+        ValueError: if `before` is later than the start of the current month
+    """
+    month_start = now_timestamp()[:7] + "-01 00:00:00"
+    if before is None:
+        before = month_start
+    elif before > month_start:
+        # the current month is still being written, compacting it would lose movements
+        raise ValueError(f"before must not be later than {month_start}")
+
+    cursor.execute(
+        """
+        INSERT INTO movement_rollups (source, item_id, month, added, removed, movement_count)
+        SELECT source, item_id, substr(created_at, 1, 7),
+               SUM(CASE WHEN delta > 0 THEN delta ELSE 0 END),
+               SUM(CASE WHEN delta < 0 THEN -delta ELSE 0 END),
+               COUNT(*)
+        FROM movements
+        WHERE created_at < ?
+        GROUP BY source, item_id, substr(created_at, 1, 7)
+        ON CONFLICT (source, item_id, month) DO UPDATE SET
+            added = added + excluded.added,
+            removed = removed + excluded.removed,
+            movement_count = movement_count + excluded.movement_count
+        """,
+        (before,),
+    )
+    cursor.execute("DELETE FROM movements WHERE created_at < ?", (before,))
+    compacted = cursor.rowcount
+    connection.commit()
+    return compacted
+
+
+def get_history(
+    cursor: sqlite3.Cursor,
+    source: str,
+    item_id: int,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    limit: int = 500,
+) -> dict:
+    """
+    Returns the movements and monthly rollups for one item
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        source (str): the inventory the item belongs to
+        item_id (int): the id of the item in its table
+        since (str, optional): earliest timestamp to include
+        until (str, optional): latest timestamp to include (exclusive)
+        limit (int, optional): the maximum number of movements to return
+
+    Returns:
+        dict: the newest movements first, and the monthly rollups of compacted months
+    """
+    if source not in SOURCES:
+        raise ValueError(f"Unknown inventory source: {source}")
+    since = since or "0000"
+    until = until or "9999"
+
+    cursor.execute(
+        """
+        SELECT id, delta, user, reason, created_at
+        FROM movements
+        WHERE source = ? AND item_id = ? AND created_at >= ? AND created_at < ?
+        ORDER BY created_at DESC
+        LIMIT ?
+        """,
+        (source, item_id, since, until, limit),
+    )
+    movements = [
+        dict(zip([column[0] for column in cursor.description], row))
+        for row in cursor.fetchall()
+    ]
+
+    cursor.execute(
+        """
+        SELECT month, added, removed, movement_count
+        FROM movement_rollups
+        WHERE source = ? AND item_id = ? AND month >= substr(?, 1, 7) AND month <= substr(?, 1, 7)
+        ORDER BY month DESC
+        """,
+        (source, item_id, since, until),
+    )
+    monthly = [
+        dict(zip([column[0] for column in cursor.description], row))
+        for row in cursor.fetchall()
+    ]
+
+    return {"movements": movements, "monthly": monthly}
+
+
+atexit.register(flush_movements)
@@ -0,0 +1,126 @@
+"""
+This module provides endpoints for the inventory movement ledger.
+It includes functions to:
+    - get the stock history of an item
+    - compact old movements into monthly rollups
+    - recompute the usage forecasts
+"""
+
+from typing import Tuple
+
+from flask import Response, jsonify, request
+
+from admin_endpoints import require_admin
+from forecast import compute_forecasts
+from ledger_db import compact_movements, flush_movements, get_history
+from utility_functions import get_db, handle_exceptions
+
+
+def parse_item_ref(data: dict) -> Tuple[str, int]:
+    """
+    Parses an item reference from the request arguments
+
+    The item can be given as "source:id" (e.g. "passive:12") or as a plain id
+    with a separate `source` argument, which defaults to "idea".
+
+    Args:
+        data (dict): the request arguments
+
+    Returns:
+        Tuple[str, int]: the inventory source and the item id
+    """
+    if not data or "item" not in data:
+        raise KeyError("Missing required parameters")
+    item = data["item"]
+    source = data.get("source", "idea")
+    if ":" in item:
+        source, item = item.split(":", 1)
+    if not item.isdigit():
+        raise ValueError("Item id must be an integer")
+    return source, int(item)
+
+
+def get_item_history() -> Tuple[Response, int]:
+    """
+    Handles getting the stock movements of an item
+
+    Args:
+        item (str): the item as "source:id", or an id together with `source`
+        source (str) optional: the inventory of the item (idea, active or passive)
+        since (str) optional: earliest timestamp to include
+        until (str) optional: latest timestamp to include
+        limit (int) optional: the maximum number of movements to return
+
+    Returns:
+        Tuple[Response, int]: a message with the history and status code
+    """
+    try:
+        data = request.args
+        source, item_id = parse_item_ref(data)
+        # make sure movements still waiting in the buffer are visible
+        flush_movements()
+        history = get_history(
+            get_db().cursor(),
+            source,
+            item_id,
+            since=data.get("since"),
+            until=data.get("until"),
+            limit=int(data.get("limit", 500)),
+        )
+        return (
+            jsonify(
+                {
+                    "status": "success",
+                    "item": f"{source}:{item_id}",
+                    "data": history,
+                }
+            ),
+            200,
+        )
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def compact_history() -> Tuple[Response, int]:
+    """
+    Handles rolling up movements from previous months
+
+    Args:
+        token (str): the login token of an admin
+        before (str) optional: timestamp to compact before, at most and by default the start of this month
+
+    Returns:
+        Tuple[Response, int]: a message with the number of compacted movements and status code
+    """
+    try:
+        data = request.get_json()
+        require_admin(data)
+        flush_movements()
+        connection = get_db()
+        before = str(data["before"]) if "before" in data else None
+        compacted = compact_movements(connection.cursor(), connection, before)
+        return jsonify({"status": "success", "compacted": compacted}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def run_forecast() -> Tuple[Response, int]:
+    """
+    Handles recomputing the usage forecasts from the ledger
+
+    Args:
+        token (str): the login token of an admin
+        apply (str) optional: "true" to also write the suggested thresholds to the IDEA items
+
+    Returns:
+        Tuple[Response, int]: a message with the number of forecast items and status code
+    """
+    try:
+        data = request.get_json()
+        require_admin(data)
+        flush_movements()
+        apply_thresholds = str(data.get("apply", "")).strip().lower() == "true"
+        forecast_count = compute_forecasts(get_db(), apply_thresholds=apply_thresholds)
+        return jsonify({"status": "success", "forecasts": forecast_count}), 200
+    except Exception as e:
+        return handle_exceptions(e)
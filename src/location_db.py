@@ -0,0 +1,211 @@
+"""
+This module keeps the storage locations of both inventories in one table.
+
+A location is a lab and six levels: shelf, rack, box, row, col and depth.
+IDEA items are in lab "IDEA" at their `loc_*` columns. Electrical items are
+in their `location` lab with the rack as the rack and the slot as the box,
+and no shelf. Every item table has a `location_id` referencing `locations`,
+set by triggers whenever an item is added or moved, so none of the code
+writing items has to know about it. Locations are kept when they empty, so
+a bin stays known after its last item is moved out.
+
+The unique index on (lab, shelf, rack, box, row, col, depth) makes listing
+a shelf, rack or box a range scan of that index, followed by the
+`location_id` index of each item table.
+
+Functions:
+    location_id_sql(source: str, row: str | None = None) -> str
+    seed_locations_sql(source: str) -> str
+    location_triggers(source: str) -> list[str]
+    find_by_location(cursor: sqlite3.Cursor, lab: str, levels: dict[str, str], limit: int = 500) -> dict[str, list[dict]]
+"""
+
+import sqlite3
+from typing import Optional
+
+LOCATION_LEVELS = ("shelf", "rack", "box", "row", "col", "depth")
+IDEA_LAB = "IDEA"
+
+LOCATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS locations (
+        id INTEGER PRIMARY KEY,
+        lab TEXT NOT NULL,
+        shelf TEXT NOT NULL DEFAULT '',
+        rack TEXT NOT NULL DEFAULT '',
+        box TEXT NOT NULL DEFAULT '',
+        row TEXT NOT NULL DEFAULT '',
+        col TEXT NOT NULL DEFAULT '',
+        depth TEXT NOT NULL DEFAULT '',
+        UNIQUE (lab, shelf, rack, box, row, col, depth)
+    )
+"""
+
+# per inventory: the item table, the columns that place an item, and its lab
+# and levels as SQL on those columns, where {row} is "NEW." in triggers and the
+# table name elsewhere (locations has a rack column too)
+ITEM_LOCATIONS = {
+    "idea": (
+        "items",
+        ("loc_shelf", "loc_rack", "loc_box", "loc_row", "loc_col", "loc_depth"),
+        (
+            f"'{IDEA_LAB}'",
+            "{row}loc_shelf",
+            "{row}loc_rack",
+            "{row}loc_box",
+            "{row}loc_row",
+            "{row}loc_col",
+            "{row}loc_depth",
+        ),
+    ),
+    "active": (
+        "electrical_active_items",
+        ("location", "rack", "slot"),
+        ("{row}location", "''", "{row}rack", "{row}slot", "''", "''", "''"),
+    ),
+    "passive": (
+        "electrical_passive_items",
+        ("location", "rack", "slot"),
+        ("{row}location", "''", "{row}rack", "{row}slot", "''", "''", "''"),
+    ),
+}
+
+
+def location_values(source: str, row: Optional[str] = None) -> list[str]:
+    """
+    Returns the lab and levels of an item of an inventory as SQL expressions
+
+    Args:
+        source (str): the inventory ("idea", "active" or "passive")
+        row (str, optional): "NEW." inside a trigger. Defaults to the item table.
+
+    Returns:
+        list[str]: the lab, shelf, rack, box, row, col and depth expressions
+    """
+    if row is None:
+        row = f"{ITEM_LOCATIONS[source][0]}."
+    # trimmed text, never NULL, so equal locations always compare equal
+    return [
+        f"coalesce(trim(CAST({expression.format(row=row)} AS TEXT)), '')"
+        for expression in ITEM_LOCATIONS[source][2]
+    ]
+
+
+def location_id_sql(source: str, row: Optional[str] = None) -> str:
+    """
+    Builds the subquery finding the location of an item
+
+    Args:
+        source (str): the inventory ("idea", "active" or "passive")
+        row (str, optional): "NEW." inside a trigger. Defaults to the item table.
+
+    Returns:
+        str: the subquery
+    """
+    conditions = " AND ".join(
+        f"{column} = {value}"
+        for column, value in zip(("lab",) + LOCATION_LEVELS, location_values(source, row))
+    )
+    return f"(SELECT id FROM locations WHERE {conditions})"
+
+
+def seed_locations_sql(source: str) -> str:
+    """
+    Builds the statement adding the locations of all items of an inventory
+
+    Args:
+        source (str): the inventory ("idea", "active" or "passive")
+
+    Returns:
+        str: the statement
+    """
+    table = ITEM_LOCATIONS[source][0]
+    return f"""
+        INSERT OR IGNORE INTO locations (lab, {", ".join(LOCATION_LEVELS)})
+        SELECT DISTINCT {", ".join(location_values(source))} FROM {table}
+    """
+
+
+def location_triggers(source: str) -> list[str]:
+    """
+    Builds the triggers that set `location_id` when an item is added or moved
+
+    Args:
+        source (str): the inventory ("idea", "active" or "passive")
+
+    Returns:
+        list[str]: the CREATE TRIGGER statements
+    """
+    table, columns, _ = ITEM_LOCATIONS[source]
+    body = f"""
+        BEGIN
+            INSERT OR IGNORE INTO locations (lab, {", ".join(LOCATION_LEVELS)})
+            VALUES ({", ".join(location_values(source, "NEW."))});
+            UPDATE {table} SET location_id = {location_id_sql(source, "NEW.")}
+            WHERE id = NEW.id;
+        END
+    """
+    moved = " OR ".join(f"NEW.{column} IS NOT OLD.{column}" for column in columns)
+    return [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_location_insert
+        AFTER INSERT ON {table}
+        {body}
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_location_update
+        AFTER UPDATE OF {", ".join(columns)} ON {table}
+        WHEN {moved}
+        {body}
+        """,
+    ]
+
+
+def find_by_location(
+    cursor: sqlite3.Cursor, lab: str, levels: dict[str, str], limit: int = 500
+) -> dict[str, list[dict]]:
+    """
+    Lists the items of every inventory at a location or below it
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        lab (str): the lab, "IDEA" or an electrical lab such as "EL"
+        levels (dict[str, str]): the given levels, e.g. {"shelf": "1", "rack": "2"}
+        limit (int, optional): the most items to return per inventory
+
+    Returns:
+        dict[str, list[dict]]: the items by inventory, in location order, each with its location levels
+
+    Raises:
+        ValueError: if a level is not one of LOCATION_LEVELS
+    """
+    unknown = [level for level in levels if level not in LOCATION_LEVELS]
+    if unknown:
+        raise ValueError(f"Unknown location levels: {', '.join(unknown)}")
+
+    lab = lab.strip()
+    levels = {level: value.strip() for level, value in levels.items()}
+    if lab != IDEA_LAB:
+        # electrical locations have no shelf, saying so keeps the rack and
+        # slot in the index prefix
+        levels = {"shelf": "", **levels}
+    conditions = ["l.lab = ?"] + [f"l.{level} = ?" for level in levels]
+    params = [lab, *levels.values()]
+    order = ", ".join(f"l.{level}" for level in LOCATION_LEVELS)
+
+    found = {}
+    for source, (table, _, _) in ITEM_LOCATIONS.items():
+        if (source == "idea") != (lab == IDEA_LAB):
+            found[source] = []
+            continue
+        cursor.execute(
+            f"""
+            SELECT t.*, {", ".join(f"l.{level} AS location_{level}" for level in LOCATION_LEVELS)}
+            FROM locations l JOIN {table} t ON t.location_id = l.id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {order}, t.id LIMIT ?
+            """,
+            (*params, limit),
+        )
+        columns = [column[0] for column in cursor.description]
+        found[source] = [dict(zip(columns, row)) for row in cursor.fetchall()]
+    return found
@@ -0,0 +1,323 @@
+"""
+This module provides functions for reading the application log files
+without loading them into memory.
+
+It includes functions to:
+    - list the log files from newest to oldest
+    - read lines backwards from the end of a file
+    - parse a log line into its fields
+    - query a page of log entries using a byte-offset cursor and filters
+    - follow the active log file for new entries, for a limited time
+
+Functions:
+    get_log_files(log_dir: str = LOG_DIR) -> list[str]
+    read_lines_reverse(path: str, end: int | None = None) -> Iterator[tuple[int, bytes]]
+    parse_log_line(line: str) -> dict
+    query_log(log_dir: str = LOG_DIR, cursor: str | None = None, limit: int = 200, ...) -> dict
+    follow_log(log_dir: str = LOG_DIR, ..., since: int | None = None, ...) -> Iterator[str]
+"""
+
+import datetime
+import json
+import os
+import re
+import time
+from typing import Iterator, Optional
+
+LOG_DIR = "../logs"
+LOG_FILE = "app.log"
+BLOCK_SIZE = 8192
+MAX_LIMIT = 1000
+# a follow stream ends after this long, the client reconnects with Last-Event-ID
+STREAM_MAX_SECONDS = float(os.environ.get("STREAM_MAX_SECONDS", 300))
+
+LINE_PATTERN = re.compile(
+    r"^\[(?P<time>[^\]]+)\]\s*(?P<level>[A-Z]+)?\s*:\s*(?P<message>.*)$"
+)
+USER_PATTERN = re.compile(r"User:? '(?P<user>[^']*)'")
+TIME_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+
+
+def get_log_files(log_dir: str = LOG_DIR) -> list[str]:
+    """
+    Returns the log file names from newest to oldest
+
+    The active file comes first, followed by the rotated backups whose
+    date suffix sorts them chronologically.
+
+    Args:
+        log_dir (str): the directory holding the log files
+
+    Returns:
+        list[str]: file names relative to log_dir
+    """
+    files = [
+        name
+        for name in os.listdir(log_dir)
+        if name.startswith(LOG_FILE) and os.path.isfile(os.path.join(log_dir, name))
+    ]
+    backups = sorted((name for name in files if name != LOG_FILE), reverse=True)
+    return ([LOG_FILE] if LOG_FILE in files else []) + backups
+
+
+def read_lines_reverse(
+    path: str, end: Optional[int] = None, block_size: int = BLOCK_SIZE
+) -> Iterator[tuple[int, bytes]]:
+    """
+    Yields the lines of a file from last to first by seeking backwards in blocks
+
+    Args:
+        path (str): the file to read
+        end (int, optional): byte offset to stop at (exclusive). Defaults to the file size.
+        block_size (int, optional): the number of bytes read per seek
+
+    Returns:
+        Iterator[tuple[int, bytes]]: the start offset and contents of each line
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell() if end is None else min(end, f.tell())
+        remainder = b""
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            chunk = f.read(read_size) + remainder
+            lines = chunk.split(b"\n")
+            remainder = lines[0]
+            line_end = position + len(chunk)
+            for line in reversed(lines[1:]):
+                line_start = line_end - len(line)
+                if line.strip():
+                    yield line_start, line
+                line_end = line_start - 1
+        if remainder.strip():
+            yield 0, remainder
+
+
+def parse_log_line(line: str) -> dict:
+    """
+    Parses a log line into its time, level, user and message
+
+    JSON lines are returned with all of their structured fields, older plain
+    text lines are matched against the text format.
+
+    Args:
+        line (str): a single line from the log
+
+    Returns:
+        dict: the parsed fields, with None for anything that is missing
+    """
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+            entry.setdefault("user", None)
+            return entry
+        except ValueError:
+            pass
+
+    entry = {"time": None, "level": None, "user": None, "message": line}
+    match = LINE_PATTERN.match(line)
+    if match:
+        entry["time"] = match.group("time")
+        entry["level"] = match.group("level") or "INFO"
+        entry["message"] = match.group("message")
+    user = USER_PATTERN.search(entry["message"])
+    if user:
+        entry["user"] = user.group("user")
+    return entry
+
+
+def parse_log_time(value: Optional[str]) -> Optional[datetime.datetime]:
+    """
+    Parses a log or query timestamp
+
+    Args:
+        value (str): a timestamp as written by the log formatter or in ISO format
+
+    Returns:
+        datetime.datetime | None: the parsed time, or None if it cannot be parsed
+    """
+    if not value:
+        return None
+    try:
+        return datetime.datetime.strptime(value, TIME_FORMAT)
+    except ValueError:
+        pass
+    try:
+        return datetime.datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def matches_filters(
+    entry: dict,
+    level: Optional[str] = None,
+    user: Optional[str] = None,
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+) -> bool:
+    """
+    Checks if a parsed log entry passes the query filters
+
+    Args:
+        entry (dict): the parsed log entry
+        level (str, optional): the level the entry must have
+        user (str, optional): the user the entry must mention
+        since (datetime.datetime, optional): the earliest time allowed
+        until (datetime.datetime, optional): the latest time allowed
+
+    Returns:
+        bool: whether the entry should be returned
+    """
+    if level and (entry["level"] or "").upper() != level.upper():
+        return False
+    if user and entry["user"] != user:
+        return False
+    if since or until:
+        entry_time = parse_log_time(entry["time"])
+        if entry_time is None:
+            return False
+        if since and entry_time < since:
+            return False
+        if until and entry_time > until:
+            return False
+    return True
+
+
+def parse_cursor(cursor: Optional[str], files: list[str]) -> tuple[int, Optional[int]]:
+    """
+    Converts a cursor string into a file index and byte offset
+
+    Args:
+        cursor (str): cursor of the form "<file name>:<offset>"
+        files (list[str]): the log files from newest to oldest
+
+    Returns:
+        tuple[int, int | None]: the index into files and the offset to read back from
+    """
+    if not cursor:
+        return 0, None
+    name, _, offset = cursor.rpartition(":")
+    if name not in files or not offset.isdigit():
+        raise ValueError("Invalid log cursor")
+    return files.index(name), int(offset)
+
+
+def query_log(
+    log_dir: str = LOG_DIR,
+    cursor: Optional[str] = None,
+    limit: int = 200,
+    level: Optional[str] = None,
+    user: Optional[str] = None,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+) -> dict:
+    """
+    Returns one page of log entries, newest first
+
+    Reading starts at the end of the newest file (or at the cursor) and moves
+    backwards, so only the bytes needed for the page are read.
+
+    Args:
+        log_dir (str): the directory holding the log files
+        cursor (str, optional): the cursor returned by the previous page
+        limit (int, optional): the maximum number of entries to return
+        level (str, optional): only return entries with this level
+        user (str, optional): only return entries mentioning this user
+        since (str, optional): only return entries at or after this time
+        until (str, optional): only return entries at or before this time
+
+    Returns:
+        dict: the entries and the cursor for the next page (None when exhausted)
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    since_time = parse_log_time(since)
+    until_time = parse_log_time(until)
+    if (since and since_time is None) or (until and until_time is None):
+        raise ValueError("Invalid time filter")
+
+    files = get_log_files(log_dir)
+    file_index, end = parse_cursor(cursor, files)
+    entries = []
+
+    while file_index < len(files):
+        name = files[file_index]
+        for offset, raw_line in read_lines_reverse(os.path.join(log_dir, name), end):
+            entry = parse_log_line(raw_line.decode("utf-8", errors="replace"))
+            entry_time = parse_log_time(entry["time"])
+            if since_time and entry_time and entry_time < since_time:
+                # files are read newest to oldest, so nothing older can match
+                return {"entries": entries, "cursor": None}
+            if not matches_filters(entry, level, user, since_time, until_time):
+                continue
+            entries.append(entry)
+            if len(entries) == limit:
+                return {"entries": entries, "cursor": f"{name}:{offset}"}
+        file_index += 1
+        end = None
+
+    return {"entries": entries, "cursor": None}
+
+
+def follow_log(
+    log_dir: str = LOG_DIR,
+    level: Optional[str] = None,
+    user: Optional[str] = None,
+    since: Optional[int] = None,
+    poll_interval: float = 1.0,
+    keepalive: float = 15.0,
+    max_seconds: float = STREAM_MAX_SECONDS,
+) -> Iterator[str]:
+    """
+    Yields new entries appended to the active log file as server-sent events
+
+    The id of each event is the byte offset after its line. The stream ends
+    after `max_seconds` so it does not hold a worker forever, and the client
+    reconnects with the last id to continue where it stopped.
+
+    Args:
+        log_dir (str): the directory holding the log files
+        level (str, optional): only send entries with this level
+        user (str, optional): only send entries mentioning this user
+        since (int, optional): the id of the last event seen. Defaults to only following new entries.
+        poll_interval (float, optional): seconds between checks for new data
+        keepalive (float, optional): seconds between keep-alive comments
+        max_seconds (float, optional): seconds before the stream ends
+
+    Returns:
+        Iterator[str]: formatted server-sent event messages
+    """
+    path = os.path.join(log_dir, LOG_FILE)
+    size = os.path.getsize(path) if os.path.exists(path) else 0
+    # an offset past the end is from before the file was rotated
+    position = since if since is not None and since <= size else size
+    started = last_sent = time.monotonic()
+    partial = b""
+
+    yield "retry: 3000\n\n"
+    while time.monotonic() - started < max_seconds:
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < position:
+            # the file was rotated, start reading the new one from the top
+            position = 0
+            partial = b""
+        if size > position:
+            offset = position - len(partial)
+            with open(path, "rb") as f:
+                f.seek(position)
+                data = partial + f.read(size - position)
+            position = size
+            *lines, partial = data.split(b"\n")
+            for raw_line in lines:
+                offset += len(raw_line) + 1
+                if not raw_line.strip():
+                    continue
+                entry = parse_log_line(raw_line.decode("utf-8", errors="replace"))
+                if matches_filters(entry, level, user):
+                    last_sent = time.monotonic()
+                    yield f"id: {offset}\ndata: {json.dumps(entry)}\n\n"
+        if time.monotonic() - last_sent >= keepalive:
+            last_sent = time.monotonic()
+            yield ": keepalive\n\n"
+        time.sleep(poll_interval)
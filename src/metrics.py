@@ -0,0 +1,417 @@
+"""
+This module collects request metrics and serves them in Prometheus format.
+
+Each request records its route, method, status code, latency and the time
+spent inside `execute` on the connection returned by `get_db`, and the
+cached searches record their hits and misses. Counters
+live in memory and every worker process writes them to its own file in
+METRICS_DIR at most once per FLUSH_INTERVAL, so `/metrics` can add up the
+files of all gunicorn workers. Files of processes that are no longer running
+are skipped, and removed when a worker starts, so counters of earlier
+deploys and dead workers are not added up forever.
+
+Functions:
+    pid_alive(pid: int) -> bool
+    reset_metrics_dir() -> None
+    start_request() -> None
+    note_response(response: Response) -> Response
+    finish_request(error: BaseException | None) -> None
+    record_cache(cache: str, result: str) -> None
+    render_metrics() -> str
+"""
+
+import atexit
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterator, Optional
+
+from flask import Response, g, has_request_context, request
+
+from query_profiler import record_statement
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+METRICS_DIR = os.environ.get("METRICS_DIR", "../logs/metrics")
+FLUSH_INTERVAL = 1.0
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+_store: dict = {"requests": {}, "latency": {}, "db": {}, "cache": {}}
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that adds the time spent in execute to the current request and the query profile
+    """
+
+    def execute(self, sql: str, parameters=(), /):
+        """
+        Runs a statement and records how long it took
+
+        Args:
+            sql (str): the statement to run
+            parameters: the statement parameters
+
+        Returns:
+            sqlite3.Cursor: this cursor
+        """
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            seconds = time.perf_counter() - started
+            record_query(seconds)
+            record_statement(self.connection, sql, parameters, seconds)
+
+    def executemany(self, sql: str, seq_of_parameters, /):
+        """
+        Runs a statement for every set of parameters and records how long it took
+
+        Args:
+            sql (str): the statement to run
+            seq_of_parameters: the parameters for each run
+
+        Returns:
+            sqlite3.Cursor: this cursor
+        """
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            seconds = time.perf_counter() - started
+            record_query(seconds)
+            record_statement(self.connection, sql, None, seconds)
+
+
+class TimedConnection(sqlite3.Connection):
+    """
+    Connection whose cursors are TimedCursors, pass as `factory` to sqlite3.connect
+    """
+
+    def cursor(self, factory=TimedCursor):
+        """
+        Opens a cursor that records query time
+
+        Args:
+            factory: the cursor class. Defaults to TimedCursor.
+
+        Returns:
+            sqlite3.Cursor: the new cursor
+        """
+        return super().cursor(factory)
+
+    def execute(self, sql: str, parameters=(), /):
+        """
+        Runs a statement on a new timed cursor
+
+        Args:
+            sql (str): the statement to run
+            parameters: the statement parameters
+
+        Returns:
+            sqlite3.Cursor: the cursor the statement ran on
+        """
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters, /):
+        """
+        Runs a statement for every set of parameters on a new timed cursor
+
+        Args:
+            sql (str): the statement to run
+            seq_of_parameters: the parameters for each run
+
+        Returns:
+            sqlite3.Cursor: the cursor the statement ran on
+        """
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+def record_query(seconds: float) -> None:
+    """
+    Adds one query to the current request's database time
+
+    Args:
+        seconds (float): how long execute took
+
+    Returns:
+        None
+    """
+    if not has_request_context():
+        return
+    g.db_seconds = g.get("db_seconds", 0.0) + seconds
+    g.db_queries = g.get("db_queries", 0) + 1
+
+
+def record_cache(cache: str, result: str) -> None:
+    """
+    Counts one lookup in a search cache
+
+    Args:
+        cache (str): the cached search
+        result (str): "hit", "miss" or "stale"
+
+    Returns:
+        None
+    """
+    with _lock:
+        key = f"{cache}\t{result}"
+        _store["cache"][key] = _store["cache"].get(key, 0) + 1
+
+
+def pid_alive(pid: int) -> bool:
+    """
+    Checks whether a process is running
+
+    Args:
+        pid (int): the process id
+
+    Returns:
+        bool: whether it is running, always True where it cannot be checked
+    """
+    if os.name == "nt":
+        # os.kill would terminate the process on Windows
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+@contextlib.contextmanager
+def metrics_lock() -> Iterator[None]:
+    """
+    Holds an exclusive lock on the metrics directory, where fcntl is available
+
+    Returns:
+        Iterator[None]: a context manager
+    """
+    with open(os.path.join(METRICS_DIR, ".lock"), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def reset_metrics_dir() -> None:
+    """
+    Removes the files of processes that are no longer running and this process's own earlier file
+
+    Called when a worker starts. A file with this process's id was left by
+    an earlier process that had the same id, its counters are not ours.
+
+    Returns:
+        None
+    """
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    with metrics_lock():
+        for name in os.listdir(METRICS_DIR):
+            pid = name.removesuffix(".json")
+            if not name.endswith(".json") or not pid.isdigit():
+                continue
+            if int(pid) == os.getpid() or not pid_alive(int(pid)):
+                os.remove(os.path.join(METRICS_DIR, name))
+
+
+def start_request() -> None:
+    """
+    Starts timing the current request
+
+    Returns:
+        None
+    """
+    g.request_started = time.perf_counter()
+    g.db_seconds = 0.0
+    g.db_queries = 0
+
+
+def note_response(response: Response) -> Response:
+    """
+    Remembers the status code of the current request
+
+    Args:
+        response (Response): the response being sent
+
+    Returns:
+        Response: the same response
+    """
+    g.response_status = response.status_code
+    return response
+
+
+def finish_request(error: Optional[BaseException]) -> None:
+    """
+    Records the metrics of the finished request
+
+    Args:
+        error (BaseException | None): the unhandled exception, if there was one
+
+    Returns:
+        None
+    """
+    started = g.get("request_started")
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    status = 500 if error is not None else g.get("response_status", 500)
+
+    with _lock:
+        key = f"{route}\t{request.method}\t{status}"
+        _store["requests"][key] = _store["requests"].get(key, 0) + 1
+
+        latency = _store["latency"].setdefault(
+            f"{route}\t{request.method}",
+            {"buckets": [0] * (len(LATENCY_BUCKETS) + 1), "sum": 0.0, "count": 0},
+        )
+        bucket = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS) if elapsed <= bound),
+            len(LATENCY_BUCKETS),
+        )
+        latency["buckets"][bucket] += 1
+        latency["sum"] += elapsed
+        latency["count"] += 1
+
+        db = _store["db"].setdefault(route, {"seconds": 0.0, "queries": 0})
+        db["seconds"] += g.get("db_seconds", 0.0)
+        db["queries"] += g.get("db_queries", 0)
+
+    if time.monotonic() - _last_flush > FLUSH_INTERVAL:
+        flush_metrics()
+
+
+def flush_metrics() -> None:
+    """
+    Writes this process's counters to its file in METRICS_DIR
+
+    The file is replaced atomically so readers never see a partial write.
+
+    Returns:
+        None
+    """
+    global _last_flush
+
+    with _flush_lock:
+        with _lock:
+            snapshot = json.dumps(_store)
+            _last_flush = time.monotonic()
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        path = os.path.join(METRICS_DIR, f"{os.getpid()}.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(f"{path}.tmp", path)
+
+
+def merge_worker_files() -> dict:
+    """
+    Adds up the counters written by every worker
+
+    Returns:
+        dict: the combined counters
+    """
+    merged: dict = {"requests": {}, "latency": {}, "db": {}, "cache": {}}
+    for name in os.listdir(METRICS_DIR):
+        # worker counter files are named <pid>.json
+        pid = name.removesuffix(".json")
+        if not pid.isdigit() or not pid_alive(int(pid)):
+            continue
+        try:
+            with open(os.path.join(METRICS_DIR, name), encoding="utf-8") as f:
+                store = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for key, count in store["requests"].items():
+            merged["requests"][key] = merged["requests"].get(key, 0) + count
+        for key, latency in store["latency"].items():
+            total = merged["latency"].setdefault(
+                key, {"buckets": [0] * len(latency["buckets"]), "sum": 0.0, "count": 0}
+            )
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], latency["buckets"])]
+            total["sum"] += latency["sum"]
+            total["count"] += latency["count"]
+        for key, db in store["db"].items():
+            total = merged["db"].setdefault(key, {"seconds": 0.0, "queries": 0})
+            total["seconds"] += db["seconds"]
+            total["queries"] += db["queries"]
+        for key, count in store.get("cache", {}).items():
+            merged["cache"][key] = merged["cache"].get(key, 0) + count
+    return merged
+
+
+def render_metrics() -> str:
+    """
+    Renders the metrics of all workers in the Prometheus text format
+
+    Returns:
+        str: the exposition text
+    """
+    flush_metrics()
+    store = merge_worker_files()
+    lines = [
+        "# HELP http_requests_total Requests handled by route, method and status code.",
+        "# TYPE http_requests_total counter",
+    ]
+    for key, count in sorted(store["requests"].items()):
+        route, method, status = key.split("\t")
+        lines.append(
+            f'http_requests_total{{route="{route}",method="{method}",status="{status}"}} {count}'
+        )
+
+    lines += [
+        "# HELP http_request_duration_seconds Request latency by route and method.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for key, latency in sorted(store["latency"].items()):
+        route, method = key.split("\t")
+        labels = f'route="{route}",method="{method}"'
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + ("+Inf",), latency["buckets"]):
+            cumulative += count
+            lines.append(
+                f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}'
+            )
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {latency['sum']}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {latency['count']}")
+
+    lines += [
+        "# HELP db_query_duration_seconds_total Time spent in cursor.execute by route.",
+        "# TYPE db_query_duration_seconds_total counter",
+    ]
+    for route, db in sorted(store["db"].items()):
+        lines.append(f'db_query_duration_seconds_total{{route="{route}"}} {db["seconds"]}')
+    lines += [
+        "# HELP db_queries_total Statements executed by route.",
+        "# TYPE db_queries_total counter",
+    ]
+    for route, db in sorted(store["db"].items()):
+        lines.append(f'db_queries_total{{route="{route}"}} {db["queries"]}')
+
+    lines += [
+        "# HELP search_cache_requests_total Cached search lookups by search and result.",
+        "# TYPE search_cache_requests_total counter",
+    ]
+    for key, count in sorted(store["cache"].items()):
+        cache, result = key.split("\t")
+        lines.append(
+            f'search_cache_requests_total{{cache="{cache}",result="{result}"}} {count}'
+        )
+
+    return "\n".join(lines) + "\n"
+
+
+atexit.register(flush_metrics)
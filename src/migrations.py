@@ -0,0 +1,297 @@
+"""
+This module migrates the database schema to the latest version.
+
+The schema version is SQLite's `PRAGMA user_version`. Version 1 is the
+schema the `ensure_*` functions create (see bootstrap.py). Every later
+change is a `Migration` in MIGRATIONS: its steps run in one transaction,
+then its backfills update existing rows in batches of BATCH_SIZE, each
+batch committed on its own so a large table is never locked for long.
+`user_version` is only raised once the backfills are done, so an
+interrupted migration runs again from the start on the next boot. Steps
+therefore have to be safe to repeat: use `add_column` and the
+`IF NOT EXISTS` forms, and backfill conditions that stop matching rows once
+they are filled.
+
+Functions:
+    add_column(table: str, column: str, definition: str) -> Callable[[sqlite3.Connection], None]
+    run_backfill(connection: sqlite3.Connection, backfill: Backfill, batch_size: int = BATCH_SIZE) -> int
+    migrate(db_path: str = DB_PATH) -> int
+"""
+
+import sqlite3
+from typing import Callable, NamedTuple, Union
+
+from bom_db import BOM_COMPONENT_INDEX, BOM_TABLE, bom_triggers
+from change_feed import ITEM_TABLES
+from electrical_db import part_id_norm_sql
+from fastener_size import size_dimension
+from location_db import (
+    ITEM_LOCATIONS,
+    LOCATIONS_TABLE,
+    location_id_sql,
+    location_triggers,
+    seed_locations_sql,
+)
+from reservation_db import RESERVATION_INDEXES, RESERVATIONS_TABLE, reservation_triggers
+
+DB_PATH = "../data/data.db"
+BATCH_SIZE = 5000
+
+
+class Backfill(NamedTuple):
+    """
+    Fills in existing rows in batches
+
+    Runs `UPDATE table SET assignment` on up to BATCH_SIZE rows matching
+    `condition` at a time until none match, so the assignment must make the
+    condition false for the rows it updates.
+    """
+
+    table: str
+    assignment: str
+    condition: str
+
+
+class Migration(NamedTuple):
+    """
+    One schema version: SQL statements or callables run in a transaction, then backfills
+    """
+
+    version: int
+    description: str
+    steps: tuple[Union[str, Callable[[sqlite3.Connection], None]], ...]
+    backfills: tuple[Backfill, ...] = ()
+
+
+def add_column(
+    table: str, column: str, definition: str
+) -> Callable[[sqlite3.Connection], None]:
+    """
+    Builds a step that adds a column unless the table already has it
+
+    Args:
+        table (str): the table to alter
+        column (str): the new column's name
+        definition (str): the column's type and constraints, e.g. "INTEGER NOT NULL DEFAULT 0"
+
+    Returns:
+        Callable[[sqlite3.Connection], None]: the migration step
+    """
+
+    def step(connection: sqlite3.Connection) -> None:
+        # table_xinfo also lists generated columns
+        columns = [row[1] for row in connection.execute(f"PRAGMA table_xinfo({table})")]
+        if column not in columns:
+            connection.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+    return step
+
+
+def register_size_function(connection: sqlite3.Connection) -> None:
+    """
+    Makes `size_dimension(size, is_metric, part)` available to the backfills of the size columns
+
+    Args:
+        connection (sqlite3.Connection): the migration connection
+
+    Returns:
+        None
+    """
+    connection.create_function("size_dimension", 3, size_dimension, deterministic=True)
+
+
+MIGRATIONS: list[Migration] = [
+    Migration(
+        2,
+        "low stock threshold for active items",
+        (
+            add_column(
+                "electrical_active_items", "threshold", "INTEGER NOT NULL DEFAULT 0"
+            ),
+        ),
+    ),
+    Migration(
+        3,
+        "normalized part number index for active items",
+        (
+            # virtual, so it is computed on read and needs no backfill or triggers
+            add_column(
+                "electrical_active_items",
+                "part_id_norm",
+                f"TEXT GENERATED ALWAYS AS ({part_id_norm_sql()}) VIRTUAL",
+            ),
+            """
+            CREATE INDEX IF NOT EXISTS idx_active_part_id_norm
+            ON electrical_active_items (part_id_norm)
+            """,
+        ),
+    ),
+    Migration(
+        4,
+        "partition index for active item searches",
+        (
+            """
+            CREATE INDEX IF NOT EXISTS idx_active_partition
+            ON electrical_active_items (location, is_assembly, type COLLATE NOCASE)
+            """,
+        ),
+    ),
+    Migration(
+        5,
+        "parsed fastener dimensions for dimension searches",
+        (
+            register_size_function,
+            add_column("items", "size_diameter", "REAL"),
+            add_column("items", "size_pitch", "REAL"),
+            add_column("items", "size_length", "REAL"),
+            """
+            CREATE INDEX IF NOT EXISTS idx_items_dimensions
+            ON items (size_diameter, size_length)
+            """,
+        ),
+        (
+            # sizes that are not fasteners stay NULL, so they are parsed every
+            # batch but never match the condition again
+            Backfill(
+                "items",
+                """
+                size_diameter = size_dimension(size, is_metric, 0),
+                size_pitch = size_dimension(size, is_metric, 1),
+                size_length = size_dimension(size, is_metric, 2)
+                """,
+                "size_diameter IS NULL AND size_dimension(size, is_metric, 0) IS NOT NULL",
+            ),
+        ),
+    ),
+    Migration(
+        6,
+        "locations table referenced by the items of both inventories",
+        (
+            LOCATIONS_TABLE,
+            *(
+                step
+                for source, (table, _, _) in ITEM_LOCATIONS.items()
+                for step in (
+                    add_column(table, "location_id", "INTEGER REFERENCES locations(id)"),
+                    f"CREATE INDEX IF NOT EXISTS idx_{table}_location ON {table} (location_id)",
+                    *location_triggers(source),
+                    seed_locations_sql(source),
+                )
+            ),
+        ),
+        tuple(
+            Backfill(table, f"location_id = {location_id_sql(source)}", "location_id IS NULL")
+            for source, (table, _, _) in ITEM_LOCATIONS.items()
+        ),
+    ),
+    Migration(
+        7,
+        "bills of materials of the electrical assemblies",
+        (BOM_TABLE, BOM_COMPONENT_INDEX, *bom_triggers()),
+    ),
+    Migration(
+        8,
+        "stock reservations and the reserved and available counts they leave",
+        (
+            *(
+                step
+                for table in ITEM_TABLES.values()
+                for step in (
+                    add_column(table, "reserved", "INTEGER NOT NULL DEFAULT 0"),
+                    add_column(
+                        table,
+                        "available",
+                        "INTEGER GENERATED ALWAYS AS (count - reserved) VIRTUAL",
+                    ),
+                )
+            ),
+            RESERVATIONS_TABLE,
+            *RESERVATION_INDEXES,
+            *reservation_triggers(),
+        ),
+    ),
+]
+
+SCHEMA_VERSION = max([1] + [migration.version for migration in MIGRATIONS])
+
+
+def run_backfill(
+    connection: sqlite3.Connection, backfill: Backfill, batch_size: int = BATCH_SIZE
+) -> int:
+    """
+    Applies a backfill in batches, committing after each one
+
+    Args:
+        connection (sqlite3.Connection): a connection in autocommit mode
+        backfill (Backfill): the rows to fill in and how
+        batch_size (int, optional): the number of rows per transaction
+
+    Returns:
+        int: the number of rows updated
+    """
+    total = 0
+    while True:
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            updated = connection.execute(
+                f"""
+                UPDATE {backfill.table} SET {backfill.assignment}
+                WHERE rowid IN (
+                    SELECT rowid FROM {backfill.table} WHERE {backfill.condition} LIMIT ?
+                )
+                """,
+                (batch_size,),
+            ).rowcount
+            connection.execute("COMMIT")
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        total += updated
+        if updated < batch_size:
+            return total
+
+
+def migrate(db_path: str = DB_PATH) -> int:
+    """
+    Runs the migrations newer than the database's user_version, in order
+
+    Args:
+        db_path (str, optional): the database to migrate
+
+    Returns:
+        int: the schema version the database is at afterwards
+    """
+    # autocommit, the transactions are explicit
+    connection = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        for migration in sorted(MIGRATIONS, key=lambda m: m.version):
+            if migration.version <= version:
+                continue
+
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                for step in migration.steps:
+                    if callable(step):
+                        step(connection)
+                    else:
+                        connection.execute(step)
+                if not migration.backfills:
+                    connection.execute(f"PRAGMA user_version = {migration.version}")
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+            if migration.backfills:
+                for backfill in migration.backfills:
+                    rows = run_backfill(connection, backfill)
+                    print(f"Migration {migration.version}: backfilled {rows} rows of {backfill.table}")
+                # PRAGMA does not take parameters, the version is an int from MIGRATIONS
+                connection.execute(f"PRAGMA user_version = {migration.version}")
+
+            version = migration.version
+            print(f"Migrated database to version {version}: {migration.description}")
+        return version
+    finally:
+        connection.close()
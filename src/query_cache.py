@@ -0,0 +1,112 @@
+"""
+This module caches the results of repeated searches.
+
+`cached_query` wraps a search function taking a `cursor` argument. Its
+results are kept in a bounded LRU keyed by the other arguments, with
+whitespace collapsed and, for the arguments whose case the search ignores,
+lower cased, so "M3  Screw " and "m3 screw" share an entry. Each entry is
+tagged with the versions of the tables the search reads. The triggers in
+http_cache.py bump them on every write from any worker, so an entry is
+only used while its tables are unchanged, and never after QUERY_CACHE_TTL.
+
+Hits, misses and stale entries are counted per search in the request
+metrics (`search_cache_requests_total` on /metrics).
+
+Functions:
+    normalize_argument(value, fold_case: bool)
+    cached_query(tables: tuple[str, ...], fold_case: tuple[str, ...] = ()) -> Callable
+"""
+
+import functools
+import inspect
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
+from http_cache import read_table_version
+from metrics import record_cache
+
+QUERY_CACHE_SIZE = int(os.environ.get("QUERY_CACHE_SIZE", "512"))
+QUERY_CACHE_TTL = float(os.environ.get("QUERY_CACHE_TTL", "300"))
+
+
+def normalize_argument(value, fold_case: bool):
+    """
+    Normalizes a search argument for use in a cache key
+
+    Args:
+        value: the argument
+        fold_case (bool): whether the search ignores case
+
+    Returns:
+        the argument with runs of whitespace collapsed and, if fold_case, lower cased
+    """
+    if isinstance(value, str):
+        value = " ".join(value.split())
+        return value.lower() if fold_case else value
+    if isinstance(value, list):
+        return tuple(normalize_argument(v, fold_case) for v in value)
+    return value
+
+
+def cached_query(tables: tuple[str, ...], fold_case: tuple[str, ...] = ()) -> Callable:
+    """
+    Builds a decorator caching a search's results until one of `tables` changes
+
+    The decorated function must take a `cursor` argument and return a list of
+    dicts. Callers get copies of the cached dicts, so they may change them.
+
+    Args:
+        tables (tuple[str, ...]): the tables the search reads, from http_cache.TRACKED_TABLES
+        fold_case (tuple[str, ...], optional): the arguments whose case the search ignores
+
+    Returns:
+        Callable: the decorator
+    """
+
+    def decorate(func: Callable) -> Callable:
+        signature = inspect.signature(func)
+        entries: OrderedDict = OrderedDict()
+        lock = threading.Lock()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs) -> list[dict]:
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            cursor = bound.arguments["cursor"]
+            key = tuple(
+                normalize_argument(value, name in fold_case)
+                for name, value in bound.arguments.items()
+                if name != "cursor"
+            )
+            versions = tuple(read_table_version(cursor, table) for table in tables)
+            now = time.monotonic()
+
+            with lock:
+                entry = entries.get(key)
+                if entry is not None and entry[0] == versions and entry[1] > now:
+                    entries.move_to_end(key)
+                    results = entry[2]
+                else:
+                    results = None
+            if results is not None:
+                record_cache(func.__name__, "hit")
+                return [dict(result) for result in results]
+
+            # versions were read first, so a write racing this search only
+            # makes the entry look older than it is
+            results = func(*args, **kwargs)
+            with lock:
+                entries[key] = (versions, now + QUERY_CACHE_TTL, results)
+                entries.move_to_end(key)
+                while len(entries) > QUERY_CACHE_SIZE:
+                    entries.popitem(last=False)
+            record_cache(func.__name__, "miss" if entry is None else "stale")
+            return [dict(result) for result in results]
+
+        wrapper.cache_clear = entries.clear
+        return wrapper
+
+    return decorate
@@ -0,0 +1,232 @@
+"""
+This module profiles the SQL statements run by request handlers.
+
+Every statement executed through a TimedCursor is timed and aggregated by
+its normalized SQL text. Statements slower than SLOW_QUERY_MS are kept in a
+slow log together with the types of their bound parameters, and the first
+time a statement is seen its `EXPLAIN QUERY PLAN` is captured so full table
+scans and temporary B-trees are flagged without anyone having to look.
+
+Like the request metrics, each worker writes its profile to a file in
+PROFILE_DIR and `get_profile` combines the files of all workers.
+
+Functions:
+    record_statement(connection: sqlite3.Connection, sql: str, parameters, seconds: float) -> None
+    get_profile(flagged_only: bool = False) -> dict
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+from flask import has_request_context, request
+
+PROFILE_DIR = os.environ.get("METRICS_DIR", "../logs/metrics")
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "50"))
+MAX_STATEMENTS = 500
+MAX_SLOW = 200
+FLUSH_INTERVAL = 5.0
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_last_flush = 0.0
+_statements: dict[str, dict] = {}
+_slow: deque = deque(maxlen=MAX_SLOW)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Collapses whitespace so the same statement written differently is counted once
+
+    Args:
+        sql (str): the statement
+
+    Returns:
+        str: the statement on a single line
+    """
+    return " ".join(sql.split())
+
+
+def parameter_shape(parameters) -> list[str] | dict[str, str] | str:
+    """
+    Describes the bound parameters by type without keeping their values
+
+    Args:
+        parameters: the parameters passed to execute, None for executemany
+
+    Returns:
+        list[str] | dict[str, str] | str: the type names, or "many" for executemany
+    """
+    if parameters is None:
+        return "many"
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters]
+
+
+def explain(connection: sqlite3.Connection, sql: str, parameters) -> tuple[list, list]:
+    """
+    Captures the query plan of a statement and flags the expensive steps
+
+    Args:
+        connection (sqlite3.Connection): the connection the statement ran on
+        sql (str): the statement
+        parameters: the parameters the statement ran with
+
+    Returns:
+        tuple[list, list]: the plan lines and the flags raised for them
+    """
+    if parameters is None or not sql.upper().startswith(EXPLAINABLE):
+        return [], []
+    try:
+        # a plain cursor so the EXPLAIN itself is not timed or profiled
+        cursor = connection.cursor(sqlite3.Cursor)
+        cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+        plan = [row[3] for row in cursor.fetchall()]
+    except sqlite3.Error as e:
+        return [f"EXPLAIN failed: {e}"], []
+
+    flags = []
+    for detail in plan:
+        if (
+            detail.startswith("SCAN ")
+            and "USING INDEX" not in detail
+            and "USING COVERING INDEX" not in detail
+            and detail != "SCAN CONSTANT ROW"
+        ):
+            flags.append(f"full table scan of {detail.split()[1]}")
+        elif detail.startswith("USE TEMP B-TREE"):
+            flags.append(f"temporary b-tree {detail[len('USE TEMP B-TREE ') :]}")
+    return plan, flags
+
+
+def record_statement(
+    connection: sqlite3.Connection, sql: str, parameters, seconds: float
+) -> None:
+    """
+    Adds one execution of a statement to the profile
+
+    Args:
+        connection (sqlite3.Connection): the connection the statement ran on
+        sql (str): the statement
+        parameters: the statement parameters, None for executemany
+        seconds (float): how long execute took
+
+    Returns:
+        None
+    """
+    text = normalize_sql(sql)
+    elapsed_ms = seconds * 1000
+    shape = parameter_shape(parameters)
+
+    with _lock:
+        stats = _statements.get(text)
+        is_new = stats is None and len(_statements) < MAX_STATEMENTS
+        if is_new:
+            stats = _statements[text] = {
+                "sql": text,
+                "count": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+                "shape": shape,
+                "plan": [],
+                "flags": [],
+            }
+        if stats is not None:
+            stats["count"] += 1
+            stats["total_ms"] += elapsed_ms
+            stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        if elapsed_ms >= SLOW_QUERY_MS:
+            _slow.append(
+                {
+                    "sql": text,
+                    "shape": shape,
+                    "ms": round(elapsed_ms, 3),
+                    "route": request.path if has_request_context() else None,
+                    "at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    "pid": os.getpid(),
+                }
+            )
+
+    if is_new:
+        plan, flags = explain(connection, text, parameters)
+        with _lock:
+            stats["plan"], stats["flags"] = plan, flags
+
+    if time.monotonic() - _last_flush > FLUSH_INTERVAL:
+        flush_profile()
+
+
+def flush_profile() -> None:
+    """
+    Writes this process's profile to its file in PROFILE_DIR
+
+    Returns:
+        None
+    """
+    global _last_flush
+
+    with _flush_lock:
+        with _lock:
+            snapshot = json.dumps(
+                {"statements": list(_statements.values()), "slow": list(_slow)}
+            )
+            _last_flush = time.monotonic()
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"{os.getpid()}.queries.json")
+        with open(f"{path}.tmp", "w", encoding="utf-8") as f:
+            f.write(snapshot)
+        os.replace(f"{path}.tmp", path)
+
+
+def get_profile(flagged_only: bool = False) -> dict:
+    """
+    Combines the profiles of all workers
+
+    Args:
+        flagged_only (bool, optional): only return statements with flagged plans
+
+    Returns:
+        dict: the statements ordered by total time, and the slowest recent executions
+    """
+    flush_profile()
+    statements: dict[str, dict] = {}
+    slow: list = []
+    for name in os.listdir(PROFILE_DIR):
+        if not name.endswith(".queries.json"):
+            continue
+        try:
+            with open(os.path.join(PROFILE_DIR, name), encoding="utf-8") as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for stats in profile["statements"]:
+            total: Optional[dict] = statements.get(stats["sql"])
+            if total is None:
+                statements[stats["sql"]] = dict(stats)
+                continue
+            total["count"] += stats["count"]
+            total["total_ms"] += stats["total_ms"]
+            total["max_ms"] = max(total["max_ms"], stats["max_ms"])
+        slow.extend(profile["slow"])
+
+    ordered = sorted(statements.values(), key=lambda s: s["total_ms"], reverse=True)
+    if flagged_only:
+        ordered = [s for s in ordered if s["flags"]]
+    for stats in ordered:
+        stats["avg_ms"] = round(stats["total_ms"] / stats["count"], 3)
+        stats["total_ms"] = round(stats["total_ms"], 3)
+        stats["max_ms"] = round(stats["max_ms"], 3)
+    slow.sort(key=lambda entry: entry["ms"], reverse=True)
+
+    return {
+        "slow_query_ms": SLOW_QUERY_MS,
+        "statements": ordered,
+        "slow": slow[:MAX_SLOW],
+    }
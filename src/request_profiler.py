@@ -0,0 +1,221 @@
+"""
+This module profiles individual requests on demand.
+
+`RequestProfiler` wraps the WSGI app. A request is profiled when it carries
+an admin's login token in the `X-Profile-Token` header or the `profile`
+query argument, or when it is picked by sampling: with PROFILE_SAMPLE_RATE
+set to N, one request in N is profiled without a token.
+
+Requests are profiled with cProfile and saved as `.pstats` files, or with
+pyinstrument when it is installed and PROFILER is "pyinstrument", saved as
+collapsed stacks (`.collapsed`) that flamegraph.pl and speedscope read.
+Files go to PROFILE_DIR and only the newest PROFILE_KEEP are kept. The
+profile's file name is sent back in the `X-Profile-Id` header.
+
+Each profiler only sees the thread it was started on, so concurrent requests
+under threaded or gunicorn workers are profiled separately. Streamed response
+bodies run after the app returns and are not included.
+
+Functions:
+    write_collapsed(frame, path: str) -> None
+    rotate_profiles() -> None
+"""
+
+import cProfile
+import datetime
+import itertools
+import os
+import random
+import re
+import sqlite3
+import threading
+from typing import Callable, Iterable, Optional
+from urllib.parse import parse_qs
+
+from auth_db import check_admin
+
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "../logs/profiles")
+PROFILE_SAMPLE_RATE = int(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_KEEP = int(os.environ.get("PROFILE_KEEP", "200"))
+PROFILER = os.environ.get("PROFILER", "cprofile").lower()
+
+pyinstrument = None
+if PROFILER == "pyinstrument":
+    # only imported when selected, it adds to every worker's start up
+    try:
+        import pyinstrument
+    except ImportError:
+        pass
+TOKEN_HEADER = "HTTP_X_PROFILE_TOKEN"
+TOKEN_ARG = "profile"
+
+_sequence = itertools.count(1)
+_rotate_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """
+    WSGI middleware that profiles flagged or sampled requests, wrap `app.wsgi_app` with it
+    """
+
+    def __init__(self, wsgi_app: Callable) -> None:
+        """
+        Args:
+            wsgi_app (Callable): the WSGI app to wrap
+        """
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ: dict, start_response: Callable) -> Iterable[bytes]:
+        """
+        Runs the request, profiling it if it was flagged by an admin or sampled
+
+        Args:
+            environ (dict): the WSGI environment
+            start_response (Callable): the WSGI start_response callable
+
+        Returns:
+            Iterable[bytes]: the response body
+        """
+        if not should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+
+        name = profile_name(environ)
+
+        def start_with_id(status, headers, exc_info=None):
+            headers.append(("X-Profile-Id", name))
+            return start_response(status, headers, exc_info)
+
+        if PROFILER == "pyinstrument" and pyinstrument is not None:
+            profiler = pyinstrument.Profiler(interval=0.0005)
+            try:
+                profiler.start()
+            except RuntimeError:
+                # another profiler is already running on this thread
+                return self.wsgi_app(environ, start_response)
+            try:
+                return self.wsgi_app(environ, start_with_id)
+            finally:
+                session = profiler.stop()
+                save_profile(
+                    lambda path: write_collapsed(session.root_frame(), path),
+                    f"{name}.collapsed",
+                )
+
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # another profiler is already active
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self.wsgi_app(environ, start_with_id)
+        finally:
+            profiler.disable()
+            save_profile(profiler.dump_stats, f"{name}.pstats")
+
+
+def should_profile(environ: dict) -> bool:
+    """
+    Decides whether a request is profiled
+
+    Args:
+        environ (dict): the WSGI environment
+
+    Returns:
+        bool: True if an admin asked for it or the request was sampled
+    """
+    token = environ.get(TOKEN_HEADER)
+    if token is None and f"{TOKEN_ARG}=" in environ.get("QUERY_STRING", ""):
+        token = parse_qs(environ["QUERY_STRING"]).get(TOKEN_ARG, [None])[0]
+    if token:
+        connection = sqlite3.connect("../data/data.db")
+        try:
+            return check_admin(token, connection.cursor())
+        finally:
+            connection.close()
+    return PROFILE_SAMPLE_RATE > 0 and random.randrange(PROFILE_SAMPLE_RATE) == 0
+
+
+def profile_name(environ: dict) -> str:
+    """
+    Builds a unique, sortable file name for a request's profile
+
+    Args:
+        environ (dict): the WSGI environment
+
+    Returns:
+        str: the name without an extension
+    """
+    timestamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = re.sub(r"[^A-Za-z0-9]+", "_", environ.get("PATH_INFO", "")).strip("_")
+    return (
+        f"{timestamp}-{os.getpid()}-{next(_sequence):06d}-"
+        f"{environ.get('REQUEST_METHOD', 'GET')}-{path or 'root'}"
+    )
+
+
+def save_profile(write: Callable[[str], None], file_name: str) -> None:
+    """
+    Writes a profile into PROFILE_DIR and removes the oldest ones past PROFILE_KEEP
+
+    Args:
+        write (Callable[[str], None]): writes the profile to the path it is given
+        file_name (str): the file name of the profile
+
+    Returns:
+        None
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, file_name)
+    write(f"{path}.tmp")
+    os.replace(f"{path}.tmp", path)
+    rotate_profiles()
+
+
+def write_collapsed(frame, path: str) -> None:
+    """
+    Writes a pyinstrument frame tree as collapsed stacks, one "a;b;c <microseconds>" line per stack
+
+    Args:
+        frame: the root pyinstrument frame
+        path (str): the file to write
+
+    Returns:
+        None
+    """
+    lines: list[str] = []
+
+    def walk(frame, stack: Optional[str]) -> None:
+        label = f"{frame.function} ({frame.file_path_short}:{frame.line_no})"
+        stack = label if stack is None else f"{stack};{label}"
+        self_time = frame.time - sum(child.time for child in frame.children)
+        if self_time > 0:
+            lines.append(f"{stack} {round(self_time * 1_000_000)}")
+        for child in frame.children:
+            walk(child, stack)
+
+    if frame is not None:
+        walk(frame, None)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def rotate_profiles() -> None:
+    """
+    Removes the oldest profiles so at most PROFILE_KEEP remain
+
+    Returns:
+        None
+    """
+    with _rotate_lock:
+        names = sorted(
+            name
+            for name in os.listdir(PROFILE_DIR)
+            if name.endswith((".pstats", ".collapsed"))
+        )
+        for name in names[: max(len(names) - PROFILE_KEEP, 0)]:
+            try:
+                os.remove(os.path.join(PROFILE_DIR, name))
+            except FileNotFoundError:
+                # another worker removed it first
+                pass
@@ -0,0 +1,607 @@
+"""
+This module provides stock reservations, holds of units against a project.
+
+A reservation holds `quantity` units of an item until it expires, is
+fulfilled (the units are pulled for the kit) or is released. Every item
+table has a `reserved` column, kept equal to the held quantity of the item
+by triggers on `reservations`, and a generated `available` column of
+`count - reserved`. Direct decrements (`take_stock`) never take reserved
+units, they are refused instead.
+
+There is no lock in the app: a hold is taken by one INSERT that only
+succeeds while enough units are available, so two kiosks reserving the
+last units at once cannot both get them. A reservation carries a `version`
+that every change increments; changes name the version the client last
+saw and fail with a conflict if someone else changed it since, instead of
+overwriting their change. Expired holds are swept by a background thread,
+and those of an item are also swept before it is reserved or decremented,
+so a late sweep never blocks either.
+
+Functions:
+    reservation_triggers() -> list[str]
+    reserve_stock(connection: sqlite3.Connection, source: str, item_id: int, project: str, quantity: int, ...) -> dict
+    update_reservation(connection: sqlite3.Connection, reservation_id: int, version: int, ...) -> dict
+    fulfill_reservation(connection: sqlite3.Connection, reservation_id: int, version: int) -> dict
+    release_reservation(connection: sqlite3.Connection, reservation_id: int, version: int) -> dict
+    expire_reservations(connection: sqlite3.Connection) -> int
+    take_stock(cursor: sqlite3.Cursor, source: str, item_id: int, quantity: int, ...) -> int | None
+    get_reservations(cursor: sqlite3.Cursor, ...) -> list[dict]
+    start_sweeper(interval: float = SWEEP_INTERVAL) -> None
+"""
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from change_feed import ITEM_TABLES, emit_change
+from ledger_db import now_timestamp
+
+DB_PATH = "../data/data.db"
+RESERVATION_TTL_MINUTES = float(os.environ.get("RESERVATION_TTL_MINUTES", "120"))
+SWEEP_INTERVAL = float(os.environ.get("RESERVATION_SWEEP_SECONDS", "60"))
+STATUSES = ("held", "fulfilled", "released", "expired")
+
+RESERVATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS reservations (
+        id INTEGER PRIMARY KEY,
+        source TEXT NOT NULL CHECK (source IN ('idea', 'active', 'passive')),
+        item_id INTEGER NOT NULL,
+        project TEXT NOT NULL,
+        quantity INTEGER NOT NULL CHECK (quantity > 0),
+        user TEXT,
+        status TEXT NOT NULL DEFAULT 'held'
+            CHECK (status IN ('held', 'fulfilled', 'released', 'expired')),
+        created_at TEXT NOT NULL,
+        expires_at TEXT NOT NULL,
+        version INTEGER NOT NULL DEFAULT 1
+    )
+"""
+
+# partial, so they only hold the reservations that still hold stock
+RESERVATION_INDEXES = (
+    """
+    CREATE INDEX IF NOT EXISTS idx_reservations_item
+    ON reservations (source, item_id) WHERE status = 'held'
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_reservations_expiry
+    ON reservations (expires_at) WHERE status = 'held'
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_reservations_project
+    ON reservations (project, status)
+    """,
+)
+
+_sweeper: Optional[threading.Thread] = None
+_sweeper_lock = threading.Lock()
+
+
+def reservation_triggers() -> list[str]:
+    """
+    Builds the triggers keeping the `reserved` column of the item tables equal to their held quantity
+
+    Returns:
+        list[str]: the CREATE TRIGGER statements
+    """
+
+    def adjust(row: str, sign: str) -> str:
+        # one statement per inventory, only the one of the reservation matches
+        return "\n".join(
+            f"""
+            UPDATE {table} SET reserved = reserved {sign} {row}.quantity
+            WHERE {row}.status = 'held' AND {row}.source = '{source}' AND id = {row}.item_id;
+            """
+            for source, table in ITEM_TABLES.items()
+        )
+
+    triggers = [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS reservations_hold_insert
+        AFTER INSERT ON reservations
+        BEGIN
+            {adjust("NEW", "+")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS reservations_hold_update
+        AFTER UPDATE OF status, quantity ON reservations
+        BEGIN
+            {adjust("OLD", "-")}
+            {adjust("NEW", "+")}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS reservations_hold_delete
+        AFTER DELETE ON reservations
+        BEGIN
+            {adjust("OLD", "-")}
+        END
+        """,
+    ]
+    for source, table in ITEM_TABLES.items():
+        triggers.append(
+            f"""
+            CREATE TRIGGER IF NOT EXISTS {table}_reservation_delete
+            AFTER DELETE ON {table}
+            BEGIN
+                DELETE FROM reservations WHERE source = '{source}' AND item_id = OLD.id;
+            END
+            """
+        )
+    return triggers
+
+
+def expires_at(minutes: Optional[float]) -> str:
+    """
+    Returns the expiry time of a hold taken now
+
+    Args:
+        minutes (float, optional): how long the hold lasts. Defaults to RESERVATION_TTL_MINUTES.
+
+    Returns:
+        str: the time in the format of ledger_db.now_timestamp
+    """
+    if minutes is None:
+        minutes = RESERVATION_TTL_MINUTES
+    if minutes <= 0:
+        raise ValueError("minutes must be positive")
+    expiry = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=minutes)
+    return expiry.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def read_reservation(cursor: sqlite3.Cursor, reservation_id: int) -> dict:
+    """
+    Reads one reservation
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        reservation_id (int): the id of the reservation
+
+    Returns:
+        dict: the reservation
+
+    Raises:
+        ValueError: if there is no such reservation
+    """
+    cursor.execute("SELECT * FROM reservations WHERE id = ?", (reservation_id,))
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"Reservation not found: {reservation_id}")
+    return dict(zip([column[0] for column in cursor.description], row))
+
+
+def read_available(cursor: sqlite3.Cursor, source: str, item_id: int) -> Optional[int]:
+    """
+    Reads the units of an item that are not reserved
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        source (str): the inventory of the item
+        item_id (int): the id of the item
+
+    Returns:
+        int | None: the available units, None if there is no such item
+    """
+    cursor.execute(f"SELECT available FROM {ITEM_TABLES[source]} WHERE id = ?", (item_id,))
+    row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def sweep_item(cursor: sqlite3.Cursor, source: str, item_id: int) -> None:
+    """
+    Expires the overdue holds of one item, in the caller's transaction
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        source (str): the inventory of the item
+        item_id (int): the id of the item
+
+    Returns:
+        None
+    """
+    cursor.execute(
+        """
+        UPDATE reservations SET status = 'expired', version = version + 1
+        WHERE source = ? AND item_id = ? AND status = 'held' AND expires_at <= ?
+        """,
+        (source, item_id, now_timestamp()),
+    )
+
+
+def reserve_stock(
+    connection: sqlite3.Connection,
+    source: str,
+    item_id: int,
+    project: str,
+    quantity: int,
+    user: Optional[str] = None,
+    minutes: Optional[float] = None,
+) -> dict:
+    """
+    Holds units of an item for a project, if that many are available
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        source (str): the inventory of the item ("idea", "active" or "passive")
+        item_id (int): the id of the item
+        project (str): what the units are held for
+        quantity (int): the number of units to hold
+        user (str, optional): the user holding them
+        minutes (float, optional): how long to hold them. Defaults to RESERVATION_TTL_MINUTES.
+
+    Returns:
+        dict: `reserved` whether the hold was taken, the `reservation` if so, and the item's `available` units
+
+    Raises:
+        ValueError: if the source, quantity or project is invalid or the item does not exist
+    """
+    if source not in ITEM_TABLES:
+        raise ValueError(f"Unknown inventory source: {source}")
+    if quantity <= 0:
+        raise ValueError("quantity must be positive")
+    if not project.strip():
+        raise ValueError("project must not be empty")
+    expiry = expires_at(minutes)
+    table = ITEM_TABLES[source]
+
+    cursor = connection.cursor()
+    try:
+        sweep_item(cursor, source, item_id)
+        # the availability check and the hold are one statement, so no other
+        # writer can take the units in between
+        cursor.execute(
+            f"""
+            INSERT INTO reservations
+                (source, item_id, project, quantity, user, created_at, expires_at)
+            SELECT ?, id, ?, ?, ?, ?, ? FROM {table}
+            WHERE id = ? AND available >= ?
+            """,
+            (source, project.strip(), quantity, user, now_timestamp(), expiry, item_id, quantity),
+        )
+        reservation_id = cursor.lastrowid if cursor.rowcount else None
+        if reservation_id is not None:
+            emit_change(cursor, source, "update", params=(item_id,))
+        available = read_available(cursor, source, item_id)
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+
+    if available is None:
+        raise ValueError(f"Item not found: {source}:{item_id}")
+    if reservation_id is None:
+        return {"reserved": False, "available": available}
+    return {
+        "reserved": True,
+        "reservation": read_reservation(cursor, reservation_id),
+        "available": available,
+    }
+
+
+def change_reservation(
+    connection: sqlite3.Connection,
+    reservation_id: int,
+    version: int,
+    assignment: str,
+    params: tuple = (),
+    guard: str = "",
+    guard_params: tuple = (),
+) -> dict:
+    """
+    Changes a held reservation if it is still at `version`, and bumps the version
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        reservation_id (int): the id of the reservation
+        version (int): the version the client last saw
+        assignment (str): SQL setting the changed columns
+        params (tuple, optional): parameters of the assignment
+        guard (str, optional): a further SQL condition the change needs
+        guard_params (tuple, optional): parameters of the guard
+
+    Returns:
+        dict: `changed` whether the change was made, and the `reservation` as it is now
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            f"""
+            UPDATE reservations SET {assignment}, version = version + 1
+            WHERE id = ? AND version = ? AND status = 'held' AND expires_at > ? {guard}
+            """,
+            (*params, reservation_id, version, now_timestamp(), *guard_params),
+        )
+        changed = cursor.rowcount > 0
+        reservation = read_reservation(cursor, reservation_id)
+        if changed:
+            emit_change(
+                cursor, reservation["source"], "update", params=(reservation["item_id"],)
+            )
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return {"changed": changed, "reservation": reservation}
+
+
+def update_reservation(
+    connection: sqlite3.Connection,
+    reservation_id: int,
+    version: int,
+    quantity: Optional[int] = None,
+    minutes: Optional[float] = None,
+) -> dict:
+    """
+    Changes the quantity of a hold or extends it
+
+    A larger quantity needs the extra units to be available.
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        reservation_id (int): the id of the reservation
+        version (int): the version the client last saw
+        quantity (int, optional): the new quantity. Defaults to the current one.
+        minutes (float, optional): hold for this many minutes from now. Defaults to the current expiry.
+
+    Returns:
+        dict: `changed` whether the change was made, and the `reservation` as it is now
+    """
+    if quantity is not None and quantity <= 0:
+        raise ValueError("quantity must be positive")
+    reservation = read_reservation(connection.cursor(), reservation_id)
+    table = ITEM_TABLES[reservation["source"]]
+    new_quantity = reservation["quantity"] if quantity is None else quantity
+    expiry = reservation["expires_at"] if minutes is None else expires_at(minutes)
+
+    return change_reservation(
+        connection,
+        reservation_id,
+        version,
+        "quantity = ?, expires_at = ?",
+        (new_quantity, expiry),
+        # the units it holds now count as available to it
+        f"AND ? - quantity <= (SELECT available FROM {table} WHERE id = ?)",
+        (new_quantity, reservation["item_id"]),
+    )
+
+
+def fulfill_reservation(connection: sqlite3.Connection, reservation_id: int, version: int) -> dict:
+    """
+    Pulls the held units for the kit: takes them out of stock and ends the hold, in one transaction
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        reservation_id (int): the id of the reservation
+        version (int): the version the client last saw
+
+    Returns:
+        dict: `changed` whether the units were pulled, and the `reservation` as it is now
+    """
+    cursor = connection.cursor()
+    try:
+        cursor.execute(
+            """
+            UPDATE reservations SET status = 'fulfilled', version = version + 1
+            WHERE id = ? AND version = ? AND status = 'held' AND expires_at > ?
+            """,
+            (reservation_id, version, now_timestamp()),
+        )
+        changed = cursor.rowcount > 0
+        reservation = read_reservation(cursor, reservation_id)
+        if changed:
+            cursor.execute(
+                f"""
+                UPDATE {ITEM_TABLES[reservation["source"]]}
+                SET count = max(count - ?, 0) WHERE id = ?
+                """,
+                (reservation["quantity"], reservation["item_id"]),
+            )
+            emit_change(
+                cursor, reservation["source"], "update", params=(reservation["item_id"],)
+            )
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return {"changed": changed, "reservation": reservation}
+
+
+def release_reservation(connection: sqlite3.Connection, reservation_id: int, version: int) -> dict:
+    """
+    Ends a hold without taking its units
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+        reservation_id (int): the id of the reservation
+        version (int): the version the client last saw
+
+    Returns:
+        dict: `changed` whether the hold was released, and the `reservation` as it is now
+    """
+    return change_reservation(connection, reservation_id, version, "status = 'released'")
+
+
+def expire_reservations(connection: sqlite3.Connection) -> int:
+    """
+    Expires every overdue hold, returning its units to the available stock
+
+    Args:
+        connection (sqlite3.Connection): SQLite connection object
+
+    Returns:
+        int: the number of holds expired
+    """
+    now = now_timestamp()
+    overdue = "status = 'held' AND expires_at <= ?"
+    cursor = connection.cursor()
+    try:
+        # the events go first, they select the items by their overdue holds
+        cursor.execute(f"SELECT 1 FROM reservations WHERE {overdue} LIMIT 1", (now,))
+        if cursor.fetchone() is None:
+            return 0
+        for source in ITEM_TABLES:
+            emit_change(
+                cursor,
+                source,
+                "update",
+                f"id IN (SELECT item_id FROM reservations WHERE source = ? AND {overdue})",
+                (source, now),
+            )
+        cursor.execute(
+            f"UPDATE reservations SET status = 'expired', version = version + 1 WHERE {overdue}",
+            (now,),
+        )
+        expired = cursor.rowcount
+        connection.commit()
+    except BaseException:
+        connection.rollback()
+        raise
+    return expired
+
+
+def take_stock(
+    cursor: sqlite3.Cursor,
+    source: str,
+    item_id: int,
+    quantity: int,
+    assignment: str = "",
+    params: tuple = (),
+) -> Optional[int]:
+    """
+    Takes units of an item out of stock without touching the reserved ones, in the caller's transaction
+
+    The count stops at 0 as it always has, but a decrement that would go
+    into reserved units is refused as a whole. Overdue holds of the item are
+    expired first, so a late sweep never blocks a decrement. The new count is written only
+    if the count and reserved units are still those it was computed from, so
+    concurrent decrements are retried rather than lost.
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        source (str): the inventory of the item ("idea", "active" or "passive")
+        item_id (int): the id of the item
+        quantity (int): the number of units to take
+        assignment (str, optional): SQL setting further columns, e.g. "is_contacted = ?"
+        params (tuple, optional): parameters of the assignment
+
+    Returns:
+        int | None: the number of units taken, None if reserved units are in the way
+
+    Raises:
+        ValueError: if the item does not exist
+    """
+    if quantity < 0:
+        raise ValueError("quantity must not be negative")
+    table = ITEM_TABLES[source]
+    extra = f", {assignment}" if assignment else ""
+    sweep_item(cursor, source, item_id)
+    while True:
+        cursor.execute(f"SELECT count, reserved FROM {table} WHERE id = ?", (item_id,))
+        row = cursor.fetchone()
+        if row is None:
+            raise ValueError("Item not found. No update performed.")
+        count, reserved = row[0], row[1]
+        # a count already below 0 is left alone rather than raised
+        new_count = max(count - quantity, min(count, 0))
+        if reserved and new_count < reserved:
+            return None
+        cursor.execute(
+            f"""
+            UPDATE {table} SET count = ?{extra}
+            WHERE id = ? AND count = ? AND reserved = ?
+            RETURNING count
+            """,
+            (new_count, *params, item_id, count, reserved),
+        )
+        if cursor.fetchone() is not None:
+            return count - new_count
+
+
+def get_reservations(
+    cursor: sqlite3.Cursor,
+    project: Optional[str] = None,
+    source: Optional[str] = None,
+    item_id: Optional[int] = None,
+    status: Optional[str] = "held",
+) -> list[dict]:
+    """
+    Lists the reservations of a project or an item
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        project (str, optional): the project
+        source (str, optional): the inventory of the item
+        item_id (int, optional): the id of the item
+        status (str, optional): only reservations with this status, None for all. Defaults to "held".
+
+    Returns:
+        list[dict]: the reservations, soonest to expire first
+    """
+    if status is not None and status not in STATUSES:
+        raise ValueError(f"Unknown reservation status: {status}")
+    conditions, params = [], []
+    if project is not None:
+        conditions.append("project = ?")
+        params.append(project.strip())
+    if item_id is not None:
+        conditions += ["source = ?", "item_id = ?"]
+        params += [source, item_id]
+    if status is not None:
+        # a literal, so the partial indexes on held reservations can be used
+        conditions.append("status = 'held'" if status == "held" else "status = ?")
+        params += [] if status == "held" else [status]
+    if not conditions:
+        raise KeyError("Missing required parameters")
+
+    cursor.execute(
+        f"SELECT * FROM reservations WHERE {' AND '.join(conditions)} ORDER BY expires_at, id",
+        params,
+    )
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def sweep_loop(interval: float) -> None:
+    """
+    Expires overdue holds every `interval` seconds
+
+    Args:
+        interval (float): seconds between sweeps
+
+    Returns:
+        None
+    """
+    while True:
+        try:
+            with sqlite3.connect(DB_PATH, timeout=30) as connection:
+                expire_reservations(connection)
+        except sqlite3.Error as e:
+            print(f"Reservation sweeper error: {e}")
+        time.sleep(interval)
+
+
+def start_sweeper(interval: float = SWEEP_INTERVAL) -> None:
+    """
+    Starts the background thread that expires overdue holds, once per process
+
+    Args:
+        interval (float, optional): seconds between sweeps. Defaults to SWEEP_INTERVAL.
+
+    Returns:
+        None
+    """
+    global _sweeper
+
+    if _sweeper is not None and _sweeper.is_alive():
+        return
+    with _sweeper_lock:
+        if _sweeper is not None and _sweeper.is_alive():
+            return
+        _sweeper = threading.Thread(
+            target=sweep_loop, args=(interval,), name="reservation-sweeper", daemon=True
+        )
+        _sweeper.start()
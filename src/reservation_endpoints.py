@@ -0,0 +1,201 @@
+"""
+This module provides endpoints for stock reservations.
+It includes functions to:
+    - hold units of an item for a project
+    - change, pull or release a hold, failing if it was changed since it was read
+    - list the holds of a project or an item
+"""
+
+from typing import Tuple
+
+from flask import Response, jsonify, request
+
+from ledger_db import record_movement
+from ledger_endpoints import parse_item_ref
+from reservation_db import (
+    fulfill_reservation,
+    get_reservations,
+    release_reservation,
+    reserve_stock,
+    start_sweeper,
+    update_reservation,
+)
+from utility_functions import get_db, get_token_username, handle_exceptions
+
+
+def conflict_response(result: dict) -> Tuple[Response, int]:
+    """
+    Builds the answer to a change of a reservation that was changed, ended or expired since it was read
+
+    Args:
+        result (dict): the result of the change, with the reservation as it is now
+
+    Returns:
+        Tuple[Response, int]: a message with the current reservation and status code 409
+    """
+    return (
+        jsonify(
+            {
+                "status": "error",
+                "message": "Reservation was changed, ended or expired, reload it",
+                "reservation": result["reservation"],
+            }
+        ),
+        409,
+    )
+
+
+def reserve_item() -> Tuple[Response, int]:
+    """
+    Handles holding units of an item for a project
+
+    Args:
+        item (str): the item as "source:id", or an id together with `source`
+        source (str) optional: the inventory of the item (idea, active or passive)
+        project (str): what the units are held for
+        quantity (int): the number of units to hold
+        minutes (float) optional: how long to hold them (default RESERVATION_TTL_MINUTES)
+
+    Returns:
+        Tuple[Response, int]: a message with the reservation, or 409 with the available units, and status code
+    """
+    try:
+        data = request.get_json()
+        if not data or "project" not in data or "quantity" not in data:
+            raise KeyError("Missing required parameters")
+        source, item_id = parse_item_ref({k: str(v) for k, v in data.items()})
+        start_sweeper()
+        result = reserve_stock(
+            get_db(),
+            source,
+            item_id,
+            str(data["project"]),
+            int(data["quantity"]),
+            get_token_username(data.get("token")),
+            float(data["minutes"]) if "minutes" in data else None,
+        )
+        if not result["reserved"]:
+            return (
+                jsonify({"status": "error", "message": "Not enough available", **result}),
+                409,
+            )
+        return jsonify({"status": "success", **result}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def change_reservation_item() -> Tuple[Response, int]:
+    """
+    Handles changing the quantity of a hold or extending it
+
+    Args:
+        id (int): the id of the reservation
+        version (int): the version of the reservation as last read
+        quantity (int) optional: the new quantity
+        minutes (float) optional: hold for this many minutes from now
+
+    Returns:
+        Tuple[Response, int]: a message with the reservation, or 409 with the current one, and status code
+    """
+    try:
+        data = request.get_json()
+        if not data or "id" not in data or "version" not in data:
+            raise KeyError("Missing required parameters")
+        result = update_reservation(
+            get_db(),
+            int(data["id"]),
+            int(data["version"]),
+            int(data["quantity"]) if "quantity" in data else None,
+            float(data["minutes"]) if "minutes" in data else None,
+        )
+        if not result["changed"]:
+            return conflict_response(result)
+        return jsonify({"status": "success", "reservation": result["reservation"]}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def fulfill_reservation_item() -> Tuple[Response, int]:
+    """
+    Handles pulling the held units for a kit
+
+    Args:
+        id (int): the id of the reservation
+        version (int): the version of the reservation as last read
+
+    Returns:
+        Tuple[Response, int]: a message with the reservation, or 409 with the current one, and status code
+    """
+    try:
+        data = request.get_json()
+        if not data or "id" not in data or "version" not in data:
+            raise KeyError("Missing required parameters")
+        result = fulfill_reservation(get_db(), int(data["id"]), int(data["version"]))
+        if not result["changed"]:
+            return conflict_response(result)
+        reservation = result["reservation"]
+        record_movement(
+            reservation["source"],
+            reservation["item_id"],
+            -reservation["quantity"],
+            get_token_username(data.get("token")),
+            f"kit {reservation['project']}",
+        )
+        return jsonify({"status": "success", "reservation": reservation}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def release_reservation_item() -> Tuple[Response, int]:
+    """
+    Handles releasing a hold without taking its units
+
+    Args:
+        id (int): the id of the reservation
+        version (int): the version of the reservation as last read
+
+    Returns:
+        Tuple[Response, int]: a message with the reservation, or 409 with the current one, and status code
+    """
+    try:
+        data = request.get_json()
+        if not data or "id" not in data or "version" not in data:
+            raise KeyError("Missing required parameters")
+        result = release_reservation(get_db(), int(data["id"]), int(data["version"]))
+        if not result["changed"]:
+            return conflict_response(result)
+        return jsonify({"status": "success", "reservation": result["reservation"]}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def list_reservations() -> Tuple[Response, int]:
+    """
+    Handles listing the reservations of a project or an item
+
+    Args:
+        project (str) optional: the project
+        item (str) optional: the item as "source:id", or an id together with `source`
+        status (str) optional: held (default), fulfilled, released, expired or all
+
+    Returns:
+        Tuple[Response, int]: a message with the reservations, soonest to expire first, and status code
+    """
+    try:
+        data = request.args
+        if not data or ("project" not in data and "item" not in data):
+            raise KeyError("Missing required parameters")
+        source = item_id = None
+        if "item" in data:
+            source, item_id = parse_item_ref(data)
+        status = data.get("status", "held")
+        reservations = get_reservations(
+            get_db().cursor(),
+            data.get("project"),
+            source,
+            item_id,
+            None if status == "all" else status,
+        )
+        return jsonify({"status": "success", "reservations": reservations}), 200
+    except Exception as e:
+        return handle_exceptions(e)
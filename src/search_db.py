@@ -0,0 +1,295 @@
+"""
+This module searches every inventory at once.
+
+The IDEA lab items, active parts, assemblies and passive parts are searched
+in parallel, each source on its own thread and connection. The threads
+belong to one search: a source that runs past the budget cannot be stopped,
+but it finishes in the background without delaying later searches. The
+fuzzy sources score against the cached candidate lists (`idea_db.get_choices`
+and `electrical_db.get_active_choices_el`), so a warm search does not read
+the item tables at all. Passive parts are matched by value: a query such as
+"4.7k resistor" or "100nF" is parsed into a value and a subtype.
+
+Scores are 0-100 and multiplied by the weight of their source before the
+results are merged. Sources that have not answered when the latency budget
+runs out are left out and listed in `timed_out`, and sources that raised
+are left out and listed in `failed`, so one broken source does not fail the
+whole search.
+
+Functions:
+    parse_passive_query(query: str) -> tuple[float, str | None] | None
+    search_all(query: str, sources: list[str] | None = None, limit: int = 20, budget: float = SEARCH_BUDGET) -> dict
+"""
+
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional
+
+from electrical_db import get_active_choices_el, search_similar_passive_items_el
+from idea_db import get_choices
+from metrics import TimedConnection
+
+DB_PATH = "../data/data.db"
+SEARCH_BUDGET = float(os.environ.get("SEARCH_BUDGET_MS", "500")) / 1000
+
+# how much a match from each source counts when the results are merged
+SOURCE_WEIGHTS = {
+    "idea": 1.0,
+    "active": 1.0,
+    "assembly": 0.9,
+    "passive": 1.0,
+}
+
+SI_PREFIXES = {
+    "p": 1e-12,
+    "n": 1e-9,
+    "u": 1e-6,
+    "µ": 1e-6,
+    "m": 1e-3,
+    "": 1.0,
+    "k": 1e3,
+    "K": 1e3,
+    "M": 1e6,
+    "G": 1e9,
+}
+# words and units that name a passive subtype, as stored in electrical_passive_items
+PASSIVE_SUBTYPES = {
+    "resistor": "Resistor",
+    "ohm": "Resistor",
+    "ω": "Resistor",
+    "capacitor": "capacitor",
+    "cap": "capacitor",
+    "f": "capacitor",
+    "farad": "capacitor",
+    "fuse": "polyfuse",
+    "polyfuse": "polyfuse",
+}
+# a standalone number, so sizes like "M6x20" are not read as values
+PASSIVE_VALUE = re.compile(
+    r"(?<![\w.])(\d+(?:\.\d+)?)(\s*)([pnuµmkKMG]?)([a-zA-Zω]*)(?![\w.])"
+)
+# how far from the parsed value a passive part may be, as a fraction of it
+PASSIVE_SEARCH_PERCENT = 0.1
+
+def connect() -> sqlite3.Connection:
+    """
+    Opens a connection for one search task, profiled like the request connections
+
+    Returns:
+        sqlite3.Connection: the connection
+    """
+    connection = sqlite3.connect(DB_PATH, factory=TimedConnection)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def fuzzy_results(
+    source: str, query: str, row_dict: dict, choices: dict, limit: int
+) -> list[dict]:
+    """
+    Scores the candidates of one source against the query
+
+    Args:
+        source (str): the source the candidates come from
+        query (str): the search text
+        row_dict (dict): the rows by key
+        choices (dict): the text to match by key
+        limit (int): the most results to return
+
+    Returns:
+        list[dict]: the results with their unweighted score
+    """
+    from fuzzywuzzy import fuzz, process  # imported on first search, it is slow to load
+
+    matches = process.extract(query, choices, scorer=fuzz.partial_ratio, limit=limit)
+    return [
+        {"source": source, "score": score, "item": row_dict[key]}
+        for _, score, key in matches
+    ]
+
+
+def search_idea(query: str, limit: int) -> list[dict]:
+    """
+    Fuzzy searches the IDEA lab items
+
+    Args:
+        query (str): the search text
+        limit (int): the most results to return
+
+    Returns:
+        list[dict]: the results
+    """
+    connection = connect()
+    try:
+        row_dict, choices = get_choices(connection.cursor())
+    finally:
+        connection.close()
+    results = fuzzy_results("idea", query, row_dict, choices, limit)
+    for result in results:
+        result["item"] = {
+            **result["item"],
+            "is_metric": str(result["item"]["is_metric"] == 1),
+        }
+    return results
+
+
+def search_active(query: str, limit: int, is_assembly: bool) -> list[dict]:
+    """
+    Fuzzy searches the active parts or the assemblies
+
+    Args:
+        query (str): the search text
+        limit (int): the most results to return
+        is_assembly (bool): search assemblies instead of parts
+
+    Returns:
+        list[dict]: the results
+    """
+    connection = connect()
+    try:
+        row_dict, choices = get_active_choices_el(
+            connection.cursor(), is_assembly=is_assembly
+        )
+    finally:
+        connection.close()
+    source = "assembly" if is_assembly else "active"
+    results = fuzzy_results(source, query, row_dict, choices, limit)
+    for result in results:
+        result["item"] = {**result["item"], "type": "active"}
+    return results
+
+
+def parse_passive_query(query: str) -> Optional[tuple[float, Optional[str]]]:
+    """
+    Reads a component value and subtype from a query like "4.7k resistor" or "100nF"
+
+    A number only counts as a value with a passive unit, a subtype word
+    elsewhere in the query, or an SI prefix written straight after it, so
+    "4.7k" is a value but "10 mm screw" and "25 pack" are not.
+
+    Args:
+        query (str): the search text
+
+    Returns:
+        tuple[float, str | None] | None: the value and subtype, None without a value
+    """
+    for match in PASSIVE_VALUE.finditer(query):
+        number, space, prefix, unit = match.groups()
+        if unit and unit.lower() not in PASSIVE_SUBTYPES:
+            continue
+
+        subtype = PASSIVE_SUBTYPES.get(unit.lower()) if unit else None
+        if subtype is None:
+            for word in query.lower().split():
+                if word in PASSIVE_SUBTYPES and word != "f":
+                    subtype = PASSIVE_SUBTYPES[word]
+                    break
+        if subtype is None and not (prefix and not space):
+            continue
+        return float(number) * SI_PREFIXES[prefix], subtype
+    return None
+
+
+def search_passive(query: str, limit: int) -> list[dict]:
+    """
+    Searches the passive parts near the value in the query
+
+    Args:
+        query (str): the search text
+        limit (int): the most results to return
+
+    Returns:
+        list[dict]: the results, scored by how close their value is
+    """
+    parsed = parse_passive_query(query)
+    if parsed is None or parsed[0] <= 0:
+        return []
+    value, subtype = parsed
+
+    connection = connect()
+    try:
+        items = search_similar_passive_items_el(
+            connection.cursor(), value, PASSIVE_SEARCH_PERCENT, subtype
+        )
+    finally:
+        connection.close()
+
+    window = value * PASSIVE_SEARCH_PERCENT
+    results = [
+        {
+            "source": "passive",
+            "score": round(100 * (1 - abs(item["value"] - value) / window), 1),
+            "item": item,
+        }
+        for item in items
+    ]
+    results.sort(key=lambda result: result["score"], reverse=True)
+    return results[:limit]
+
+
+SEARCHES = {
+    "idea": search_idea,
+    "active": lambda query, limit: search_active(query, limit, False),
+    "assembly": lambda query, limit: search_active(query, limit, True),
+    "passive": search_passive,
+}
+
+
+def search_all(
+    query: str,
+    sources: Optional[list[str]] = None,
+    limit: int = 20,
+    budget: float = SEARCH_BUDGET,
+) -> dict:
+    """
+    Searches the given sources in parallel and merges their results by weighted score
+
+    Args:
+        query (str): the search text
+        sources (list[str] | None): any of idea, active, assembly and passive, None for all
+        limit (int): the most results to return
+        budget (float): seconds to wait for the sources
+
+    Returns:
+        dict: the ranked `results`, the sources that `timed_out` or `failed` and how long the search `took_ms`
+    """
+    sources = sources or list(SEARCHES)
+    unknown = [source for source in sources if source not in SEARCHES]
+    if unknown:
+        raise ValueError(f"Unknown sources: {', '.join(unknown)}")
+
+    started = time.perf_counter()
+    # one thread per source, so every source starts at once
+    executor = ThreadPoolExecutor(max_workers=len(sources), thread_name_prefix="search")
+    try:
+        futures = {
+            executor.submit(SEARCHES[source], query, limit): source for source in sources
+        }
+        done, pending = wait(futures, timeout=budget)
+    finally:
+        # sources past the budget finish on their own threads, nothing waits for them
+        executor.shutdown(wait=False)
+
+    results = []
+    failed = []
+    for future in done:
+        source = futures[future]
+        error = future.exception()
+        if error is not None:
+            print(f"Search of {source} failed: {error!r}")
+            failed.append(source)
+            continue
+        for result in future.result():
+            result["score"] = round(result["score"] * SOURCE_WEIGHTS[source], 1)
+            results.append(result)
+    results.sort(key=lambda result: result["score"], reverse=True)
+
+    return {
+        "results": results[:limit],
+        "timed_out": sorted(futures[future] for future in pending),
+        "failed": sorted(failed),
+        "took_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
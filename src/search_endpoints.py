@@ -0,0 +1,104 @@
+"""
+This module provides the search endpoint across all inventories.
+It includes functions to:
+    - search the IDEA lab items, active parts, assemblies and passive parts in one request
+    - complete item names and part numbers as they are typed
+    - list the items of every inventory at a storage location
+"""
+
+from typing import Tuple
+
+from flask import Response, jsonify, request
+
+from autocomplete import complete
+from location_db import IDEA_LAB, LOCATION_LEVELS, find_by_location
+from search_db import SEARCH_BUDGET, search_all
+from utility_functions import get_db, handle_exceptions, parse_location_to_list
+
+MAX_LIMIT = 100
+MAX_BUDGET_MS = 2000
+MAX_COMPLETIONS = 50
+MAX_LOCATION_ITEMS = 2000
+
+
+def unified_search() -> Tuple[Response, int]:
+    """
+    Handles searching every inventory at once
+
+    Args:
+        q (str): the search text
+        sources (str) optional: comma separated idea, active, assembly and/or passive (default all)
+        limit (int) optional: the most results to return (default 20, at most 100)
+        budget_ms (int) optional: how long to wait for the sources (at most 2000)
+
+    Returns:
+        Tuple[Response, int]: a message with the ranked results, the sources that timed out and status code
+    """
+    try:
+        data = request.args
+        if not data or not data.get("q", "").strip():
+            raise KeyError("Missing required parameters")
+        sources = [s.strip() for s in data.get("sources", "").split(",") if s.strip()]
+        limit = min(int(data.get("limit", 20)), MAX_LIMIT)
+        budget_ms = min(float(data.get("budget_ms", SEARCH_BUDGET * 1000)), MAX_BUDGET_MS)
+        if limit <= 0 or budget_ms <= 0:
+            raise ValueError("limit and budget_ms must be positive")
+
+        found = search_all(data["q"].strip(), sources or None, limit, budget_ms / 1000)
+        return jsonify({"status": "success", **found}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def autocomplete() -> Tuple[Response, int]:
+    """
+    Handles completing what has been typed into a search box
+
+    Args:
+        q (str): the text typed so far
+        limit (int) optional: the most completions to return (default 10, at most 50)
+
+    Returns:
+        Tuple[Response, int]: a message with the completions, most stocked first, and status code
+    """
+    try:
+        data = request.args
+        if not data or "q" not in data:
+            raise KeyError("Missing required parameters")
+        limit = min(int(data.get("limit", 10)), MAX_COMPLETIONS)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+
+        return jsonify({"status": "success", "completions": complete(data["q"], limit)}), 200
+    except Exception as e:
+        return handle_exceptions(e)
+
+
+def by_location() -> Tuple[Response, int]:
+    """
+    Handles listing everything stored at a location, e.g. a whole shelf, rack or box
+
+    Args:
+        lab (str) optional: "IDEA" (default) or the electrical lab, e.g. "EL"
+        shelf, rack, box, row, col, depth (str) optional: the levels to narrow to, electrical items use rack and box (their slot)
+        limit (int) optional: the most items to return per inventory (default 500, at most 2000)
+
+    Returns:
+        Tuple[Response, int]: a message with the items by inventory, in location order, and status code
+    """
+    try:
+        data = request.args
+        levels = {level: data[level] for level in LOCATION_LEVELS if level in data}
+        if not levels and "lab" not in data:
+            raise KeyError("Missing required parameters")
+        limit = min(int(data.get("limit", 500)), MAX_LOCATION_ITEMS)
+        if limit <= 0:
+            raise ValueError("limit must be positive")
+
+        found = find_by_location(get_db().cursor(), data.get("lab", IDEA_LAB), levels, limit)
+        for item in found["idea"]:
+            item["location"] = parse_location_to_list(item)
+            item["is_metric"] = str(item["is_metric"] == 1)
+        return jsonify({"status": "success", **found}), 200
+    except Exception as e:
+        return handle_exceptions(e)
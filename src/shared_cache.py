@@ -0,0 +1,255 @@
+"""
+This module shares the search corpora between worker processes.
+
+A corpus (the fuzzy matching candidates of a table) is written once to a
+file in SHARED_CACHE_DIR and memory mapped by every worker, so the pages are
+shared through the OS page cache instead of each worker holding its own
+copy. The file starts with a header holding the `table_versions` version it
+was built from:
+
+    magic "IVC1" | data version (u64) | entries (u64)
+    entries x (choice offset (u64), choice length (u32), row offset (u64), row length (u32))
+    UTF-8 choice strings and JSON rows
+
+A worker attaching a corpus only decodes the choice strings, which fuzzy
+matching needs in full. Rows are decoded one at a time when a match is
+returned. The first worker to find a corpus missing or out of date builds
+it under a lock and replaces the file atomically; workers still mapping the
+old file keep reading it until they see the new version. Empty corpora are
+not written, so lookups of partitions that do not exist leave no files.
+
+Functions:
+    write_corpus(name: str, version: int, entries: list[tuple[str, dict]]) -> None
+    read_corpus_version(name: str) -> int | None
+    open_corpus(name: str) -> SharedCorpus | None
+    load_corpus(name: str, version: int, build: Callable[[], list[tuple[str, dict]]]) -> SharedCorpus | None
+    detach_corpora() -> None
+"""
+
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+from collections.abc import Mapping
+from typing import Callable, Iterator, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+SHARED_CACHE_DIR = os.environ.get("SHARED_CACHE_DIR", "../data/cache")
+MAGIC = b"IVC1"
+HEADER = struct.Struct("<4sQQ")
+ENTRY = struct.Struct("<QIQI")
+
+# the corpora this worker has mapped, by name
+_attached: dict[str, "SharedCorpus"] = {}
+_lock = threading.Lock()
+
+
+class SharedCorpus(Mapping):
+    """
+    A memory mapped corpus: its rows by entry index, decoded on access, and `choices` by the same index
+    """
+
+    def __init__(self, buffer: mmap.mmap) -> None:
+        """
+        Args:
+            buffer (mmap.mmap): the mapped corpus file
+        """
+        magic, self.version, count = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a corpus file")
+        self.buffer = buffer
+        self.entries = [
+            ENTRY.unpack_from(buffer, HEADER.size + i * ENTRY.size) for i in range(count)
+        ]
+        self.choices = {
+            i: buffer[offset : offset + length].decode("utf-8")
+            for i, (offset, length, _, _) in enumerate(self.entries)
+        }
+
+    def __getitem__(self, index: int) -> dict:
+        """
+        Decodes one row
+
+        Args:
+            index (int): the entry index, as used as the key of `choices`
+
+        Returns:
+            dict: the row
+        """
+        if not isinstance(index, int) or not 0 <= index < len(self.entries):
+            raise KeyError(index)
+        _, _, offset, length = self.entries[index]
+        return json.loads(self.buffer[offset : offset + length])
+
+    def __iter__(self) -> Iterator[int]:
+        return iter(range(len(self.entries)))
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def corpus_path(name: str) -> str:
+    """
+    Returns the file of a corpus
+
+    Args:
+        name (str): the corpus name, may contain any characters
+
+    Returns:
+        str: the path in SHARED_CACHE_DIR
+    """
+    # the hash keeps names that only differ in replaced characters apart
+    digest = hashlib.sha1(name.encode("utf-8")).hexdigest()[:12]
+    file_name = f"{re.sub(r'[^A-Za-z0-9_-]', '_', name)[:64]}-{digest}.corpus"
+    return os.path.join(SHARED_CACHE_DIR, file_name)
+
+
+@contextlib.contextmanager
+def build_lock() -> Iterator[None]:
+    """
+    Holds the exclusive lock on building corpora, where fcntl is available
+
+    One lock for every corpus, so lookups of empty corpora leave no lock files behind.
+
+    Returns:
+        Iterator[None]: a context manager
+    """
+    with open(os.path.join(SHARED_CACHE_DIR, "build.lock"), "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def write_corpus(name: str, version: int, entries: list[tuple[str, dict]]) -> None:
+    """
+    Writes a corpus file, replacing the old one atomically
+
+    Args:
+        name (str): the corpus name
+        version (int): the table version the entries were read at
+        entries (list[tuple[str, dict]]): the choice string and row of every entry
+
+    Returns:
+        None
+    """
+    encoded = [
+        (choice.encode("utf-8"), json.dumps(row, separators=(",", ":")).encode("utf-8"))
+        for choice, row in entries
+    ]
+    offset = HEADER.size + len(encoded) * ENTRY.size
+    index = []
+    for choice, row in encoded:
+        index.append(ENTRY.pack(offset, len(choice), offset + len(choice), len(row)))
+        offset += len(choice) + len(row)
+
+    path = corpus_path(name)
+    with open(f"{path}.tmp", "wb") as f:
+        f.write(HEADER.pack(MAGIC, version, len(encoded)))
+        f.writelines(index)
+        for choice, row in encoded:
+            f.write(choice)
+            f.write(row)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_corpus_version(name: str) -> Optional[int]:
+    """
+    Reads the version in a corpus file's header without mapping it
+
+    Args:
+        name (str): the corpus name
+
+    Returns:
+        int | None: the version, None if there is no readable file
+    """
+    try:
+        with open(corpus_path(name), "rb") as f:
+            magic, version, _ = HEADER.unpack(f.read(HEADER.size))
+    except (OSError, struct.error):
+        return None
+    return version if magic == MAGIC else None
+
+
+def open_corpus(name: str) -> Optional[SharedCorpus]:
+    """
+    Maps a corpus file
+
+    Args:
+        name (str): the corpus name
+
+    Returns:
+        SharedCorpus | None: the corpus, None if there is no readable file
+    """
+    try:
+        with open(corpus_path(name), "rb") as f:
+            # the mapping stays valid after the file is closed or replaced
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        return SharedCorpus(buffer)
+    except (ValueError, struct.error):
+        buffer.close()
+        return None
+
+
+def load_corpus(
+    name: str, version: int, build: Callable[[], list[tuple[str, dict]]]
+) -> Optional[SharedCorpus]:
+    """
+    Returns a corpus at `version`, attaching the shared file or building it if it is out of date
+
+    Args:
+        name (str): the corpus name
+        version (int): the current version of the table the corpus is built from
+        build (Callable[[], list[tuple[str, dict]]]): reads the entries from the database
+
+    Returns:
+        SharedCorpus | None: the corpus, None if it has no entries
+    """
+    with _lock:
+        corpus = _attached.get(name)
+    if corpus is not None and corpus.version == version:
+        return corpus
+
+    # not just older: a restored database can take the versions back
+    if read_corpus_version(name) != version:
+        os.makedirs(SHARED_CACHE_DIR, exist_ok=True)
+        with build_lock():
+            # another worker may have built it while this one waited
+            if read_corpus_version(name) != version:
+                entries = build()
+                if not entries:
+                    return None
+                write_corpus(name, version, entries)
+
+    corpus = open_corpus(name)
+    if corpus is None:
+        raise OSError(f"Could not map the {name} corpus")
+
+    with _lock:
+        _attached[name] = corpus
+    return corpus
+
+
+def detach_corpora() -> None:
+    """
+    Forgets the corpora this process has mapped, for tools that switch to another database
+
+    Returns:
+        None
+    """
+    with _lock:
+        _attached.clear()
@@ -0,0 +1,219 @@
+"""
+This module tracks row versions for delta sync.
+
+Every item table gets an `updated_seq` column. Triggers bump a single global
+sequence on each insert, update or delete and stamp the new value on the row,
+and deletes leave a tombstone carrying the sequence number. A client that
+remembers the highest sequence it has seen can then fetch only what changed.
+
+Functions:
+    ensure_sync_schema() -> None
+    get_watermark(cursor: sqlite3.Cursor) -> int
+    get_sync_delta(cursor: sqlite3.Cursor, since: int, sources: list[str] | None = None) -> dict
+"""
+
+import sqlite3
+from typing import Optional
+
+DB_PATH = "../data/data.db"
+
+ITEM_TABLES = {
+    "idea": "items",
+    "active": "electrical_active_items",
+    "passive": "electrical_passive_items",
+}
+
+# columns returned for IDEA items, matching /findAll
+IDEA_COLUMNS = """
+    id, name, size, is_metric, loc_shelf, loc_rack, loc_box, loc_row,
+    loc_col, loc_depth, count, threshold, isContacted,
+    f.daily_rate, f.suggested_threshold, f.days_until_stockout, updated_seq
+"""
+
+
+def ensure_sync_schema() -> None:
+    """
+    Adds the row version columns, tombstone table and triggers if they are missing
+
+    Rows that existed before the column was added are stamped with sequence 1,
+    so a client syncing from 0 receives them.
+
+    Args:
+        None
+
+    Returns:
+        None
+    """
+    with sqlite3.connect(DB_PATH) as connection:
+        cursor = connection.cursor()
+        cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS sync_sequence (
+                    id INTEGER PRIMARY KEY CHECK (id = 1),
+                    value INTEGER NOT NULL
+                )
+                """
+        )
+        cursor.execute(
+            """
+                CREATE TABLE IF NOT EXISTS sync_tombstones (
+                    source TEXT NOT NULL,
+                    item_id INTEGER NOT NULL,
+                    deleted_seq INTEGER NOT NULL,
+                    PRIMARY KEY (source, item_id)
+                ) WITHOUT ROWID
+                """
+        )
+        cursor.execute(
+            """
+                CREATE INDEX IF NOT EXISTS idx_sync_tombstones_seq
+                ON sync_tombstones (deleted_seq)
+                """
+        )
+        cursor.execute("INSERT OR IGNORE INTO sync_sequence (id, value) VALUES (1, 1)")
+
+        for source, table in ITEM_TABLES.items():
+            cursor.execute(f"PRAGMA table_info({table})")
+            if "updated_seq" not in [column[1] for column in cursor.fetchall()]:
+                cursor.execute(
+                    f"ALTER TABLE {table} ADD COLUMN updated_seq INTEGER NOT NULL DEFAULT 1"
+                )
+            cursor.execute(
+                f"""
+                CREATE INDEX IF NOT EXISTS idx_{table}_updated_seq
+                ON {table} (updated_seq)
+                """
+            )
+            create_triggers(cursor, source, table)
+        connection.commit()
+
+
+def create_triggers(cursor: sqlite3.Cursor, source: str, table: str) -> None:
+    """
+    Creates the triggers that stamp row versions and record deletes for a table
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        source (str): the inventory name stored in tombstones
+        table (str): the item table
+
+    Returns:
+        None
+    """
+    bump = "UPDATE sync_sequence SET value = value + 1 WHERE id = 1;"
+    current = "(SELECT value FROM sync_sequence WHERE id = 1)"
+
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_sync_insert
+        AFTER INSERT ON {table}
+        BEGIN
+            {bump}
+            UPDATE {table} SET updated_seq = {current} WHERE id = NEW.id;
+            DELETE FROM sync_tombstones WHERE source = '{source}' AND item_id = NEW.id;
+        END
+        """
+    )
+    # the WHEN clause skips the trigger's own updated_seq write
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_sync_update
+        AFTER UPDATE ON {table}
+        WHEN NEW.updated_seq IS OLD.updated_seq
+        BEGIN
+            {bump}
+            UPDATE {table} SET updated_seq = {current} WHERE id = NEW.id;
+        END
+        """
+    )
+    cursor.execute(
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {table}_sync_delete
+        AFTER DELETE ON {table}
+        BEGIN
+            {bump}
+            INSERT OR REPLACE INTO sync_tombstones (source, item_id, deleted_seq)
+            VALUES ('{source}', OLD.id, {current});
+        END
+        """
+    )
+
+
+def get_watermark(cursor: sqlite3.Cursor) -> int:
+    """
+    Returns the current value of the global row version sequence
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+
+    Returns:
+        int: the newest sequence number handed out
+    """
+    cursor.execute("SELECT value FROM sync_sequence WHERE id = 1")
+    row = cursor.fetchone()
+    return row[0] if row else 0
+
+
+def get_sync_delta(
+    cursor: sqlite3.Cursor, since: int, sources: Optional[list[str]] = None
+) -> dict:
+    """
+    Returns the rows changed and deleted after a sequence number
+
+    The watermark is read before the rows, so a change committed while the
+    rows are read is either included or has a higher sequence than the
+    watermark and is sent again on the next sync.
+
+    Args:
+        cursor (sqlite3.Cursor): SQLite cursor object to execute queries
+        since (int): the watermark from the client's last sync, 0 for everything
+        sources (list[str], optional): the inventories to include. Defaults to all.
+
+    Returns:
+        dict: the new watermark, the changed rows and the deleted ids per inventory
+    """
+    sources = sources or list(ITEM_TABLES)
+    for source in sources:
+        if source not in ITEM_TABLES:
+            raise ValueError(f"Unknown inventory source: {source}")
+
+    watermark = get_watermark(cursor)
+    changed = {}
+    deleted = {}
+    for source in sources:
+        if source == "idea":
+            cursor.execute(
+                f"""
+                SELECT {IDEA_COLUMNS}
+                FROM items
+                LEFT JOIN item_forecasts f
+                ON f.source = 'idea' AND f.item_id = items.id
+                WHERE updated_seq > ?
+                ORDER BY updated_seq
+                """,
+                (since,),
+            )
+        else:
+            cursor.execute(
+                f"""
+                SELECT * FROM {ITEM_TABLES[source]}
+                WHERE updated_seq > ?
+                ORDER BY updated_seq
+                """,
+                (since,),
+            )
+        changed[source] = [
+            dict(zip([column[0] for column in cursor.description], row))
+            for row in cursor.fetchall()
+        ]
+
+        cursor.execute(
+            """
+            SELECT item_id FROM sync_tombstones
+            WHERE source = ? AND deleted_seq > ?
+            """,
+            (source, since),
+        )
+        deleted[source] = [row[0] for row in cursor.fetchall()]
+
+    return {"watermark": watermark, "changed": changed, "deleted": deleted}
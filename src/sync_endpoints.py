@@ -0,0 +1,39 @@
+"""
+This module provides the delta sync endpoint.
+It includes functions to:
+    - get the items changed or deleted since a client's last sync
+"""
+
+from typing import Tuple
+
+from flask import Response, jsonify, request
+
+from sync_db import get_sync_delta
+from utility_functions import get_db, handle_exceptions
+
+
+def sync_items() -> Tuple[Response, int]:
+    """
+    Handles getting the items changed since the client's watermark
+
+    Args:
+        since (int) optional: the watermark returned by the previous sync, 0 for everything
+        source (str) optional: comma separated inventories (idea, active, passive)
+
+    Returns:
+        Tuple[Response, int]: a message with the new watermark, changed rows and deleted ids and status code
+    """
+    try:
+        data = request.args
+        since = data.get("since", "0")
+        if not since.isdigit():
+            raise ValueError("since must be a non-negative integer")
+        sources = [s for s in data.get("source", "").split(",") if s] or None
+
+        delta = get_sync_delta(get_db().cursor(), int(since), sources)
+        for item in delta["changed"].get("idea", []):
+            item["is_metric"] = str(item["is_metric"] == 1)
+
+        return jsonify({"status": "success", **delta}), 200
+    except Exception as e:
+        return handle_exceptions(e)
@@ -7,6 +7,7 @@ It contains functions to:
     - Generate a JWT token for a user
     - import data from a CSV file in two ways
     - parse a location string into a list
+    - answer with an event stream, at most MAX_STREAMS at once per process
 """
 
 import csv
@@ -17,15 +18,22 @@ import logging
 import math
 import os
 import sqlite3
+import threading
 from pathlib import Path
-from typing import Tuple
+from typing import Iterator, Optional, Tuple
 
 import jwt
 from dotenv import load_dotenv
 from flask import Response, g, jsonify
 
-from electrical_db import add_active_item_el, add_passive_item_el
+from change_feed import emit_reset
+from electrical_db import add_active_item_el, add_passive_item_el, calculate_multiplier
 from idea_db import add_item
+from metrics import TimedConnection
+
+# event streams open at once in this process, each holds a request thread
+MAX_STREAMS = int(os.environ.get("MAX_STREAMS", 4))
+_stream_slots = threading.BoundedSemaphore(MAX_STREAMS)
 
 
 def get_db() -> sqlite3.Connection:
@@ -36,7 +44,7 @@ def get_db() -> sqlite3.Connection:
         g.db (sqlite3.Connection): the connection.
     """
     if "db" not in g:
-        g.db = sqlite3.connect("../data/data.db")
+        g.db = sqlite3.connect("../data/data.db", factory=TimedConnection)
         g.db.row_factory = sqlite3.Row  # Allows dictionary-like row access
     return g.db
 
@@ -76,6 +84,98 @@ def handle_exceptions(exception: Exception) -> Tuple[Response, int]:
         )
 
 
+def reserved_stock_response() -> Tuple[Response, int]:
+    """
+    Builds the answer to a decrement refused because it would take reserved units
+
+    Returns:
+        Tuple[Response, int]: a message and status code 409
+    """
+    return (
+        jsonify(
+            {
+                "status": "error",
+                "message": "Not enough unreserved stock, the rest is held by reservations",
+            }
+        ),
+        409,
+    )
+
+
+class StreamSlot:
+    """
+    An event stream holding one of the MAX_STREAMS slots until it ends or is closed
+
+    The slot is released in close(), which the WSGI server calls even if the
+    client left before the stream was started.
+    """
+
+    def __init__(self, stream: Iterator[str]) -> None:
+        """
+        Wraps a stream that already holds a slot
+
+        Args:
+            stream (Iterator[str]): the server-sent event messages
+        """
+        self.stream = stream
+        self.released = False
+        self.release_lock = threading.Lock()
+
+    def __iter__(self) -> "StreamSlot":
+        return self
+
+    def __next__(self) -> str:
+        try:
+            return next(self.stream)
+        except StopIteration:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        """
+        Closes the stream and releases its slot, once
+
+        Returns:
+            None
+        """
+        with self.release_lock:
+            if self.released:
+                return
+            self.released = True
+        try:
+            close = getattr(self.stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            _stream_slots.release()
+
+
+def stream_response(stream: Iterator[str]) -> Response | Tuple[Response, int]:
+    """
+    Answers with an event stream, or 503 if MAX_STREAMS streams are already open
+
+    Args:
+        stream (Iterator[str]): the server-sent event messages, not started yet
+
+    Returns:
+        Response | Tuple[Response, int]: the event stream, or a message and status code 503
+    """
+    if not _stream_slots.acquire(blocking=False):
+        close = getattr(stream, "close", None)
+        if close is not None:
+            close()
+        response = jsonify(
+            {"status": "error", "message": "Too many open streams, retry later"}
+        )
+        response.headers["Retry-After"] = "10"
+        return response, 503
+    return Response(
+        StreamSlot(stream),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 def generate_token(username: str, level: int) -> str:
     """
     Generates a JWT token for a user
@@ -104,6 +204,24 @@ def generate_token(username: str, level: int) -> str:
         raise
 
 
+def get_token_username(token: Optional[str]) -> Optional[str]:
+    """
+    Reads the username from a JWT token without verifying it
+
+    Args:
+        token (str): the token sent by the frontend, may be None
+
+    Returns:
+        str | None: the username, or None if there is no readable token
+    """
+    if not token:
+        return None
+    try:
+        return jwt.decode(token, options={"verify_signature": False}).get("username")
+    except jwt.PyJWTError:
+        return None
+
+
 def delete_backup(file_path: str) -> None:
     """
     Deletes a backup file
@@ -139,6 +257,7 @@ def import_csv(uri: str) -> None:
 
             # Delete all previous data from 'items' table
             cur.execute("DELETE FROM items")
+            emit_reset(cur, "idea")
 
             # Open and read the file
             with open(uri, "r", newline="") as file:
@@ -321,6 +440,8 @@ def refresh_from_csv_el(uri: str) -> None:
         cur = con.cursor()
         cur.execute("DELETE FROM electrical_passive_items")
         cur.execute("DELETE FROM electrical_active_items")
+        emit_reset(cur, "passive")
+        emit_reset(cur, "active")
         con.commit()
     import_csv_el(uri)
 
@@ -391,3 +512,5 @@ def import_csv_el(uri: str) -> None:
                     import traceback
 
                     traceback.print_exc()
+        # the imported values can add or remove multiplier prefixes
+        calculate_multiplier(cur, con)